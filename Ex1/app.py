@@ -1,12 +1,33 @@
 from fastapi import FastAPI
-from routers import pet_types, pets, pictures
+from routers import jobs, metrics, pet_types, pets, pictures
+from database import db
+from services import http_client
+from services.image_pool import shutdown_image_pool
+from services.jobs import picture_jobs
+from services.metrics import MetricsMiddleware
 
 app = FastAPI(title="Pet Store Inventory API")
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(pet_types.router)
 app.include_router(pets.router)
 app.include_router(pictures.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
+
+@app.on_event("startup")
+def open_database():
+    # Restore the store before serving rather than on the first request
+    db.open()
+
+@app.on_event("shutdown")
+async def close_resources():
+    await picture_jobs.close()
+    http_client.close()
+    await http_client.aclose()
+    shutdown_image_pool()
+    db.close()
 
 @app.get("/")
 def read_root():
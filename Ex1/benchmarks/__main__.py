@@ -0,0 +1,91 @@
+"""
+Benchmark suite; run from the Ex1 directory:
+
+    python -m benchmarks micro [--types N] [--pets N] [--journal] [-o micro.json]
+    python -m benchmarks load [--scenario create-heavy ...] [--requests N] [--concurrency N]
+                              [--ninja-latency S] [--image-latency S] [--image-bytes N] [-o load.json]
+    python -m benchmarks compare base.json new.json
+
+Results are JSON (see benchmarks.report); keep them per commit and compare.
+No real Ninja API key or network access is needed.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from benchmarks.report import compare, write_results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    micro = commands.add_parser("micro", help="InMemoryDatabase operations")
+    micro.add_argument("--types", type=int, default=200)
+    micro.add_argument("--pets", type=int, default=20000)
+    micro.add_argument("--threads", type=int, default=8, help="threads for the concurrent add_pet run")
+    micro.add_argument("--journal", action="store_true", help="with the mutation journal enabled")
+    micro.add_argument("-o", "--output", help="JSON file to write, stdout by default")
+
+    load = commands.add_parser("load", help="end-to-end load scenarios against the app")
+    load.add_argument("--scenario", action="append", choices=("create-heavy", "filter-heavy", "picture-heavy"),
+                      help="repeat to run several; all by default")
+    load.add_argument("--requests", type=int, default=2000, help="timed requests per scenario")
+    load.add_argument("--concurrency", type=int, default=32)
+    load.add_argument("--types", type=int, default=50)
+    load.add_argument("--pets-per-type", type=int, default=100)
+    load.add_argument("--pictures", type=int, default=200, help="pets created with a picture in picture-heavy")
+    load.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    load.add_argument("--ninja-latency", type=float, default=0.05, help="seconds")
+    load.add_argument("--image-latency", type=float, default=0.05, help="seconds")
+    load.add_argument("--image-bytes", type=int, default=64 * 1024)
+    load.add_argument("-o", "--output", help="JSON file to write, stdout by default")
+
+    diff = commands.add_parser("compare", help="line up two result files")
+    diff.add_argument("base")
+    diff.add_argument("new")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        compare(args.base, args.new)
+        return 0
+
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    parameters = {key: value for key, value in vars(args).items() if key not in ("command", "output")}
+
+    if args.command == "micro":
+        from benchmarks.micro import run_micro
+        with tempfile.TemporaryDirectory(prefix="petstore-bench-") as workdir:
+            # The store keeps pictures/ under the working directory
+            os.chdir(workdir)
+            results = run_micro(
+                types=args.types,
+                pets=args.pets,
+                threads=args.threads,
+                journal_dir=os.path.join(workdir, "journal") if args.journal else None
+            )
+    else:
+        from benchmarks.load import SCENARIOS, run_load
+        parameters["scenario"] = args.scenario or list(SCENARIOS)
+        results = run_load(
+            scenarios=parameters["scenario"],
+            requests=args.requests,
+            concurrency=args.concurrency,
+            types=args.types,
+            pets_per_type=args.pets_per_type,
+            pictures=args.pictures,
+            workers=args.workers,
+            ninja_latency=args.ninja_latency,
+            image_latency=args.image_latency,
+            image_bytes=args.image_bytes
+        )
+
+    write_results(args.command, parameters, results, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+End-to-end load scenarios. Each one starts the app under uvicorn in its
+own process, with an empty store and the Ninja API and image host
+replaced by StubServers, then drives it over HTTP from `concurrency`
+concurrent clients.
+
+    create-heavy    POST /pet-types (one Ninja lookup each), then POST pets
+    filter-heavy    pet type filters, birthdate ranges and single pets over a seeded store
+    picture-heavy   POST pets with picture URLs, then GET the originals and thumbnails
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import httpx
+from benchmarks.report import summarize
+from benchmarks.stubs import FAMILIES, TEMPERAMENTS, StubServers
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# (kind, method, url, json body, expected status)
+Call = Tuple[str, str, str, Optional[Any], int]
+
+SCENARIOS = ("create-heavy", "filter-heavy", "picture-heavy")
+
+
+class AppServer:
+    """The app under uvicorn in a child process, working in a temp directory"""
+
+    def __init__(self, stubs: StubServers, workers: int = 1, env: Optional[Dict[str, str]] = None):
+        self.stubs = stubs
+        self.workers = workers
+        self.env = env or {}
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._workdir = tempfile.TemporaryDirectory(prefix="petstore-bench-")
+        self._process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "AppServer":
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(APP_DIR),
+            "NINJA_API_URL": self.stubs.ninja_url,
+            "NINJA_API_KEY": os.environ.get("NINJA_API_KEY") or "benchmark",
+            **self.env,
+        }
+        self._process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app:app",
+                "--host", "127.0.0.1", "--port", str(self.port),
+                "--workers", str(self.workers), "--log-level", "warning", "--no-access-log",
+            ],
+            cwd=self._workdir.name,
+            env=env,
+            # The app's debug prints would mix with results written to stdout
+            stdout=subprocess.DEVNULL
+        )
+        self._wait_ready()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        self._workdir.cleanup()
+
+    def _wait_ready(self, timeout: float = 30) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"App server exited with code {self._process.returncode}")
+            try:
+                if httpx.get(self.base_url + "/", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("App server did not start in time")
+
+
+def run_load(
+    scenarios: Iterable[str] = SCENARIOS,
+    requests: int = 2000,
+    concurrency: int = 32,
+    types: int = 50,
+    pets_per_type: int = 100,
+    pictures: int = 200,
+    workers: int = 1,
+    ninja_latency: float = 0.05,
+    image_latency: float = 0.05,
+    image_bytes: int = 64 * 1024,
+    env: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """Returns {"<scenario>/<request kind>": summary}"""
+    results: Dict[str, Any] = {}
+    with StubServers(ninja_latency, image_latency, image_bytes) as stubs:
+        for scenario in scenarios:
+            with AppServer(stubs, workers, env) as server:
+                print(f"Running {scenario}", file=sys.stderr)
+                phases = asyncio.run(_SCENARIO_RUNNERS[scenario](
+                    server.base_url, stubs, requests, concurrency, types, pets_per_type, pictures
+                ))
+                for kind, summary in phases.items():
+                    results[f"{scenario}/{kind}"] = summary
+    return results
+
+
+async def _create_heavy(base_url, stubs, requests, concurrency, types, pets_per_type, pictures):
+    async with _client(base_url, concurrency) as client:
+        results = await _drive(client, (
+            ("create_pet_type", "POST", "/pet-types", {"type": f"Breed-{i:05d}"}, 201)
+            for i in range(types)
+        ), concurrency)
+        results.update(await _drive(client, (
+            ("create_pet", "POST", f"/pet-types/{1 + i % types}/pets",
+             {"name": f"Pet-{i:07d}", "birthdate": _birthdate(i)}, 201)
+            for i in range(requests)
+        ), concurrency))
+    return results
+
+
+async def _filter_heavy(base_url, stubs, requests, concurrency, types, pets_per_type, pictures):
+    async with _client(base_url, concurrency) as client:
+        await _seed(client, types, pets_per_type)
+
+        def calls() -> Iterator[Call]:
+            for i in range(requests):
+                type_id = 1 + i % types
+                kind = i % 4
+                if kind == 0:
+                    yield ("filter_family", "GET", f"/pet-types?family={FAMILIES[i % len(FAMILIES)]}", None, 200)
+                elif kind == 1:
+                    attribute = TEMPERAMENTS[i % len(TEMPERAMENTS)]
+                    yield ("filter_attribute", "GET", f"/pet-types?hasAttribute={attribute}", None, 200)
+                elif kind == 2:
+                    yield ("filter_birthdate", "GET",
+                           f"/pet-types/{type_id}/pets?birthdateGT=01-01-2010&birthdateLT=01-01-2014", None, 200)
+                else:
+                    name = f"Pet-{(i // types) % pets_per_type * types + type_id - 1:07d}"
+                    yield ("get_pet", "GET", f"/pet-types/{type_id}/pets/{name}", None, 200)
+
+        await _warm_up(client, calls(), concurrency)
+        return await _drive(client, calls(), concurrency)
+
+
+async def _picture_heavy(base_url, stubs, requests, concurrency, types, pets_per_type, pictures):
+    async with _client(base_url, concurrency) as client:
+        await _seed(client, types, 0)
+        created: List[str] = []
+        results = await _drive(client, (
+            ("create_pet_with_picture", "POST", f"/pet-types/{1 + i % types}/pets",
+             {"name": f"Pic-{i:07d}", "picture": stubs.image_url(f"picture-{i}")}, 201)
+            for i in range(pictures)
+        ), concurrency, created)
+
+        files = [picture for picture in created if picture and picture != "NA"]
+        if not files:
+            raise RuntimeError("No pictures were stored")
+
+        def calls() -> Iterator[Call]:
+            for i in range(requests):
+                file_name = files[i % len(files)]
+                if i % 2:
+                    yield ("get_picture_thumb", "GET", f"/pictures/{file_name}?size=thumb", None, 200)
+                else:
+                    yield ("get_picture", "GET", f"/pictures/{file_name}", None, 200)
+
+        # Renders every thumbnail once, like a warm variants cache would have
+        await _warm_up(client, calls(), concurrency, count=2 * len(files))
+        results.update(await _drive(client, calls(), concurrency))
+    return results
+
+
+_SCENARIO_RUNNERS = {
+    "create-heavy": _create_heavy,
+    "filter-heavy": _filter_heavy,
+    "picture-heavy": _picture_heavy,
+}
+
+
+async def _seed(client: httpx.AsyncClient, types: int, pets_per_type: int) -> None:
+    """Create types pet types (ids 1..types) and pets_per_type pets for each, through the batch endpoints"""
+    response = await client.post("/pet-types/batch", json=[{"type": f"Breed-{i:05d}"} for i in range(types)])
+    response.raise_for_status()
+    if pets_per_type:
+        for type_index in range(types):
+            pets = [
+                {"name": f"Pet-{n * types + type_index:07d}", "birthdate": _birthdate(n)}
+                for n in range(pets_per_type)
+            ]
+            response = await client.post(f"/pet-types/{type_index + 1}/pets/batch", json=pets)
+            response.raise_for_status()
+
+
+async def _warm_up(client: httpx.AsyncClient, calls: Iterator[Call], concurrency: int, count: int = 200) -> None:
+    await _drive(client, (call for _, call in zip(range(count), calls)), concurrency)
+
+
+async def _drive(
+    client: httpx.AsyncClient,
+    calls: Iterable[Call],
+    concurrency: int,
+    pictures: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Send calls from concurrency workers and summarize each kind. Responses
+    with another status than expected count as errors. Picture names of
+    created pets are collected into pictures when given.
+    """
+    pending = iter(calls)
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+
+    async def worker() -> None:
+        for kind, method, url, body, expected in pending:
+            before = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                failed = response.status_code != expected
+            except httpx.HTTPError:
+                response = None
+                failed = True
+            latencies.setdefault(kind, []).append(time.perf_counter() - before)
+            if failed:
+                errors[kind] = errors.get(kind, 0) + 1
+            elif pictures is not None and response is not None:
+                pictures.append(response.json().get("picture"))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {kind: summarize(values, elapsed, errors.get(kind, 0)) for kind, values in latencies.items()}
+
+
+def _client(base_url: str, concurrency: int) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=60,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    )
+
+
+def _birthdate(index: int) -> str:
+    return f"{1 + index % 28:02d}-{1 + index % 12:02d}-{2005 + index % 18}"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,160 @@
+"""
+Microbenchmarks of InMemoryDatabase operations, timed one call at a time
+against a store filled with `types` pet types and `pets` pets.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from benchmarks.report import summarize
+from benchmarks.stubs import FAMILIES, TEMPERAMENTS, animal_record
+
+
+def run_micro(
+    types: int = 200,
+    pets: int = 20000,
+    threads: int = 8,
+    journal_dir: Optional[str] = None,
+    seed: int = 1
+) -> Dict[str, Any]:
+    """Returns {operation: summary}"""
+    # Imported here so the caller picks the working directory first: the store puts pictures/ there
+    from database.memory_db import InMemoryDatabase
+    from models.pet import Pet, birthdate_ordinal
+    from models.pet_type import PetType
+
+    rng = random.Random(seed)
+    db = InMemoryDatabase(journal_dir=journal_dir)
+    results: Dict[str, Any] = {}
+
+    def pet_type(index: int) -> PetType:
+        record = animal_record(f"Breed-{index:05d}")
+        return PetType(
+            id=db.generate_id(),
+            type=record["name"],
+            family=record["taxonomy"]["family"],
+            genus=record["taxonomy"]["genus"],
+            attributes=record["characteristics"]["temperament"].split(", "),
+            lifespan=8 + index % 10
+        )
+
+    def pet(index: int) -> Pet:
+        return Pet(
+            name=f"Pet-{index:07d}",
+            birthdate=f"{1 + index % 28:02d}-{1 + index % 12:02d}-{2005 + index % 18}",
+            picture="NA"
+        )
+
+    new_types = [pet_type(i) for i in range(types)]
+    type_ids = [created.id for created in new_types]
+    results["add_pet_type"] = _time_calls(db.add_pet_type, new_types)
+
+    owners = [type_ids[i % types] for i in range(pets)]
+    new_pets = [pet(i) for i in range(pets)]
+    results["add_pet"] = _time_calls(lambda i: db.add_pet(owners[i], new_pets[i]), range(pets))
+
+    lookups = [rng.randrange(pets) for _ in range(pets)]
+    results["get_pet"] = _time_calls(lambda i: db.get_pet(owners[i], new_pets[i].name), lookups)
+    results["get_pet_type"] = _time_calls(lambda i: db.get_pet_type(type_ids[i % types]), lookups)
+    results["get_all_pet_types"] = _time_calls(lambda _: db.get_all_pet_types(), range(1000))
+
+    probes = min(2000, pets)
+    results["find_pet_types_family"] = _time_calls(
+        lambda i: db.find_pet_types(family=FAMILIES[i % len(FAMILIES)]), range(probes)
+    )
+    results["find_pet_types_attribute"] = _time_calls(
+        lambda i: db.find_pet_types(has_attribute=TEMPERAMENTS[i % len(TEMPERAMENTS)]), range(probes)
+    )
+    results["find_pet_types_combined"] = _time_calls(
+        lambda i: db.find_pet_types(
+            family=FAMILIES[i % len(FAMILIES)],
+            has_attribute=TEMPERAMENTS[i % len(TEMPERAMENTS)]
+        ),
+        range(probes)
+    )
+    results["get_all_pets"] = _time_calls(lambda i: db.get_all_pets(type_ids[i % types]), range(probes))
+
+    # About a fifth of the birthdates of each type
+    after = birthdate_ordinal("01-01-2010")
+    before = birthdate_ordinal("01-01-2014")
+    results["get_pets_by_birthdate"] = _time_calls(
+        lambda i: db.get_pets_by_birthdate(type_ids[i % types], after=after, before=before), range(probes)
+    )
+
+    updates = rng.sample(range(pets), min(pets, 5000))
+    results["update_pet"] = _time_calls(
+        lambda i: db.update_pet(
+            owners[i],
+            new_pets[i].name,
+            Pet(name=new_pets[i].name, birthdate="01-01-2020", picture="NA")
+        ),
+        updates
+    )
+
+    results["add_pet_threads"] = _time_threads(
+        lambda i: db.add_pet(type_ids[i % types], pet(pets + i)),
+        count=min(pets, 20000),
+        threads=threads
+    )
+
+    # What the pet routers do per create, against one type holding all of `pets`
+    crowded = pet_type(types)
+    db.add_pet_type(crowded)
+    for i in range(pets):
+        db.add_pet(crowded.id, pet(2 * pets + i))
+    creates = min(pets, 5000)
+    results["add_pet_after_get_pet_type"] = _time_calls(
+        lambda i: db.get_pet_type(crowded.id) and db.add_pet(crowded.id, pet(3 * pets + i)),
+        range(creates)
+    )
+    results["add_pet_after_get_pet_type_name"] = _time_calls(
+        lambda i: db.get_pet_type_name(crowded.id) and db.add_pet(crowded.id, pet(4 * pets + i)),
+        range(creates)
+    )
+
+    deletes = rng.sample(range(pets), min(pets, 5000))
+    results["delete_pet"] = _time_calls(lambda i: db.delete_pet(owners[i], new_pets[i].name), deletes)
+    results["delete_pet_type"] = _time_calls(lambda i: db.delete_pet_type(type_ids[i]), range(types))
+
+    db.close()
+    return results
+
+
+def _time_calls(call: Callable[[Any], Any], arguments: Sequence[Any]) -> Dict[str, Any]:
+    latencies = []
+    started = time.perf_counter()
+    for argument in arguments:
+        before = time.perf_counter()
+        call(argument)
+        latencies.append(time.perf_counter() - before)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def _time_threads(call: Callable[[int], Any], count: int, threads: int) -> Dict[str, Any]:
+    """count calls shared out over threads running at once; throughput is for all of them"""
+    latencies: List[float] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def work(indexes: range) -> None:
+        mine = []
+        barrier.wait()
+        for i in indexes:
+            before = time.perf_counter()
+            call(i)
+            mine.append(time.perf_counter() - before)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [
+        threading.Thread(target=work, args=(range(n, count, threads),))
+        for n in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return summarize(latencies, time.perf_counter() - started)
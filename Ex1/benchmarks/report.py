@@ -0,0 +1,114 @@
+"""
+Benchmark results as JSON documents:
+
+    {
+        "kind": "micro" | "load",
+        "environment": {"commit": ..., "dirty": ..., "python": ..., ...},
+        "parameters": {...},
+        "results": {"<name>": {"count": ..., "ops_per_sec": ..., "p50_ms": ..., ...}, ...}
+    }
+
+Every result carries ops_per_sec and latency percentiles in milliseconds,
+which is what compare() lines up between two runs.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def summarize(latencies: Sequence[float], elapsed: float, errors: int = 0) -> Dict[str, Any]:
+    """Throughput and latency percentiles for latencies (seconds) measured over elapsed seconds"""
+    ordered = sorted(latencies)
+    count = len(ordered)
+
+    def percentile(p: float) -> float:
+        if not ordered:
+            return 0.0
+        return round(ordered[min(count - 1, int(p * count))] * 1000, 4)
+
+    return {
+        "count": count,
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "ops_per_sec": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(ordered) / count * 1000, 4) if count else 0.0,
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """Where the numbers come from, so runs of different commits can be told apart"""
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(kind: str, parameters: Dict[str, Any], results: Dict[str, Any], output: Optional[str]) -> None:
+    """Write the results document to output, or stdout when it is None or "-" """
+    document = json.dumps(
+        {"kind": kind, "environment": environment(), "parameters": parameters, "results": results},
+        indent=2
+    )
+    if output and output != "-":
+        Path(output).write_text(document + "\n")
+        print(f"Results written to {output}", file=sys.stderr)
+    else:
+        print(document)
+
+
+def compare(base_path: str, new_path: str, metrics: Sequence[str] = ("ops_per_sec", "p50_ms", "p99_ms")) -> None:
+    """Print every result of two runs side by side, with the change in percent"""
+    base = json.loads(Path(base_path).read_text())
+    new = json.loads(Path(new_path).read_text())
+    print(f"base {_describe(base)}")
+    print(f"new  {_describe(new)}")
+
+    rows: List[List[str]] = [["result", "metric", "base", "new", "change"]]
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        for metric in metrics:
+            old_value = base["results"].get(name, {}).get(metric)
+            new_value = new["results"].get(name, {}).get(metric)
+            change = ""
+            if old_value and new_value is not None:
+                change = f"{(new_value - old_value) / old_value * 100:+.1f}%"
+            rows.append([name, metric, _format(old_value), _format(new_value), change])
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+def _describe(document: Dict[str, Any]) -> str:
+    env = document.get("environment", {})
+    commit = (env.get("commit") or "unknown")[:12]
+    return f"{document.get('kind')} @ {commit}{' (dirty)' if env.get('dirty') else ''} {env.get('timestamp', '')}"
+
+
+def _format(value: Any) -> str:
+    return "-" if value is None else str(value)
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", *args], cwd=REPO_DIR, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
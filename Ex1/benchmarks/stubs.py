@@ -0,0 +1,143 @@
+"""
+Local stand-ins for the services the app calls out to
+
+    GET /v1/animals?name=<name>     Ninja animals API; names starting with
+                                    "unknown" get an empty result
+    GET /images/<name>.png|.jpg     a picture of about image_bytes bytes,
+                                    optionally ?bytes=N for another size
+
+Every response is delayed by the configured latency, so upstream time
+shows up in the measurements the way a remote service would.
+"""
+
+import io
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from PIL import Image
+
+FAMILIES = ["Canidae", "Felidae", "Leporidae", "Muridae", "Psittacidae", "Cyprinidae", "Equidae", "Caviidae"]
+GENERA = ["Canis", "Felis", "Oryctolagus", "Mus", "Ara", "Carassius", "Equus", "Cavia"]
+TEMPERAMENTS = ["Loyal", "Playful", "Calm", "Curious", "Social", "Independent", "Alert", "Gentle", "Active", "Shy"]
+
+
+def animal_record(name: str) -> dict:
+    """Deterministic Ninja API record for name, spread over a few families"""
+    seed = sum(name.encode())
+    return {
+        "name": name,
+        "taxonomy": {
+            "family": FAMILIES[seed % len(FAMILIES)],
+            "genus": GENERA[seed % len(GENERA)],
+        },
+        "characteristics": {
+            "temperament": ", ".join(TEMPERAMENTS[(seed + i) % len(TEMPERAMENTS)] for i in range(3)),
+            "lifespan": f"{8 + seed % 10} - {12 + seed % 10} years",
+        },
+    }
+
+
+def make_image(image_format: str, size: int) -> bytes:
+    """A valid image of roughly size bytes; random pixels keep it from compressing"""
+    side = max(8, int((size / 3) ** 0.5))
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=95)
+    return buffer.getvalue()
+
+
+class StubServers:
+    """Ninja API and image host on one loopback port, served from background threads"""
+
+    def __init__(self, ninja_latency: float = 0.0, image_latency: float = 0.0, image_bytes: int = 64 * 1024):
+        self.ninja_latency = ninja_latency
+        self.image_latency = image_latency
+        self.image_bytes = image_bytes
+        self.hits: Dict[str, int] = {"ninja": 0, "image": 0}
+        self._images: Dict[Tuple[str, int], bytes] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def ninja_url(self) -> str:
+        return f"{self.base_url}/v1/animals"
+
+    def image_url(self, name: str, extension: str = "png") -> str:
+        return f"{self.base_url}/images/{name}.{extension}"
+
+    def start(self) -> "StubServers":
+        stubs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stubs._handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StubServers":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _count(self, service: str) -> None:
+        with self._lock:
+            self.hits[service] += 1
+
+    def _image(self, image_format: str, size: int) -> bytes:
+        # Rendered once per format and size, then served from memory
+        with self._lock:
+            key = (image_format, size)
+            if key not in self._images:
+                self._images[key] = make_image(image_format, size)
+            return self._images[key]
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        url = urlsplit(handler.path)
+        query = parse_qs(url.query)
+        if url.path == "/v1/animals":
+            self._count("ninja")
+            time.sleep(self.ninja_latency)
+            name = query.get("name", [""])[0]
+            records = [] if name.lower().startswith("unknown") else [animal_record(name)]
+            self._send(handler, 200, "application/json", json.dumps(records).encode())
+        elif url.path.startswith("/images/"):
+            self._count("image")
+            time.sleep(self.image_latency)
+            size = int(query.get("bytes", [self.image_bytes])[0])
+            if url.path.endswith(".jpg"):
+                self._send(handler, 200, "image/jpeg", self._image("JPEG", size))
+            else:
+                self._send(handler, 200, "image/png", self._image("PNG", size))
+        else:
+            self._send(handler, 404, "application/json", b"{}")
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, content_type: str, body: bytes) -> None:
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
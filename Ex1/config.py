@@ -0,0 +1,76 @@
+import os
+from typing import Optional
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+def _optional(name: str) -> Optional[str]:
+    value = os.getenv(name)
+    return value if value else None
+
+# Ninja animals API
+NINJA_API_URL = os.getenv("NINJA_API_URL", "https://api.api-ninjas.com/v1/animals")
+# Local file of animal records served before the API (refresh with: python -m services.taxonomy refresh FILE)
+NINJA_TAXONOMY_FILE = _optional("NINJA_TAXONOMY_FILE")
+NINJA_TAXONOMY_FALLBACK = os.getenv("NINJA_TAXONOMY_FALLBACK", "true").lower() == "true"  # ask the API for animals missing from the file
+
+# Ninja API response cache
+NINJA_CACHE_SIZE = int(os.getenv("NINJA_CACHE_SIZE", "1024"))
+NINJA_CACHE_TTL = float(os.getenv("NINJA_CACHE_TTL", "86400"))  # seconds
+NINJA_CACHE_NEGATIVE_TTL = float(os.getenv("NINJA_CACHE_NEGATIVE_TTL", "300"))  # seconds
+NINJA_CACHE_FILE = _optional("NINJA_CACHE_FILE")  # persist the cache across restarts when set
+NINJA_CACHE_FLUSH_INTERVAL = float(os.getenv("NINJA_CACHE_FLUSH_INTERVAL", "5"))  # seconds between writes of the cache file
+
+# Outbound HTTP connection pooling
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # number of hosts kept pooled
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))  # keep-alive connections per host
+HTTP_POOL_BLOCK = os.getenv("HTTP_POOL_BLOCK", "false").lower() == "true"  # wait for a free connection instead of opening extra ones
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))  # seconds
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))  # seconds
+HTTP_ASYNC_MAX_CONNECTIONS = int(os.getenv("HTTP_ASYNC_MAX_CONNECTIONS", "2000"))  # async client, all hosts
+HTTP_ASYNC_MAX_PER_HOST = int(os.getenv("HTTP_ASYNC_MAX_PER_HOST", "200"))  # async client, concurrent requests per host
+HTTP_MAX_REDIRECTS = int(os.getenv("HTTP_MAX_REDIRECTS", "10"))  # redirects followed per request
+
+# Picture downloads
+MAX_PICTURE_BYTES = int(os.getenv("MAX_PICTURE_BYTES", str(10 * 1024 * 1024)))
+PICTURE_CHUNK_SIZE = int(os.getenv("PICTURE_CHUNK_SIZE", str(64 * 1024)))
+PICTURE_VERIFY = os.getenv("PICTURE_VERIFY", "false").lower() == "true"  # decode-check downloads with Pillow before storing them
+
+# Picture serving
+PICTURE_CACHE_CONTROL = os.getenv("PICTURE_CACHE_CONTROL", "public, max-age=300")
+PICTURE_CACHE_BYTES = int(os.getenv("PICTURE_CACHE_BYTES", str(64 * 1024 * 1024)))  # 0 disables the hot picture cache
+PICTURE_CACHE_MAX_ITEM_BYTES = int(os.getenv("PICTURE_CACHE_MAX_ITEM_BYTES", str(2 * 1024 * 1024)))  # larger pictures are always served from disk
+
+# Picture storage: "files" stores one file per picture name, "content-addressed"
+# stores each distinct image once and points picture names at it
+PICTURE_STORAGE = os.getenv("PICTURE_STORAGE", "files")
+PICTURE_STATS_RESCAN_INTERVAL = float(os.getenv("PICTURE_STATS_RESCAN_INTERVAL", "60"))  # seconds; shared stores recount what other processes wrote
+
+# Storage backend: "memory", "sqlite" or "redis"
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "memory")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "petstore.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = os.getenv("REDIS_PREFIX", "petstore:")  # namespace for every key the store uses
+
+# InMemoryDatabase durability: mutation journal plus periodic snapshots (disabled when unset)
+MEMORY_DB_JOURNAL_DIR = _optional("MEMORY_DB_JOURNAL_DIR")
+JOURNAL_FSYNC_EVERY = int(os.getenv("JOURNAL_FSYNC_EVERY", "64"))  # records between fsyncs
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", "1.0"))  # max seconds a record waits for fsync
+JOURNAL_SNAPSHOT_EVERY = int(os.getenv("JOURNAL_SNAPSHOT_EVERY", "100000"))  # records between snapshots
+
+# Batch endpoints
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "32"))  # items of one batch processed at a time
+
+# Background picture downloads (POST .../pets?async=true)
+PICTURE_JOB_WORKERS = int(os.getenv("PICTURE_JOB_WORKERS", "8"))
+PICTURE_JOB_RETRIES = int(os.getenv("PICTURE_JOB_RETRIES", "3"))  # extra attempts after a transient failure
+PICTURE_JOB_RETRY_DELAY = float(os.getenv("PICTURE_JOB_RETRY_DELAY", "1.0"))  # seconds before the first retry, doubled each time
+PICTURE_JOB_HISTORY = int(os.getenv("PICTURE_JOB_HISTORY", "10000"))  # finished jobs kept for status lookups
+
+# Resized picture variants (GET /pictures/{file_name}?w=&h= or ?size=)
+PICTURE_SIZE_PRESETS = os.getenv("PICTURE_SIZE_PRESETS", "thumb=200x200,small=480x480,medium=1024x1024")
+PICTURE_MAX_DIMENSION = int(os.getenv("PICTURE_MAX_DIMENSION", "4096"))  # largest w or h a client may ask for
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))  # processes for Pillow work
+PICTURE_TRANSCODE = os.getenv("PICTURE_TRANSCODE", "true").lower() == "true"  # serve WebP/AVIF to clients that accept them
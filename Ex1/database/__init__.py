@@ -0,0 +1,47 @@
+import threading
+from typing import Any, Callable, Optional
+from config import DATABASE_BACKEND
+from .interface import DatabaseInterface
+
+def create_database(backend: str = DATABASE_BACKEND) -> DatabaseInterface:
+    """Create the database selected by the DATABASE_BACKEND setting"""
+    if backend == "memory":
+        from .memory_db import InMemoryDatabase
+        return InMemoryDatabase()
+    if backend == "sqlite":
+        from .sqlite_db import SQLiteDatabase
+        return SQLiteDatabase()
+    if backend == "redis":
+        from .redis_db import RedisDatabase
+        return RedisDatabase()
+    raise ValueError(f"Unknown DATABASE_BACKEND '{backend}'")
+
+class LazyDatabase:
+    """
+    Stands in for the database, which is created on first use (or by open())
+    rather than on import: image pool workers import the main module, and so
+    the routers, without ever using the store
+    """
+
+    def __init__(self, factory: Callable[[], DatabaseInterface]):
+        self._factory = factory
+        self._database: Optional[DatabaseInterface] = None
+        self._lock = threading.Lock()
+
+    def open(self) -> DatabaseInterface:
+        if self._database is None:
+            with self._lock:
+                if self._database is None:
+                    self._database = self._factory()
+        return self._database
+
+    def close(self) -> None:
+        """Close the database if it was ever opened"""
+        if self._database is not None:
+            self._database.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.open(), name)
+
+# Global database instance
+db = LazyDatabase(create_database)
@@ -1,14 +1,24 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
 from models.pet_type import PetType
 from models.pet import Pet
+from .picture_cache import CachedPicture
 
 class DatabaseInterface(ABC):
     """Abstract interface for database operations"""
+
+    # Directory holding the pictures; temp files for save_picture_file must be created in it
+    pictures_dir: Path
+    
+    @abstractmethod
+    def generate_id(self) -> str:
+        """Generate a new unique pet type ID"""
+        pass
     
     @abstractmethod
     def add_pet_type(self, pet_type: PetType) -> bool:
-        """Add a new pet type to the database"""
+        """Add a new pet type to the database; False, storing nothing, if another pet type has its type name"""
         pass
     
     @abstractmethod
@@ -17,10 +27,33 @@ class DatabaseInterface(ABC):
         pass
     
     @abstractmethod
-    def get_all_pet_types(self) -> List[PetType]:
+    def get_pet_type_name(self, pet_type_id: str) -> Optional[str]:
+        """Get the type name of a pet type without loading its pets; None if there is no such pet type"""
+        pass
+    
+    @abstractmethod
+    def get_all_pet_types(self) -> Sequence[PetType]:
         """Get all pet types"""
         pass
     
+    @abstractmethod
+    def get_pet_type_seq(self, pet_type_id: str) -> Optional[int]:
+        """Get the insertion sequence of a pet type (pet type listings are ordered by it); None once it is gone"""
+        pass
+    
+    @abstractmethod
+    def find_pet_types(
+        self,
+        id: Optional[str] = None,
+        type: Optional[str] = None,
+        family: Optional[str] = None,
+        genus: Optional[str] = None,
+        lifespan: Optional[int] = None,
+        has_attribute: Optional[str] = None
+    ) -> Sequence[PetType]:
+        """Get pet types matching all given filters (string filters are case-insensitive)"""
+        pass
+    
     @abstractmethod
     def delete_pet_type(self, pet_type_id: str) -> bool:
         """Delete a pet type by ID. Returns True if successful."""
@@ -42,10 +75,25 @@ class DatabaseInterface(ABC):
         pass
     
     @abstractmethod
-    def get_all_pets(self, pet_type_id: str) -> List[Pet]:
+    def get_all_pets(self, pet_type_id: str) -> Sequence[Pet]:
         """Get all pets of a specific pet type"""
         pass
     
+    @abstractmethod
+    def get_pet_seq(self, pet_type_id: str, pet_name: str) -> Optional[int]:
+        """Get the insertion sequence of a stored pet (pet listings are ordered by it); None once it is gone"""
+        pass
+    
+    @abstractmethod
+    def get_pets_by_birthdate(
+        self,
+        pet_type_id: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None
+    ) -> List[Pet]:
+        """Get pets of a pet type born strictly between two day ordinals (pets without a birthdate are excluded)"""
+        pass
+    
     @abstractmethod
     def update_pet(self, pet_type_id: str, pet_name: str, pet: Pet) -> bool:
         """Update a pet. Returns True if successful."""
@@ -66,11 +114,26 @@ class DatabaseInterface(ABC):
         """Save a picture file"""
         pass
     
+    @abstractmethod
+    def save_picture_file(self, file_name: str, source_path: Path) -> None:
+        """Move a fully written temp file (on the same filesystem) into place as a picture"""
+        pass
+    
     @abstractmethod
     def get_picture(self, file_name: str) -> Optional[bytes]:
         """Get a picture file"""
         pass
     
+    @abstractmethod
+    def get_cached_picture(self, file_name: str) -> Optional[CachedPicture]:
+        """Get a picture from the in-process picture cache, loading it on a miss. None if missing or too large to cache"""
+        pass
+    
+    @abstractmethod
+    def get_picture_path(self, file_name: str) -> Optional[Path]:
+        """Get the path of a stored picture file, None if there is no such picture"""
+        pass
+    
     @abstractmethod
     def delete_picture(self, file_name: str) -> bool:
         """Delete a picture file. Returns True if successful."""
@@ -79,4 +142,49 @@ class DatabaseInterface(ABC):
     @abstractmethod
     def picture_exists(self, file_name: str) -> bool:
         """Check if a picture exists"""
-        pass
\ No newline at end of file
+        pass
+    
+    @abstractmethod
+    def stage_picture_copy(self, file_name: str) -> Optional[Path]:
+        """Copy a stored picture to a temp file that can be passed to save_picture_file. None if it does not exist"""
+        pass
+    
+    @abstractmethod
+    def get_variants_dir(self, file_name: str) -> Path:
+        """Directory for derived versions of a picture (resized, transcoded); removed when the picture is replaced or deleted"""
+        pass
+    
+    @abstractmethod
+    def get_pet_url(self, pet_type: str, pet_name: str) -> Optional[str]:
+        """Get the URL used by a specific pet"""
+        pass
+    
+    @abstractmethod
+    def save_pet_url(self, pet_type: str, pet_name: str, url: str, file_name: Optional[str] = None) -> None:
+        """Save URL for a specific pet, and the picture file downloaded from it"""
+        pass
+    
+    @abstractmethod
+    def delete_pet_url(self, pet_type: str, pet_name: str) -> None:
+        """Delete URL for a specific pet"""
+        pass
+    
+    @abstractmethod
+    def url_already_used(self, url: str) -> bool:
+        """Check if any pet already uses this URL"""
+        pass
+    
+    @abstractmethod
+    def get_url_picture(self, url: str) -> Optional[str]:
+        """Get a stored picture file that was downloaded from this URL"""
+        pass
+    
+    @abstractmethod
+    def get_stats(self) -> Dict[str, int]:
+        """Sizes for monitoring: pet_types, pets, and the picture store's stats"""
+        pass
+    
+    @abstractmethod
+    def close(self) -> None:
+        """Flush and release resources on shutdown"""
+        pass
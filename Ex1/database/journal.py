@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional
+
+class MutationLog:
+    """
+    Append-only log of store mutations with periodic snapshots.
+
+    Every record is written to the OS immediately, so a crashed process
+    loses nothing; fsync is batched to every fsync_every records or
+    fsync_interval seconds, which bounds what a machine crash can lose.
+    After snapshot_every records the full state is written to a new
+    snapshot and the log starts over, keeping restarts fast.
+
+    Writers wrap each logged mutation in recording(); a snapshot waits
+    for those to finish so it never falls between a record and its effect.
+    """
+
+    SNAPSHOT_FILE = "snapshot.json"
+    LOG_FILE = "journal.log"
+
+    def __init__(
+        self,
+        directory: Path,
+        fsync_every: int,
+        fsync_interval: float,
+        snapshot_every: int
+    ):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self.snapshot_path = self.directory / self.SNAPSHOT_FILE
+        self.log_path = self.directory / self.LOG_FILE
+        self.records_since_snapshot = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._log_file = None
+        self._lock = threading.Lock()
+        self._gate = threading.Condition()
+        self._writers = 0
+        self._snapshotting = False
+        self._closed = threading.Event()
+        self._syncer: Optional[threading.Thread] = None
+
+    def load(self) -> Iterator[Any]:
+        """Yield the snapshot state (None if there is none), then every logged record after it"""
+        state = None
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, "r") as f:
+                state = json.load(f)
+        yield state
+
+        if not self.log_path.exists():
+            return
+        with open(self.log_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write at the tail from a crash
+                    break
+                self.records_since_snapshot += 1
+                yield record
+
+    def open(self, snapshot_state: Callable[[], Any]) -> None:
+        """Start appending; call after load() has been consumed"""
+        self.snapshot_state = snapshot_state
+        if self.records_since_snapshot:
+            # Compact the replayed tail so the next restart only reads the snapshot
+            self.snapshot()
+        else:
+            self._log_file = open(self.log_path, "a")
+        self._syncer = threading.Thread(target=self._sync_periodically, daemon=True)
+        self._syncer.start()
+
+    def append(self, record: List[Any]) -> None:
+        with self._lock:
+            self._log_file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._log_file.flush()
+            self._unsynced += 1
+            self.records_since_snapshot += 1
+            if self._unsynced >= self.fsync_every:
+                self._sync()
+
+    @contextmanager
+    def recording(self) -> Iterator[None]:
+        """Hold off snapshots while a mutation is logged and applied"""
+        with self._gate:
+            while self._snapshotting:
+                self._gate.wait()
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._writers -= 1
+                self._gate.notify_all()
+        if self.records_since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self) -> None:
+        """Write the current state to a new snapshot and start an empty log"""
+        with self._gate:
+            while self._snapshotting:
+                self._gate.wait()
+            if self._log_file is not None and self.records_since_snapshot < self.snapshot_every:
+                # Another writer compacted the log while this one waited
+                return
+            self._snapshotting = True
+            while self._writers:
+                self._gate.wait()
+        try:
+            self._write_snapshot()
+        finally:
+            with self._gate:
+                self._snapshotting = False
+                self._gate.notify_all()
+
+    def _write_snapshot(self) -> None:
+        with self._lock:
+            tmp_path = self.snapshot_path.with_name(self.SNAPSHOT_FILE + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self.snapshot_state(), f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # Only drop the log once the snapshot covering it is durable
+            if self._log_file is not None:
+                self._log_file.close()
+            self._log_file = open(self.log_path, "w")
+            self._fsync_directory()
+            self.records_since_snapshot = 0
+            self._unsynced = 0
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            if self._log_file is not None:
+                self._sync()
+                self._log_file.close()
+                self._log_file = None
+
+    def _sync(self) -> None:
+        if self._unsynced:
+            os.fsync(self._log_file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _sync_periodically(self) -> None:
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                if self._log_file is not None and time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+
+    def _fsync_directory(self) -> None:
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -1,20 +1,98 @@
 from .interface import DatabaseInterface
-from typing import Dict, List, Optional
+from .picture_cache import CachedPicture
+from .journal import MutationLog
+from .picture_store import PictureStore
+from typing import ContextManager, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Set, Tuple
 from models.pet_type import PetType
-from models.pet import Pet
+from models.pet import Pet, birthdate_ordinal
 from pathlib import Path
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from contextlib import nullcontext
+from itertools import count
+import gc
+import threading
+from config import (
+    JOURNAL_FSYNC_EVERY,
+    JOURNAL_FSYNC_INTERVAL,
+    JOURNAL_SNAPSHOT_EVERY,
+    MEMORY_DB_JOURNAL_DIR,
+    PICTURE_STORAGE,
+)
+
+# How many sequences of renamed or deleted entries to remember for readers still paging an older snapshot
+RETIRED_SEQS_SIZE = 4096
+
+class _PetsView(NamedTuple):
+    """Immutable copy of one pet type's pets, as of pet version `version`"""
+    version: int
+    pets: Tuple[Pet, ...]  # in listing order
 
 class InMemoryDatabase(DatabaseInterface):
-    def __init__(self):
+    """
+    Writers are serialized per pet type and change the pet dicts and
+    indexes in place, in O(1) (O(log n) for the birthdate index); changes
+    to the pet type registry and URL index take short global locks.
+
+    Readers never see those structures being changed: lookups go through
+    single dict gets, and listings through immutable views that are
+    rebuilt under the type lock by the first read after a write (birthdate
+    searches copy just their matches out under the type lock). PetType
+    objects are never modified once handed out; a type whose pets
+    changed is replaced by a copy with the new names on its next read.
+    """
+
+    def __init__(self, journal_dir: Optional[str] = MEMORY_DB_JOURNAL_DIR):
         self.pet_types: Dict[str, PetType] = {}
         self.pets: Dict[str, Dict[str, Pet]] = {}
-        self.pictures_dir = Path("pictures")
-        self.pictures_dir.mkdir(exist_ok=True)
+        self.pet_names: Dict[str, Dict[str, str]] = {}  # pet_type_id -> casefolded name -> stored name
+        self.pet_order: Dict[str, Dict[str, int]] = {}  # pet_type_id -> stored name -> insertion sequence
+        self.pet_slots: Dict[str, Dict[int, Pet]] = {}  # pet_type_id -> insertion sequence -> pet, in listing order
+        self.birthdate_index: Dict[str, List[Tuple[int, int, Pet]]] = {}  # pet_type_id -> sorted (ordinal, seq, pet)
+        self.birthdate_entries: Dict[str, Dict[str, Tuple[int, int, Pet]]] = {}  # pet_type_id -> name -> entry
+        self.picture_store = PictureStore(
+            Path("pictures"),
+            content_addressed=PICTURE_STORAGE == "content-addressed"
+        )
+        self.pictures_dir = self.picture_store.pictures_dir
         self.pet_urls: Dict[tuple[str, str], str] = {}  # (pet_type, pet_name) -> url
+        self.url_index: Dict[str, Dict[tuple[str, str], Optional[str]]] = {}  # url -> (pet_type, pet_name) -> picture file
+        self.type_order: Dict[str, int] = {}  # pet_type_id -> insertion sequence
+        self.type_index: Dict[str, FrozenSet[str]] = {}  # casefolded type -> pet_type_ids
+        self.family_index: Dict[str, FrozenSet[str]] = {}
+        self.genus_index: Dict[str, FrozenSet[str]] = {}
+        self.lifespan_index: Dict[Optional[int], FrozenSet[str]] = {}
+        self.attribute_index: Dict[str, FrozenSet[str]] = {}  # casefolded attribute -> pet_type_ids
+        self.seq = count()  # next() is atomic, so writers of different pet types can share it
         self.next_id = 1
         self.used_ids = set()
+
+        # Immutable views handed to readers
+        self.pet_type_snapshot: Tuple[PetType, ...] = ()  # republished by every pet type write
+        self.pet_versions: Dict[str, int] = {}  # pet_type_id -> bumped by every pet write
+        self.pet_views: Dict[str, _PetsView] = {}  # rebuilt when behind pet_versions
+        self.stale_pet_types: Set[str] = set()  # pet_type_ids whose PetType.pets lags behind their pets
+        self.retired_seqs: "OrderedDict[tuple, int]" = OrderedDict()
+
+        self.registry_lock = threading.Lock()  # pet_types, type indexes and ids
+        self.url_lock = threading.Lock()
+        self.retired_lock = threading.Lock()
+        self.type_locks: Dict[str, threading.Lock] = {}
+
+        self.journal: Optional[MutationLog] = None
+        if journal_dir:
+            journal = MutationLog(
+                Path(journal_dir),
+                fsync_every=JOURNAL_FSYNC_EVERY,
+                fsync_interval=JOURNAL_FSYNC_INTERVAL,
+                snapshot_every=JOURNAL_SNAPSHOT_EVERY
+            )
+            self._restore(journal)
+            journal.open(self._snapshot_state)
+            self.journal = journal
     
     def generate_id(self) -> str:
+        with self.registry_lock:
             while str(self.next_id) in self.used_ids:
                 self.next_id += 1
             id_str = str(self.next_id)
@@ -23,144 +101,539 @@ class InMemoryDatabase(DatabaseInterface):
             return id_str
 
     def add_pet_type(self, pet_type: PetType) -> bool:
-        self.pet_types[pet_type.id] = pet_type
-        if pet_type.id not in self.pets:
-            self.pets[pet_type.id] = {}
+        # The registry lock covers the name check and the write, so a type name is only ever added once
+        with self._type_lock(pet_type.id), self._recording(), self.registry_lock:
+            if self.type_index.get(pet_type.type.casefold(), frozenset()) - {pet_type.id}:
+                return False
+            self._log([
+                "add_pet_type", pet_type.id, pet_type.type, pet_type.family,
+                pet_type.genus, pet_type.attributes, pet_type.lifespan
+            ])
+            if pet_type.id not in self.pets:
+                self.pets[pet_type.id] = {}
+                self.pet_names[pet_type.id] = {}
+                self.pet_order[pet_type.id] = {}
+                self.birthdate_index[pet_type.id] = []
+                self.birthdate_entries[pet_type.id] = {}
+                self.pet_slots[pet_type.id] = {}
+                self.pet_versions[pet_type.id] = 0
+            # Its pets list is rebuilt from the stored pets on the next read
+            self.stale_pet_types.add(pet_type.id)
+
+            if pet_type.id in self.pet_types:
+                self._unindex_pet_type(self.pet_types[pet_type.id])
+            self.pet_types[pet_type.id] = pet_type
+            self.used_ids.add(pet_type.id)
+            self._index_pet_type(pet_type)
+            self.pet_type_snapshot = tuple(self.pet_types.values())
             return True
-        return False
     
     def get_pet_type(self, pet_type_id: str) -> Optional[PetType]:
+        if pet_type_id in self.stale_pet_types:
+            self._refresh_pet_type(pet_type_id)
         return self.pet_types.get(pet_type_id)
     
-    def get_all_pet_types(self) -> List[PetType]:
-        return list(self.pet_types.values())
+    def get_pet_type_name(self, pet_type_id: str) -> Optional[str]:
+        # Type names never change, so a stale PetType has the right one
+        pet_type = self.pet_types.get(pet_type_id)
+        return pet_type.type if pet_type is not None else None
+    
+    def get_all_pet_types(self) -> Sequence[PetType]:
+        if self.stale_pet_types:
+            for pet_type_id in self.stale_pet_types.copy():
+                self._refresh_pet_type(pet_type_id)
+        return self.pet_type_snapshot
+    
+    def get_pet_type_seq(self, pet_type_id: str) -> Optional[int]:
+        seq = self.type_order.get(pet_type_id)
+        if seq is None:
+            return self.retired_seqs.get((pet_type_id,))
+        return seq
+
+    def find_pet_types(
+        self,
+        id: Optional[str] = None,
+        type: Optional[str] = None,
+        family: Optional[str] = None,
+        genus: Optional[str] = None,
+        lifespan: Optional[int] = None,
+        has_attribute: Optional[str] = None
+    ) -> Sequence[PetType]:
+        candidates: List[FrozenSet[str]] = []
+        if id is not None:
+            candidates.append(frozenset({id}) if id in self.pet_types else frozenset())
+        if type is not None:
+            candidates.append(self.type_index.get(type.casefold(), frozenset()))
+        if family is not None:
+            candidates.append(self.family_index.get(family.casefold(), frozenset()))
+        if genus is not None:
+            candidates.append(self.genus_index.get(genus.casefold(), frozenset()))
+        if lifespan is not None:
+            candidates.append(self.lifespan_index.get(lifespan, frozenset()))
+        if has_attribute is not None:
+            candidates.append(self.attribute_index.get(has_attribute.casefold(), frozenset()))
+
+        if not candidates:
+            return self.get_all_pet_types()
+
+        # Start from the most selective filter so intersections stay small
+        candidates.sort(key=len)
+        matched = set(candidates[0])
+        for candidate in candidates[1:]:
+            if not matched:
+                break
+            matched &= candidate
+
+        # Filter against one snapshot so a concurrent delete cannot leave a gap
+        return [pet_type for pet_type in self.get_all_pet_types() if pet_type.id in matched]
     
     def delete_pet_type(self, pet_type_id: str) -> bool:
-        if pet_type_id in self.pet_types:
-            del self.pet_types[pet_type_id]
+        with self._type_lock(pet_type_id), self._recording():
+            if pet_type_id not in self.pet_types:
+                return False
+            self._log(["delete_pet_type", pet_type_id])
+            with self.registry_lock:
+                self._retire_seq((pet_type_id,), self.type_order[pet_type_id])
+                self._unindex_pet_type(self.pet_types[pet_type_id])
+                del self.pet_types[pet_type_id]
+                self.pet_type_snapshot = tuple(self.pet_types.values())
             if pet_type_id in self.pets:
                 del self.pets[pet_type_id]
+                del self.pet_names[pet_type_id]
+                del self.pet_order[pet_type_id]
+                del self.pet_slots[pet_type_id]
+                del self.birthdate_index[pet_type_id]
+                del self.birthdate_entries[pet_type_id]
+                del self.pet_versions[pet_type_id]
+                self.pet_views.pop(pet_type_id, None)
+            self.stale_pet_types.discard(pet_type_id)
             return True
-        return False
     
     def pet_type_exists(self, type_name: str) -> bool:
-        type_name_lower = type_name.lower()
-        return any(pt.type.lower() == type_name_lower for pt in self.pet_types.values())
+        return bool(self.type_index.get(type_name.casefold()))
+
+    def _pet_type_index_entries(self, pet_type: PetType):
+        """Yield (index, key) pairs under which a pet type is indexed"""
+        yield self.type_index, pet_type.type.casefold()
+        yield self.family_index, pet_type.family.casefold()
+        yield self.genus_index, pet_type.genus.casefold()
+        yield self.lifespan_index, pet_type.lifespan
+        for attribute in pet_type.attributes:
+            yield self.attribute_index, attribute.casefold()
+
+    def _index_pet_type(self, pet_type: PetType) -> None:
+        self.type_order[pet_type.id] = next(self.seq)
+        for index, key in self._pet_type_index_entries(pet_type):
+            index[key] = index.get(key, frozenset()) | {pet_type.id}
+
+    def _unindex_pet_type(self, pet_type: PetType) -> None:
+        self.type_order.pop(pet_type.id, None)
+        for index, key in self._pet_type_index_entries(pet_type):
+            ids = index.get(key)
+            if ids is not None:
+                ids = ids - {pet_type.id}
+                if ids:
+                    index[key] = ids
+                else:
+                    del index[key]
     
     def add_pet(self, pet_type_id: str, pet: Pet) -> bool:
-        if pet_type_id not in self.pets:
-            return False
+        with self._type_lock(pet_type_id), self._recording():
+            if pet_type_id not in self.pets:
+                return False
 
-        if not any(existing_name.lower() == pet.name.lower() for existing_name in self.pets[pet_type_id].keys()):
-            self.pet_types[pet_type_id].pets.append(pet.name)
-            self.pets[pet_type_id][pet.name] = pet
+            if self._stored_name(pet_type_id, pet.name) is not None:
+                return False
+
+            self._log(["add_pet", pet_type_id, pet.name, pet.birthdate, pet.picture])
+            self._link_pet(pet_type_id, pet, next(self.seq))
+            self._pets_changed(pet_type_id, names=True)
             return True
-        return False
 
     def get_pet(self, pet_type_id: str, pet_name: str) -> Optional[Pet]:
-        if pet_type_id in self.pets:
-            for stored_name, pet in self.pets[pet_type_id].items():
-                if stored_name.lower() == pet_name.lower():
-                    return pet
-        return None
+        stored_name = self._stored_name(pet_type_id, pet_name)
+        if stored_name is None:
+            return None
+        return self.pets.get(pet_type_id, {}).get(stored_name)
     
-    def get_all_pets(self, pet_type_id: str) -> List[Pet]:
-        if pet_type_id in self.pets:
-            return list(self.pets[pet_type_id].values())
-        return []
+    def get_all_pets(self, pet_type_id: str) -> Sequence[Pet]:
+        view = self._pets_view(pet_type_id)
+        return view.pets if view is not None else ()
+
+    def get_pet_seq(self, pet_type_id: str, pet_name: str) -> Optional[int]:
+        seq = self.pet_order.get(pet_type_id, {}).get(pet_name)
+        if seq is None:
+            return self.retired_seqs.get((pet_type_id, pet_name))
+        return seq
+
+    def get_pets_by_birthdate(
+        self,
+        pet_type_id: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None
+    ) -> List[Pet]:
+        if pet_type_id not in self.pet_versions:
+            return []
+        # Search the live index under the type lock and copy only the matches,
+        # so a read after a write costs O(log n + matches), not a copy of the index
+        with self._type_lock(pet_type_id):
+            index = self.birthdate_index.get(pet_type_id)
+            if not index:
+                return []
+            # Entries are (ordinal, seq, pet); pad the bounds so equal ordinals are excluded
+            low = bisect_right(index, (after, float("inf"))) if after is not None else 0
+            high = bisect_left(index, (before,)) if before is not None else len(index)
+            if low >= high:
+                return []
+            matched = index[low:high]
+
+        # Keep the same order as get_all_pets
+        matched.sort(key=lambda entry: entry[1])
+        return [pet for _, _, pet in matched]
     
     def update_pet(self, pet_type_id: str, pet_name: str, pet: Pet) -> bool:
-        if pet_type_id in self.pets:
-            # Find the pet with case-insensitive comparison
-            stored_name = None
-            for name in self.pets[pet_type_id].keys():
-                if name.lower() == pet_name.lower():
-                    stored_name = name
-                    break
-            
-            if stored_name:
-                old_pet = self.pets[pet_type_id][stored_name]
-                # Remove old entry
-                del self.pets[pet_type_id][stored_name]
-                # Add with new name (exact case)
-                self.pets[pet_type_id][pet.name] = pet
-                
-                # Update the pet_type's pets list
-                if pet_type_id in self.pet_types:
-                    pets_list = self.pet_types[pet_type_id].pets
-                    if old_pet.name in pets_list:
-                        pets_list.remove(old_pet.name)
-                    pets_list.append(pet.name)
-                
-                return True
-        return False
+        with self._type_lock(pet_type_id), self._recording():
+            stored_name = self._stored_name(pet_type_id, pet_name)
+            if stored_name is None:
+                return False
+
+            self._log(["update_pet", pet_type_id, pet_name, pet.name, pet.birthdate, pet.picture])
+
+            # The new name may collide with a different pet; it gets replaced
+            clashing_name = self._stored_name(pet_type_id, pet.name)
+            if clashing_name is not None and clashing_name != stored_name:
+                self._remove_pet(pet_type_id, clashing_name)
+
+            # Remove old entry, add with new name (exact case); it keeps its place in the listing
+            seq = self._unlink_pet(pet_type_id, stored_name)
+            if stored_name != pet.name:
+                self._retire_seq((pet_type_id, stored_name), seq)
+            self._link_pet(pet_type_id, pet, seq)
+            self._pets_changed(pet_type_id, names=stored_name != pet.name or clashing_name is not None)
+            return True
     
     def delete_pet(self, pet_type_id: str, pet_name: str) -> bool:
-        if pet_type_id in self.pets:
-            # Find the pet with case-insensitive comparison
-            stored_name = None
-            for name in self.pets[pet_type_id].keys():
-                if name.lower() == pet_name.lower():
-                    stored_name = name
-                    break
-            
-            if stored_name:
-                pet = self.pets[pet_type_id][stored_name]
-                del self.pets[pet_type_id][stored_name]
-                
-                # Update the pet_type's pets list
-                if pet_type_id in self.pet_types:
-                    if pet.name in self.pet_types[pet_type_id].pets:
-                        self.pet_types[pet_type_id].pets.remove(pet.name)
-                
-                return True
-        return False
+        with self._type_lock(pet_type_id), self._recording():
+            stored_name = self._stored_name(pet_type_id, pet_name)
+            if stored_name is None:
+                return False
+
+            self._log(["delete_pet", pet_type_id, pet_name])
+
+            self._remove_pet(pet_type_id, stored_name)
+            self._pets_changed(pet_type_id, names=True)
+            return True
     
     def pet_exists(self, pet_type_id: str, pet_name: str) -> bool:
-        if pet_type_id in self.pets:
-            # Check existence with case-insensitive comparison
-            return any(stored_name.lower() == pet_name.lower() for stored_name in self.pets[pet_type_id].keys())
-        return False
+        return self._stored_name(pet_type_id, pet_name) is not None
+
+    @staticmethod
+    def _name_key(pet_name: str) -> str:
+        """Key used for case-insensitive pet name lookups"""
+        return pet_name.casefold()
+
+    def _stored_name(self, pet_type_id: str, pet_name: str) -> Optional[str]:
+        """Resolve a pet name (any case) to the name it is stored under"""
+        names = self.pet_names.get(pet_type_id)
+        if names is None:
+            return None
+        return names.get(self._name_key(pet_name))
+
+    def _type_lock(self, pet_type_id: str) -> threading.Lock:
+        """Lock serializing writers of one pet type; ids are never reused, so locks are kept"""
+        lock = self.type_locks.get(pet_type_id)
+        if lock is None:
+            lock = self.type_locks.setdefault(pet_type_id, threading.Lock())
+        return lock
+
+    def _recording(self) -> ContextManager[None]:
+        if self.journal is None:
+            return nullcontext()
+        return self.journal.recording()
+
+    def _pets_changed(self, pet_type_id: str, names: bool) -> None:
+        """Mark the views of a pet type out of date; call last, under the type lock"""
+        self.pet_versions[pet_type_id] += 1
+        if names:
+            self.stale_pet_types.add(pet_type_id)
+
+    def _pets_view(self, pet_type_id: str) -> Optional[_PetsView]:
+        """Current view of a pet type's pets, None if there is no such pet type"""
+        version = self.pet_versions.get(pet_type_id)
+        view = self.pet_views.get(pet_type_id)
+        if view is not None and view.version == version:
+            return view
+        if version is None:
+            return None
+        with self._type_lock(pet_type_id):
+            return self._build_pets_view(pet_type_id)
+
+    def _build_pets_view(self, pet_type_id: str) -> Optional[_PetsView]:
+        """Build the view if it is out of date; call under the type lock"""
+        version = self.pet_versions.get(pet_type_id)
+        if version is None:
+            return None
+        view = self.pet_views.get(pet_type_id)
+        if view is None or view.version != version:
+            view = _PetsView(version, tuple(self.pet_slots[pet_type_id].values()))
+            self.pet_views[pet_type_id] = view
+        return view
+
+    def _refresh_pet_type(self, pet_type_id: str) -> None:
+        """Replace a stale PetType with a copy listing the current pet names"""
+        with self._type_lock(pet_type_id):
+            if pet_type_id not in self.stale_pet_types:
+                return
+            view = self._build_pets_view(pet_type_id)
+            with self.registry_lock:
+                pet_type = self.pet_types.get(pet_type_id)
+                if pet_type is not None and view is not None:
+                    # model_copy() skips validation; the names are unique already
+                    self.pet_types[pet_type_id] = pet_type.model_copy(
+                        update={"pets": [pet.name for pet in view.pets]}
+                    )
+                    self.pet_type_snapshot = tuple(self.pet_types.values())
+            # Cleared last, so no reader takes the old PetType for a current one
+            self.stale_pet_types.discard(pet_type_id)
+
+    def _retire_seq(self, key: tuple, seq: int) -> None:
+        with self.retired_lock:
+            self.retired_seqs[key] = seq
+            while len(self.retired_seqs) > RETIRED_SEQS_SIZE:
+                self.retired_seqs.popitem(last=False)
+
+    def _link_pet(self, pet_type_id: str, pet: Pet, seq: int) -> None:
+        """Store a pet under seq and add it to the name and birthdate indexes"""
+        self.pets[pet_type_id][pet.name] = pet
+        self.pet_names[pet_type_id][self._name_key(pet.name)] = pet.name
+        self.pet_order[pet_type_id][pet.name] = seq
+        # A seq that is already there keeps its place in the dict, so renamed pets are not moved
+        self.pet_slots[pet_type_id][seq] = pet
+
+        ordinal = birthdate_ordinal(pet.birthdate)
+        if ordinal is not None:
+            # Sequences are unique, so entries never compare their pets
+            entry = (ordinal, seq, pet)
+            insort(self.birthdate_index[pet_type_id], entry)
+            self.birthdate_entries[pet_type_id][pet.name] = entry
+
+    def _unlink_pet(self, pet_type_id: str, stored_name: str) -> int:
+        """
+        Remove a stored pet from the name and birthdate indexes, leaving its slot
+        Returns the pet's insertion sequence
+        """
+        del self.pets[pet_type_id][stored_name]
+        del self.pet_names[pet_type_id][self._name_key(stored_name)]
+        seq = self.pet_order[pet_type_id].pop(stored_name)
+
+        entry = self.birthdate_entries[pet_type_id].pop(stored_name, None)
+        if entry is not None:
+            index = self.birthdate_index[pet_type_id]
+            del index[bisect_left(index, entry[:2])]
+        return seq
+
+    def _remove_pet(self, pet_type_id: str, stored_name: str) -> None:
+        seq = self._unlink_pet(pet_type_id, stored_name)
+        del self.pet_slots[pet_type_id][seq]
+        self._retire_seq((pet_type_id, stored_name), seq)
     
     def save_picture(self, file_name: str, image_data: bytes) -> None:
-        file_path = self.pictures_dir / file_name
-        with open(file_path, 'wb') as f:
-            f.write(image_data)
+        self.picture_store.save(file_name, image_data)
+    
+    def save_picture_file(self, file_name: str, source_path: Path) -> None:
+        self.picture_store.save_file(file_name, source_path)
     
     def get_picture(self, file_name: str) -> Optional[bytes]:
-        file_path = self.pictures_dir / file_name
-        if file_path.exists():
-            with open(file_path, 'rb') as f:
-                return f.read()
-        return None
+        return self.picture_store.get(file_name)
+
+    def get_cached_picture(self, file_name: str) -> Optional[CachedPicture]:
+        return self.picture_store.get_cached(file_name)
+    
+    def get_picture_path(self, file_name: str) -> Optional[Path]:
+        return self.picture_store.get_path(file_name)
     
     def delete_picture(self, file_name: str) -> bool:
-        file_path = self.pictures_dir / file_name
-        if file_path.exists():
-            file_path.unlink()  # Delete the file
-            return True
-        return False
+        return self.picture_store.delete(file_name)
     
     def picture_exists(self, file_name: str) -> bool:
-        file_path = self.pictures_dir / file_name
-        return file_path.exists()
+        return self.picture_store.exists(file_name)
+    
+    def stage_picture_copy(self, file_name: str) -> Optional[Path]:
+        return self.picture_store.stage_copy(file_name)
+    
+    def get_variants_dir(self, file_name: str) -> Path:
+        return self.picture_store.variants_dir(file_name)
     
     def get_pet_url(self, pet_type: str, pet_name: str) -> Optional[str]:
         """Get the URL used by a specific pet"""
         return self.pet_urls.get((pet_type, pet_name))
     
-    def save_pet_url(self, pet_type: str, pet_name: str, url: str) -> None:
-        """Save URL for a specific pet"""
-        self.pet_urls[(pet_type, pet_name)] = url
+    def save_pet_url(self, pet_type: str, pet_name: str, url: str, file_name: Optional[str] = None) -> None:
+        """Save URL for a specific pet, and the picture file downloaded from it"""
+        with self._recording(), self.url_lock:
+            self._log(["save_pet_url", pet_type, pet_name, url, file_name])
+            self._remove_pet_url(pet_type, pet_name)
+            self.pet_urls[(pet_type, pet_name)] = url
+            self.url_index[url] = {**self.url_index.get(url, {}), (pet_type, pet_name): file_name}
     
     def delete_pet_url(self, pet_type: str, pet_name: str) -> None:
         """Delete URL for a specific pet"""
-        if (pet_type, pet_name) in self.pet_urls:
-            del self.pet_urls[(pet_type, pet_name)]
+        with self._recording(), self.url_lock:
+            if (pet_type, pet_name) in self.pet_urls:
+                self._log(["delete_pet_url", pet_type, pet_name])
+                self._remove_pet_url(pet_type, pet_name)
+
+    def _remove_pet_url(self, pet_type: str, pet_name: str) -> None:
+        url = self.pet_urls.pop((pet_type, pet_name), None)
+        if url is None:
+            return
+        users = {key: file for key, file in self.url_index[url].items() if key != (pet_type, pet_name)}
+        if users:
+            self.url_index[url] = users
+        else:
+            del self.url_index[url]
     
     def url_already_used(self, url: str) -> bool:
         """Check if any pet already uses this URL"""
-        return url in self.pet_urls.values()
+        return url in self.url_index
+
+    def get_url_picture(self, url: str) -> Optional[str]:
+        """Get a stored picture file that was downloaded from this URL"""
+        for file_name in self.url_index.get(url, {}).values():
+            if file_name and self.picture_exists(file_name):
+                return file_name
+        return None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "pet_types": len(self.pet_type_snapshot),
+            "pets": sum(len(pets) for pets in list(self.pets.values())),
+            **self.picture_store.stats(),
+        }
+
+    def close(self) -> None:
+        if self.journal is not None:
+            self.journal.close()
+
+    def _log(self, record: list) -> None:
+        if self.journal is not None:
+            self.journal.append(record)
+
+    def _snapshot_state(self) -> dict:
+        # Runs while the journal holds off writers; ids are handed out outside it
+        with self.registry_lock:
+            next_id, used_ids = self.next_id, list(self.used_ids)
+        return {
+            "next_id": next_id,
+            "used_ids": used_ids,
+            "pet_types": [
+                [pt.id, pt.type, pt.family, pt.genus, pt.attributes, pt.lifespan,
+                 [pet.name for pet in self.pet_slots[pt.id].values()]]
+                for pt in list(self.pet_types.values())
+            ],
+            "pets": [
+                [pet_type_id, [[pet.name, pet.birthdate, pet.picture] for pet in slots.values()]]
+                for pet_type_id, slots in self.pet_slots.items()
+            ],
+            "pet_urls": [
+                [pet_type, pet_name, url, self.url_index[url][(pet_type, pet_name)]]
+                for (pet_type, pet_name), url in self.pet_urls.items()
+            ],
+        }
+
+    def _load_state(self, state: dict) -> None:
+        """
+        Fill the empty store from a snapshot straight into its dicts and
+        indexes, each birthdate index sorted once, and publish every pet
+        type once at the end
+        """
+        pets_by_type = dict(state["pets"])
+        ordinals: Dict[str, Optional[int]] = {}  # birthdate -> ordinal; few distinct dates among many pets
+        for pet_type_id, type_name, family, genus, attributes, lifespan, _ in state["pet_types"]:
+            pets: Dict[str, Pet] = {}
+            pet_names: Dict[str, str] = {}
+            pet_order: Dict[str, int] = {}
+            pet_slots: Dict[int, Pet] = {}
+            birthdate_index: List[Tuple[int, int, Pet]] = []
+            birthdate_entries: Dict[str, Tuple[int, int, Pet]] = {}
+            for name, birthdate, picture in pets_by_type.get(pet_type_id, ()):
+                pet = _stored_pet(name, birthdate, picture)
+                seq = next(self.seq)
+                pets[name] = pet
+                pet_names[self._name_key(name)] = name
+                pet_order[name] = seq
+                pet_slots[seq] = pet
+                if birthdate not in ordinals:
+                    ordinals[birthdate] = birthdate_ordinal(birthdate)
+                ordinal = ordinals[birthdate]
+                if ordinal is not None:
+                    entry = (ordinal, seq, pet)
+                    birthdate_index.append(entry)
+                    birthdate_entries[name] = entry
+            birthdate_index.sort()
+
+            self.pets[pet_type_id] = pets
+            self.pet_names[pet_type_id] = pet_names
+            self.pet_order[pet_type_id] = pet_order
+            self.pet_slots[pet_type_id] = pet_slots
+            self.birthdate_index[pet_type_id] = birthdate_index
+            self.birthdate_entries[pet_type_id] = birthdate_entries
+            self.pet_versions[pet_type_id] = 0
+
+            pet_type = _stored_pet_type(pet_type_id, type_name, family, genus, attributes, lifespan, pets)
+            self.pet_types[pet_type_id] = pet_type
+            self._index_pet_type(pet_type)
+        self.pet_type_snapshot = tuple(self.pet_types.values())
+
+        for pet_type, pet_name, url, file_name in state["pet_urls"]:
+            self.pet_urls[(pet_type, pet_name)] = url
+            self.url_index.setdefault(url, {})[(pet_type, pet_name)] = file_name
+        self.next_id = state["next_id"]
+        self.used_ids.update(state["used_ids"])
+
+    def _restore(self, journal: MutationLog) -> None:
+        """Rebuild the store from the last snapshot plus the log after it, without re-logging"""
+        # Collections set off by the millions of objects created here would scan them all, over and over
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            records = journal.load()
+            state = next(records)
+            if state is not None:
+                self._load_state(state)
+
+            # The tail is at most JOURNAL_SNAPSHOT_EVERY records, replayed through the write path
+            for op, *args in records:
+                self._replay(op, args)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _replay(self, op: str, args: list) -> None:
+        if op == "add_pet_type":
+            self.add_pet_type(_stored_pet_type(*args))
+        elif op == "delete_pet_type":
+            self.delete_pet_type(*args)
+        elif op == "add_pet":
+            pet_type_id, name, birthdate, picture = args
+            self.add_pet(pet_type_id, _stored_pet(name, birthdate, picture))
+        elif op == "update_pet":
+            pet_type_id, pet_name, name, birthdate, picture = args
+            self.update_pet(pet_type_id, pet_name, _stored_pet(name, birthdate, picture))
+        elif op == "delete_pet":
+            self.delete_pet(*args)
+        elif op == "save_pet_url":
+            self.save_pet_url(*args)
+        elif op == "delete_pet_url":
+            self.delete_pet_url(*args)
+
+
+# Logged data was validated when it was first written, so replay skips validation
+def _stored_pet_type(pet_type_id, type_name, family, genus, attributes, lifespan, pets=()) -> PetType:
+    return PetType.from_stored(
+        id=pet_type_id, type=type_name, family=family, genus=genus,
+        attributes=attributes, lifespan=lifespan, pets=list(pets)
+    )
 
-# Global database instance
-db = InMemoryDatabase()
\ No newline at end of file
+def _stored_pet(name, birthdate, picture) -> Pet:
+    return Pet.from_stored(name=name, birthdate=birthdate, picture=picture)
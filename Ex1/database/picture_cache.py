@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+@dataclass(frozen=True)
+class CachedPicture:
+    data: bytes
+    size: int
+    mtime_ns: int
+
+
+class PictureCache:
+    """
+    LRU cache of picture bytes bounded by a total memory budget.
+    Callers must invalidate a name whenever its file changes on disk.
+    """
+
+    def __init__(self, budget_bytes: int, max_item_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.max_item_bytes = min(max_item_bytes, budget_bytes)
+        self._entries: "OrderedDict[str, CachedPicture]" = OrderedDict()
+        self._used_bytes = 0
+        self._generation = 0  # bumped on invalidation so in-flight loads of stale data are dropped
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, file_name: str, load: Callable[[int], Optional[CachedPicture]]) -> Optional[CachedPicture]:
+        """
+        Return the cached picture, or call load(max_item_bytes) on a miss
+        and keep its result if it fits. load returns None for missing or
+        oversized pictures.
+        """
+        with self._lock:
+            entry = self._entries.get(file_name)
+            if entry is not None:
+                self._entries.move_to_end(file_name)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            generation = self._generation
+
+        if self.max_item_bytes <= 0:
+            return None
+
+        # Disk read happens outside the lock
+        entry = load(self.max_item_bytes)
+        if entry is None:
+            return None
+
+        with self._lock:
+            if generation == self._generation and file_name not in self._entries:
+                self._entries[file_name] = entry
+                self._used_bytes += entry.size
+                while self._used_bytes > self.budget_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._used_bytes -= evicted.size
+                    self.evictions += 1
+        return entry
+
+    def invalidate(self, file_name: str) -> None:
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.pop(file_name, None)
+            if entry is not None:
+                self._used_bytes -= entry.size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._used_bytes,
+                "budget_bytes": self.budget_bytes,
+            }
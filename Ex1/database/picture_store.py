@@ -0,0 +1,333 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from config import PICTURE_CACHE_BYTES, PICTURE_CACHE_MAX_ITEM_BYTES, PICTURE_STATS_RESCAN_INTERVAL
+from .picture_cache import CachedPicture, PictureCache
+
+# Unreferenced blobs younger than this (seconds) are left by the startup sweep:
+# another process using the same directory may be between moving a blob in
+# and linking a name to it
+BLOB_SWEEP_MIN_AGE = 300
+
+class BlobRefCounts:
+    """In-process blob reference counts, rebuilt from the links on disk at startup"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}  # digest -> number of picture names using it
+
+    def incr(self, digest: str) -> int:
+        self.counts[digest] = self.counts.get(digest, 0) + 1
+        return self.counts[digest]
+
+    def decr(self, digest: str) -> int:
+        refs = self.counts.get(digest, 0) - 1
+        if refs > 0:
+            self.counts[digest] = refs
+        else:
+            self.counts.pop(digest, None)
+        return refs
+
+
+class PictureStore:
+    """
+    Picture files on disk, fronted by the hot picture cache.
+
+    In content-addressed mode every distinct image is stored once as a
+    blob under .blobs/ named by its SHA-256, and each picture name is a
+    symlink to its blob. Blobs are reference counted by the number of
+    names pointing at them and removed when the last name goes away.
+
+    A shared store is one that other processes write to as well: cache
+    hits are checked against the file on disk, blob changes are
+    serialized with a file lock, and blob_refs must then be counts kept
+    in the shared database.
+
+    Derived versions of a picture (resized, transcoded) live under
+    .variants/<file_name>/ and are dropped whenever the picture changes.
+
+    The picture count and bytes on disk for stats() are kept up to date by
+    save and delete; a shared store also recounts the directory every
+    PICTURE_STATS_RESCAN_INTERVAL seconds to pick up other processes' writes.
+    """
+
+    BLOBS_DIR = ".blobs"
+    VARIANTS_DIR = ".variants"
+
+    def __init__(
+        self,
+        pictures_dir: Path,
+        content_addressed: bool = False,
+        blob_refs: Optional[BlobRefCounts] = None,
+        shared: bool = False
+    ):
+        self.pictures_dir = pictures_dir
+        self.pictures_dir.mkdir(exist_ok=True)
+        self.content_addressed = content_addressed
+        self.shared = shared
+        self.cache = PictureCache(PICTURE_CACHE_BYTES, PICTURE_CACHE_MAX_ITEM_BYTES)
+        self.blobs_dir = self.pictures_dir / self.BLOBS_DIR
+        self.variants_root = self.pictures_dir / self.VARIANTS_DIR
+        self._lock = threading.Lock()
+        if content_addressed:
+            self.blobs_dir.mkdir(exist_ok=True)
+        if blob_refs is None:
+            blob_refs = BlobRefCounts()
+            if content_addressed:
+                self._load_blob_refs(blob_refs)
+        self.blob_refs = blob_refs
+
+        self._stats_lock = threading.Lock()
+        self._names: Dict[str, Tuple[int, int]] = {}  # picture name -> (st_dev, st_ino) of its file
+        self._inodes: Dict[Tuple[int, int], List[int]] = {}  # (st_dev, st_ino) -> [size, names using it]
+        self._bytes = 0
+        self._counted_at = 0.0
+        self._count_files()
+
+    def save(self, file_name: str, image_data: bytes) -> None:
+        # Never write in place: picture files may be hard links shared with other names
+        fd, temp_name = tempfile.mkstemp(dir=self.pictures_dir, prefix=".upload-", suffix=".part")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image_data)
+        self.save_file(file_name, Path(temp_name))
+
+    def save_file(self, file_name: str, source_path: Path) -> None:
+        """Move a fully written temp file into place; it is consumed either way"""
+        if not self.content_addressed:
+            # Atomic rename, readers never see a partially written picture
+            os.replace(source_path, self.pictures_dir / file_name)
+            self._track(file_name)
+            self.cache.invalidate(file_name)
+            self._drop_variants(file_name)
+            return
+
+        digest = _file_digest(source_path)
+        with self._blob_lock():
+            blob_path = self._blob_path(digest)
+            if blob_path.exists():
+                source_path.unlink()
+            else:
+                blob_path.parent.mkdir(exist_ok=True)
+                os.replace(source_path, blob_path)
+            previous = self._blob_digest(file_name)
+            self._point_to_blob(file_name, digest)
+            self.blob_refs.incr(digest)
+            if previous is not None:
+                self._release_blob(previous)
+            self._track(file_name)
+        self.cache.invalidate(file_name)
+        self._drop_variants(file_name)
+
+    def get(self, file_name: str) -> Optional[bytes]:
+        cached = self.get_cached(file_name)
+        if cached is not None:
+            return cached.data
+        file_path = self.pictures_dir / file_name
+        if file_path.exists():
+            with open(file_path, 'rb') as f:
+                return f.read()
+        return None
+
+    def get_cached(self, file_name: str) -> Optional[CachedPicture]:
+        load = lambda max_bytes: self._load(file_name, max_bytes)
+        entry = self.cache.get_or_load(file_name, load)
+        if entry is not None and self.shared and not self._is_current(file_name, entry):
+            # Changed by another process
+            self.cache.invalidate(file_name)
+            entry = self.cache.get_or_load(file_name, load)
+        return entry
+
+    def get_path(self, file_name: str) -> Optional[Path]:
+        file_path = self.pictures_dir / file_name
+        if file_path.is_file():
+            return file_path
+        return None
+
+    def delete(self, file_name: str) -> bool:
+        file_path = self.pictures_dir / file_name
+        self.cache.invalidate(file_name)
+        with self._blob_lock():
+            digest = self._blob_digest(file_name)
+            if not file_path.exists() and not file_path.is_symlink():
+                return False
+            file_path.unlink()  # Delete the file (or its link to the blob)
+            self._untrack(file_name)
+            if digest is not None:
+                self._release_blob(digest)
+        self._drop_variants(file_name)
+        return True
+
+    def stage_copy(self, file_name: str) -> Optional[Path]:
+        """Hard link (or copy) a picture to a temp file for save_file"""
+        source_path = self.get_path(file_name)
+        if source_path is None:
+            return None
+        temp_path = self.pictures_dir / f".copy-{uuid.uuid4().hex}.part"
+        try:
+            os.link(os.path.realpath(source_path), temp_path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            # Filesystem without hard links
+            try:
+                shutil.copyfile(source_path, temp_path)
+            except FileNotFoundError:
+                return None
+        return temp_path
+
+    def exists(self, file_name: str) -> bool:
+        return (self.pictures_dir / file_name).exists()
+
+    def stats(self) -> Dict[str, int]:
+        """Stored pictures, the bytes they take on disk, and hot cache figures"""
+        if self.shared and time.monotonic() - self._counted_at >= PICTURE_STATS_RESCAN_INTERVAL:
+            self._count_files()
+        with self._stats_lock:
+            files, picture_bytes = len(self._names), self._bytes
+        return {
+            "picture_files": files,
+            "picture_bytes": picture_bytes,
+            **{f"picture_cache_{name}": value for name, value in self.cache.stats().items()},
+        }
+
+    def _count_files(self) -> None:
+        """Count the pictures on disk from scratch"""
+        names: Dict[str, Tuple[int, int]] = {}
+        inodes: Dict[Tuple[int, int], List[int]] = {}
+        for entry in os.scandir(self.pictures_dir):
+            if entry.name.startswith("."):
+                continue
+            try:
+                stat = entry.stat()  # follows links to blobs
+            except FileNotFoundError:
+                continue
+            names[entry.name] = (stat.st_dev, stat.st_ino)
+            # Names sharing a blob or a hard link are counted once
+            inodes.setdefault((stat.st_dev, stat.st_ino), [stat.st_size, 0])[1] += 1
+        with self._stats_lock:
+            self._names = names
+            self._inodes = inodes
+            self._bytes = sum(size for size, _ in inodes.values())
+            self._counted_at = time.monotonic()
+
+    def _track(self, file_name: str) -> None:
+        """Count the file now stored under file_name, in place of what was there before"""
+        try:
+            stat = os.stat(self.pictures_dir / file_name)
+        except FileNotFoundError:
+            # Already replaced or deleted by another writer
+            return
+        inode = (stat.st_dev, stat.st_ino)
+        with self._stats_lock:
+            self._untrack_locked(file_name)
+            self._names[file_name] = inode
+            counted = self._inodes.get(inode)
+            if counted is None:
+                self._inodes[inode] = [stat.st_size, 1]
+                self._bytes += stat.st_size
+            else:
+                counted[1] += 1
+
+    def _untrack(self, file_name: str) -> None:
+        with self._stats_lock:
+            self._untrack_locked(file_name)
+
+    def _untrack_locked(self, file_name: str) -> None:
+        inode = self._names.pop(file_name, None)
+        if inode is None:
+            return
+        counted = self._inodes[inode]
+        counted[1] -= 1
+        if counted[1] == 0:
+            del self._inodes[inode]
+            self._bytes -= counted[0]
+
+    def variants_dir(self, file_name: str) -> Path:
+        return self.variants_root / file_name
+
+    def _drop_variants(self, file_name: str) -> None:
+        shutil.rmtree(self.variants_dir(file_name), ignore_errors=True)
+
+    def _load(self, file_name: str, max_bytes: int) -> Optional[CachedPicture]:
+        file_path = self.pictures_dir / file_name
+        try:
+            with open(file_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_size > max_bytes:
+                    return None
+                return CachedPicture(data=f.read(), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    def _is_current(self, file_name: str, entry: CachedPicture) -> bool:
+        try:
+            stat = os.stat(self.pictures_dir / file_name)
+        except FileNotFoundError:
+            return False
+        return stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime_ns
+
+    @contextmanager
+    def _blob_lock(self) -> Iterator[None]:
+        with self._lock:
+            if not self.shared:
+                yield
+                return
+            with open(self.pictures_dir / ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest[:2] / digest
+
+    def _blob_digest(self, file_name: str) -> Optional[str]:
+        """Digest of the blob a picture name points at, None for plain files"""
+        file_path = self.pictures_dir / file_name
+        if not file_path.is_symlink():
+            return None
+        return Path(os.readlink(file_path)).name
+
+    def _point_to_blob(self, file_name: str, digest: str) -> None:
+        # Create the link under a temp name, then rename over the old one atomically
+        target = os.path.join(self.BLOBS_DIR, digest[:2], digest)
+        link_path = self.pictures_dir / f".link-{uuid.uuid4().hex}"
+        os.symlink(target, link_path)
+        os.replace(link_path, self.pictures_dir / file_name)
+
+    def _release_blob(self, digest: str) -> None:
+        if self.blob_refs.decr(digest) <= 0:
+            self._blob_path(digest).unlink(missing_ok=True)
+
+    def _load_blob_refs(self, blob_refs: BlobRefCounts) -> None:
+        """Rebuild reference counts from the links on disk and drop old unreferenced blobs"""
+        with self._blob_lock():
+            for entry in os.scandir(self.pictures_dir):
+                if entry.is_symlink():
+                    blob_refs.incr(Path(os.readlink(entry.path)).name)
+            swept_before = time.time() - BLOB_SWEEP_MIN_AGE
+            for prefix_dir in self.blobs_dir.iterdir():
+                for blob_path in prefix_dir.iterdir():
+                    if blob_path.name in blob_refs.counts:
+                        continue
+                    try:
+                        if blob_path.stat().st_mtime < swept_before:
+                            blob_path.unlink()
+                    except FileNotFoundError:
+                        pass
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
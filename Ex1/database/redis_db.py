@@ -0,0 +1,422 @@
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+import redis
+from config import PICTURE_STORAGE, REDIS_PREFIX, REDIS_URL
+from models.pet_type import PetType
+from models.pet import Pet, birthdate_ordinal
+from .interface import DatabaseInterface
+from .picture_cache import CachedPicture
+from .picture_store import BlobRefCounts, PictureStore
+
+# Separates pet type and pet name in hash fields; cannot appear in either
+FIELD_SEPARATOR = "\x00"
+
+
+class RedisDatabase(DatabaseInterface):
+    """
+    DatabaseInterface backed by a Redis server, so any number of worker
+    processes can share one store. Each pet type is a hash, filters are
+    sets of pet type ids, and ordering comes from sorted sets scored by
+    a sequence taken with INCR. Multi-key writes go out as one MULTI/EXEC
+    pipeline, with WATCH where they depend on what is stored.
+
+    Layout, under REDIS_PREFIX:
+        pet_type_id, seq                 counters
+        pet_types                        zset id -> seq
+        pet_type:<id>                    hash of the pet type fields
+        index:<field>:<key>              set of pet type ids
+        pets:<id>                        hash casefolded name -> [name, birthdate, picture]
+        pet_order:<id>                   zset casefolded name -> seq
+        birthdates:<id>                  zset casefolded name -> birthdate ordinal
+        pet_urls                         hash type\\0name -> url
+        url:<url>                        hash type\\0name -> picture file ("" if none)
+        blob_refs                        hash digest -> references
+    """
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = REDIS_PREFIX):
+        self.prefix = prefix
+        # The client keeps a thread-safe connection pool
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.picture_store = PictureStore(
+            Path("pictures"),
+            content_addressed=PICTURE_STORAGE == "content-addressed",
+            blob_refs=RedisBlobRefCounts(self),
+            shared=True
+        )
+        self.pictures_dir = self.picture_store.pictures_dir
+
+    def key(self, *parts: object) -> str:
+        return self.prefix + ":".join(str(part) for part in parts)
+
+    def generate_id(self) -> str:
+        while True:
+            id_str = str(self.redis.incr(self.key("pet_type_id")))
+            if not self.redis.exists(self.key("pet_type", id_str)):
+                return id_str
+
+    def add_pet_type(self, pet_type: PetType) -> bool:
+        type_key = self.key("pet_type", pet_type.id)
+        # Watched too: a pet type of the same name stored meanwhile makes the transaction retry
+        name_index_key = self.key("index", "type", pet_type.type.casefold())
+        seq = self.redis.incr(self.key("seq"))
+
+        def write(pipe: redis.client.Pipeline) -> bool:
+            if pipe.smembers(name_index_key) - {pet_type.id}:
+                return False
+            stored = pipe.hgetall(type_key)
+            pipe.multi()
+            if stored:
+                for index_key in self._index_keys(_build_pet_type(stored, [])):
+                    pipe.srem(index_key, pet_type.id)
+            pipe.hset(type_key, mapping=_pet_type_fields(pet_type))
+            for index_key in self._index_keys(pet_type):
+                pipe.sadd(index_key, pet_type.id)
+            # NX keeps the position of a pet type that is stored again
+            pipe.zadd(self.key("pet_types"), {pet_type.id: seq}, nx=True)
+            return True
+
+        return self.redis.transaction(write, type_key, name_index_key, value_from_callable=True)
+
+    def get_pet_type(self, pet_type_id: str) -> Optional[PetType]:
+        pet_types = self._load_pet_types([pet_type_id])
+        return pet_types[0] if pet_types else None
+
+    def get_pet_type_name(self, pet_type_id: str) -> Optional[str]:
+        return self.redis.hget(self.key("pet_type", pet_type_id), "type")
+
+    def get_all_pet_types(self) -> Sequence[PetType]:
+        return self._load_pet_types(self.redis.zrange(self.key("pet_types"), 0, -1))
+
+    def get_pet_type_seq(self, pet_type_id: str) -> Optional[int]:
+        seq = self.redis.zscore(self.key("pet_types"), pet_type_id)
+        return int(seq) if seq is not None else None
+
+    def find_pet_types(
+        self,
+        id: Optional[str] = None,
+        type: Optional[str] = None,
+        family: Optional[str] = None,
+        genus: Optional[str] = None,
+        lifespan: Optional[int] = None,
+        has_attribute: Optional[str] = None
+    ) -> List[PetType]:
+        index_keys = []
+        if type is not None:
+            index_keys.append(self.key("index", "type", type.casefold()))
+        if family is not None:
+            index_keys.append(self.key("index", "family", family.casefold()))
+        if genus is not None:
+            index_keys.append(self.key("index", "genus", genus.casefold()))
+        if lifespan is not None:
+            index_keys.append(self.key("index", "lifespan", lifespan))
+        if has_attribute is not None:
+            index_keys.append(self.key("index", "attribute", has_attribute.casefold()))
+
+        if id is not None:
+            matched = {id}
+            for index_key in index_keys:
+                if not self.redis.sismember(index_key, id):
+                    return []
+        elif index_keys:
+            matched = self.redis.sinter(index_keys)
+        else:
+            return self.get_all_pet_types()
+
+        if not matched:
+            return []
+        ids = list(matched)
+        seqs = self.redis.zmscore(self.key("pet_types"), ids)
+        ordered = sorted(
+            (seq, pet_type_id) for pet_type_id, seq in zip(ids, seqs) if seq is not None
+        )
+        return self._load_pet_types([pet_type_id for _, pet_type_id in ordered])
+
+    def delete_pet_type(self, pet_type_id: str) -> bool:
+        type_key = self.key("pet_type", pet_type_id)
+
+        def write(pipe: redis.client.Pipeline) -> bool:
+            stored = pipe.hgetall(type_key)
+            if not stored:
+                return False
+            pipe.multi()
+            for index_key in self._index_keys(_build_pet_type(stored, [])):
+                pipe.srem(index_key, pet_type_id)
+            pipe.zrem(self.key("pet_types"), pet_type_id)
+            pipe.delete(
+                type_key,
+                self.key("pets", pet_type_id),
+                self.key("pet_order", pet_type_id),
+                self.key("birthdates", pet_type_id)
+            )
+            return True
+
+        return self.redis.transaction(write, type_key, value_from_callable=True)
+
+    def pet_type_exists(self, type_name: str) -> bool:
+        return self.redis.scard(self.key("index", "type", type_name.casefold())) > 0
+
+    def add_pet(self, pet_type_id: str, pet: Pet) -> bool:
+        type_key = self.key("pet_type", pet_type_id)
+        pets_key = self.key("pets", pet_type_id)
+        name_key = pet.name.casefold()
+        seq = self.redis.incr(self.key("seq"))
+
+        def write(pipe: redis.client.Pipeline) -> bool:
+            if not pipe.exists(type_key) or pipe.hexists(pets_key, name_key):
+                return False
+            pipe.multi()
+            self._store_pet(pipe, pet_type_id, pet, seq)
+            return True
+
+        return self.redis.transaction(write, type_key, pets_key, value_from_callable=True)
+
+    def get_pet(self, pet_type_id: str, pet_name: str) -> Optional[Pet]:
+        stored = self.redis.hget(self.key("pets", pet_type_id), pet_name.casefold())
+        return _build_pet(stored) if stored else None
+
+    def get_all_pets(self, pet_type_id: str) -> Sequence[Pet]:
+        return self._load_pets(
+            pet_type_id, self.redis.zrange(self.key("pet_order", pet_type_id), 0, -1)
+        )
+
+    def get_pet_seq(self, pet_type_id: str, pet_name: str) -> Optional[int]:
+        seq = self.redis.zscore(self.key("pet_order", pet_type_id), pet_name.casefold())
+        return int(seq) if seq is not None else None
+
+    def get_pets_by_birthdate(
+        self,
+        pet_type_id: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None
+    ) -> List[Pet]:
+        name_keys = self.redis.zrangebyscore(
+            self.key("birthdates", pet_type_id),
+            f"({after}" if after is not None else "-inf",
+            f"({before}" if before is not None else "+inf"
+        )
+        if not name_keys:
+            return []
+        # Keep the same order as get_all_pets
+        seqs = self.redis.zmscore(self.key("pet_order", pet_type_id), name_keys)
+        ordered = sorted((seq, name_key) for name_key, seq in zip(name_keys, seqs) if seq is not None)
+        return self._load_pets(pet_type_id, [name_key for _, name_key in ordered])
+
+    def update_pet(self, pet_type_id: str, pet_name: str, pet: Pet) -> bool:
+        pets_key = self.key("pets", pet_type_id)
+        order_key = self.key("pet_order", pet_type_id)
+        old_key = pet_name.casefold()
+        new_key = pet.name.casefold()
+
+        def write(pipe: redis.client.Pipeline) -> bool:
+            seq = pipe.zscore(order_key, old_key)
+            if seq is None:
+                return False
+            pipe.multi()
+            # The new name may collide with a different pet; it gets replaced
+            self._unstore_pets(pipe, pet_type_id, {old_key, new_key})
+            self._store_pet(pipe, pet_type_id, pet, int(seq))
+            return True
+
+        return self.redis.transaction(write, pets_key, order_key, value_from_callable=True)
+
+    def delete_pet(self, pet_type_id: str, pet_name: str) -> bool:
+        pipe = self.redis.pipeline()
+        self._unstore_pets(pipe, pet_type_id, {pet_name.casefold()})
+        removed, *_ = pipe.execute()
+        return removed > 0
+
+    def pet_exists(self, pet_type_id: str, pet_name: str) -> bool:
+        return self.redis.hexists(self.key("pets", pet_type_id), pet_name.casefold())
+
+    def save_picture(self, file_name: str, image_data: bytes) -> None:
+        self.picture_store.save(file_name, image_data)
+
+    def save_picture_file(self, file_name: str, source_path: Path) -> None:
+        self.picture_store.save_file(file_name, source_path)
+
+    def get_picture(self, file_name: str) -> Optional[bytes]:
+        return self.picture_store.get(file_name)
+
+    def get_cached_picture(self, file_name: str) -> Optional[CachedPicture]:
+        return self.picture_store.get_cached(file_name)
+
+    def get_picture_path(self, file_name: str) -> Optional[Path]:
+        return self.picture_store.get_path(file_name)
+
+    def delete_picture(self, file_name: str) -> bool:
+        return self.picture_store.delete(file_name)
+
+    def picture_exists(self, file_name: str) -> bool:
+        return self.picture_store.exists(file_name)
+
+    def stage_picture_copy(self, file_name: str) -> Optional[Path]:
+        return self.picture_store.stage_copy(file_name)
+
+    def get_variants_dir(self, file_name: str) -> Path:
+        return self.picture_store.variants_dir(file_name)
+
+    def get_pet_url(self, pet_type: str, pet_name: str) -> Optional[str]:
+        return self.redis.hget(self.key("pet_urls"), _url_field(pet_type, pet_name))
+
+    def save_pet_url(self, pet_type: str, pet_name: str, url: str, file_name: Optional[str] = None) -> None:
+        field = _url_field(pet_type, pet_name)
+        urls_key = self.key("pet_urls")
+
+        def write(pipe: redis.client.Pipeline) -> None:
+            old_url = pipe.hget(urls_key, field)
+            pipe.multi()
+            if old_url is not None:
+                pipe.hdel(self.key("url", old_url), field)
+            pipe.hset(urls_key, field, url)
+            pipe.hset(self.key("url", url), field, file_name or "")
+
+        self.redis.transaction(write, urls_key)
+
+    def delete_pet_url(self, pet_type: str, pet_name: str) -> None:
+        field = _url_field(pet_type, pet_name)
+        urls_key = self.key("pet_urls")
+
+        def write(pipe: redis.client.Pipeline) -> None:
+            old_url = pipe.hget(urls_key, field)
+            if old_url is None:
+                return
+            pipe.multi()
+            pipe.hdel(self.key("url", old_url), field)
+            pipe.hdel(urls_key, field)
+
+        self.redis.transaction(write, urls_key)
+
+    def url_already_used(self, url: str) -> bool:
+        return self.redis.exists(self.key("url", url)) > 0
+
+    def get_url_picture(self, url: str) -> Optional[str]:
+        for file_name in self.redis.hvals(self.key("url", url)):
+            if file_name and self.picture_exists(file_name):
+                return file_name
+        return None
+
+    def get_stats(self) -> Dict[str, int]:
+        pet_type_ids = self.redis.zrange(self.key("pet_types"), 0, -1)
+        pipe = self.redis.pipeline(transaction=False)
+        for pet_type_id in pet_type_ids:
+            pipe.hlen(self.key("pets", pet_type_id))
+        return {
+            "pet_types": len(pet_type_ids),
+            "pets": sum(pipe.execute()),
+            **self.picture_store.stats(),
+        }
+
+    def close(self) -> None:
+        self.redis.close()
+
+    def _index_keys(self, pet_type: PetType) -> Iterable[str]:
+        """Keys of the filter sets a pet type belongs to"""
+        yield self.key("index", "type", pet_type.type.casefold())
+        yield self.key("index", "family", pet_type.family.casefold())
+        yield self.key("index", "genus", pet_type.genus.casefold())
+        if pet_type.lifespan is not None:
+            yield self.key("index", "lifespan", pet_type.lifespan)
+        for attribute in pet_type.attributes:
+            yield self.key("index", "attribute", attribute.casefold())
+
+    def _store_pet(self, pipe: redis.client.Pipeline, pet_type_id: str, pet: Pet, seq: int) -> None:
+        name_key = pet.name.casefold()
+        pipe.hset(
+            self.key("pets", pet_type_id), name_key,
+            json.dumps([pet.name, pet.birthdate, pet.picture])
+        )
+        pipe.zadd(self.key("pet_order", pet_type_id), {name_key: seq})
+        ordinal = birthdate_ordinal(pet.birthdate)
+        if ordinal is not None:
+            pipe.zadd(self.key("birthdates", pet_type_id), {name_key: ordinal})
+
+    def _unstore_pets(self, pipe: redis.client.Pipeline, pet_type_id: str, name_keys: Iterable[str]) -> None:
+        name_keys = list(name_keys)
+        pipe.hdel(self.key("pets", pet_type_id), *name_keys)
+        pipe.zrem(self.key("pet_order", pet_type_id), *name_keys)
+        pipe.zrem(self.key("birthdates", pet_type_id), *name_keys)
+
+    def _load_pet_types(self, pet_type_ids: Sequence[str]) -> List[PetType]:
+        """Load pet types and their pet names in one round trip"""
+        pipe = self.redis.pipeline(transaction=False)
+        for pet_type_id in pet_type_ids:
+            pipe.hgetall(self.key("pet_type", pet_type_id))
+            pipe.zrange(self.key("pet_order", pet_type_id), 0, -1)
+            pipe.hgetall(self.key("pets", pet_type_id))
+        results = pipe.execute()
+
+        pet_types = []
+        for start in range(0, len(results), 3):
+            stored, name_keys, pets = results[start:start + 3]
+            if not stored:
+                # Deleted between listing and loading
+                continue
+            names = [json.loads(pets[name_key])[0] for name_key in name_keys if name_key in pets]
+            pet_types.append(_build_pet_type(stored, names))
+        return pet_types
+
+    def _load_pets(self, pet_type_id: str, name_keys: Sequence[str]) -> List[Pet]:
+        if not name_keys:
+            return []
+        stored = self.redis.hmget(self.key("pets", pet_type_id), name_keys)
+        return [_build_pet(value) for value in stored if value is not None]
+
+
+class RedisBlobRefCounts(BlobRefCounts):
+    """Blob reference counts kept in Redis, shared by all worker processes"""
+
+    def __init__(self, database: RedisDatabase):
+        self.database = database
+        self.refs_key = database.key("blob_refs")
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return {
+            digest: int(refs)
+            for digest, refs in self.database.redis.hgetall(self.refs_key).items()
+        }
+
+    def incr(self, digest: str) -> int:
+        return self.database.redis.hincrby(self.refs_key, digest, 1)
+
+    def decr(self, digest: str) -> int:
+        def write(pipe: redis.client.Pipeline) -> int:
+            refs = int(pipe.hget(self.refs_key, digest) or 0) - 1
+            pipe.multi()
+            if refs > 0:
+                pipe.hset(self.refs_key, digest, refs)
+            else:
+                pipe.hdel(self.refs_key, digest)
+            return refs
+
+        return self.database.redis.transaction(write, self.refs_key, value_from_callable=True)
+
+
+def _url_field(pet_type: str, pet_name: str) -> str:
+    return f"{pet_type}{FIELD_SEPARATOR}{pet_name}"
+
+def _pet_type_fields(pet_type: PetType) -> Dict[str, str]:
+    return {
+        "id": pet_type.id,
+        "type": pet_type.type,
+        "family": pet_type.family,
+        "genus": pet_type.genus,
+        "attributes": json.dumps(pet_type.attributes),
+        "lifespan": "" if pet_type.lifespan is None else str(pet_type.lifespan),
+    }
+
+def _build_pet_type(stored: Dict[str, str], pet_names: List[str]) -> PetType:
+    return PetType(
+        id=stored["id"],
+        type=stored["type"],
+        family=stored["family"],
+        genus=stored["genus"],
+        attributes=json.loads(stored["attributes"]),
+        lifespan=int(stored["lifespan"]) if stored["lifespan"] else None,
+        pets=pet_names
+    )
+
+def _build_pet(stored: str) -> Pet:
+    name, birthdate, picture = json.loads(stored)
+    return Pet(name=name, birthdate=birthdate, picture=picture)
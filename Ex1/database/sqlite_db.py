@@ -0,0 +1,480 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+from config import PICTURE_STORAGE, SQLITE_PATH
+from models.pet_type import PetType
+from models.pet import Pet, birthdate_ordinal
+from .interface import DatabaseInterface
+from .picture_cache import CachedPicture
+from .picture_store import BlobRefCounts, PictureStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pet_types (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    type_key TEXT NOT NULL,
+    family TEXT NOT NULL,
+    family_key TEXT NOT NULL,
+    genus TEXT NOT NULL,
+    genus_key TEXT NOT NULL,
+    lifespan INTEGER
+);
+-- Replaces the plain type_key index of older files
+DROP INDEX IF EXISTS pet_types_type_key;
+CREATE UNIQUE INDEX IF NOT EXISTS pet_types_type_key_unique ON pet_types (type_key);
+CREATE INDEX IF NOT EXISTS pet_types_family_key ON pet_types (family_key);
+CREATE INDEX IF NOT EXISTS pet_types_genus_key ON pet_types (genus_key);
+CREATE INDEX IF NOT EXISTS pet_types_lifespan ON pet_types (lifespan);
+
+CREATE TABLE IF NOT EXISTS pet_type_attributes (
+    pet_type_id TEXT NOT NULL REFERENCES pet_types (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    attribute TEXT NOT NULL,
+    attribute_key TEXT NOT NULL,
+    PRIMARY KEY (pet_type_id, position)
+);
+CREATE INDEX IF NOT EXISTS pet_type_attributes_key ON pet_type_attributes (attribute_key, pet_type_id);
+
+CREATE TABLE IF NOT EXISTS pets (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    pet_type_id TEXT NOT NULL REFERENCES pet_types (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    birthdate TEXT NOT NULL,
+    birthdate_ordinal INTEGER,
+    picture TEXT NOT NULL,
+    UNIQUE (pet_type_id, name_key)
+);
+CREATE INDEX IF NOT EXISTS pets_birthdate ON pets (pet_type_id, birthdate_ordinal)
+    WHERE birthdate_ordinal IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS pet_urls (
+    pet_type TEXT NOT NULL,
+    pet_name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    file_name TEXT,
+    PRIMARY KEY (pet_type, pet_name)
+);
+CREATE INDEX IF NOT EXISTS pet_urls_url ON pet_urls (url);
+
+CREATE TABLE IF NOT EXISTS blob_refs (
+    digest TEXT PRIMARY KEY,
+    refs INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('pet_type_id', 0);
+"""
+
+# Stay well below SQLite's limit on bound parameters per statement
+MAX_PARAMS = 500
+
+PET_TYPE_COLUMNS = "id, type, family, genus, lifespan"
+PET_COLUMNS = "name, birthdate, picture"
+
+
+class SQLiteDatabase(DatabaseInterface):
+    """
+    DatabaseInterface backed by a SQLite file in WAL mode, so several
+    worker processes can share one consistent store. Each thread gets
+    its own connection; statements are parameterized constants, which
+    sqlite3 keeps prepared in its per-connection statement cache.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []  # every thread's, for close()
+        self._connections_lock = threading.Lock()
+        self.connection().executescript(SCHEMA)
+        self.picture_store = PictureStore(
+            Path("pictures"),
+            content_addressed=PICTURE_STORAGE == "content-addressed",
+            blob_refs=SQLiteBlobRefCounts(self),
+            shared=True
+        )
+        self.pictures_dir = self.picture_store.pictures_dir
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; multi-statement writes use explicit transactions
+            # Only used by this thread, but closed by whichever thread calls close()
+            conn = sqlite3.connect(
+                self.path, isolation_level=None, cached_statements=256, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def generate_id(self) -> str:
+        with self._transaction() as conn:
+            while True:
+                (next_id,) = conn.execute(
+                    "UPDATE counters SET value = value + 1 WHERE name = 'pet_type_id' RETURNING value"
+                ).fetchone()
+                id_str = str(next_id)
+                if not conn.execute("SELECT 1 FROM pet_types WHERE id = ?", (id_str,)).fetchone():
+                    return id_str
+
+    def add_pet_type(self, pet_type: PetType) -> bool:
+        values = (
+            pet_type.type, pet_type.type.casefold(),
+            pet_type.family, pet_type.family.casefold(),
+            pet_type.genus, pet_type.genus.casefold(),
+            pet_type.lifespan,
+            pet_type.id,
+        )
+        try:
+            with self._transaction() as conn:
+                updated = conn.execute(
+                    "UPDATE pet_types SET type = ?, type_key = ?, family = ?, family_key = ?, "
+                    "genus = ?, genus_key = ?, lifespan = ? WHERE id = ?",
+                    values
+                ).rowcount > 0
+                if not updated:
+                    conn.execute(
+                        "INSERT INTO pet_types (type, type_key, family, family_key, genus, genus_key, lifespan, id) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        values
+                    )
+                conn.execute("DELETE FROM pet_type_attributes WHERE pet_type_id = ?", (pet_type.id,))
+                conn.executemany(
+                    "INSERT INTO pet_type_attributes (pet_type_id, position, attribute, attribute_key) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (pet_type.id, position, attribute, attribute.casefold())
+                        for position, attribute in enumerate(pet_type.attributes)
+                    ]
+                )
+        except sqlite3.IntegrityError:
+            # Another pet type has the same type name
+            return False
+        return True
+
+    def get_pet_type(self, pet_type_id: str) -> Optional[PetType]:
+        rows = self.connection().execute(
+            f"SELECT {PET_TYPE_COLUMNS} FROM pet_types WHERE id = ?", (pet_type_id,)
+        ).fetchall()
+        pet_types = self._build_pet_types(rows)
+        return pet_types[0] if pet_types else None
+
+    def get_pet_type_name(self, pet_type_id: str) -> Optional[str]:
+        row = self.connection().execute(
+            "SELECT type FROM pet_types WHERE id = ?", (pet_type_id,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def get_all_pet_types(self) -> Sequence[PetType]:
+        rows = self.connection().execute(
+            f"SELECT {PET_TYPE_COLUMNS} FROM pet_types ORDER BY seq"
+        ).fetchall()
+        return self._build_pet_types(rows)
+
+    def get_pet_type_seq(self, pet_type_id: str) -> Optional[int]:
+        row = self.connection().execute(
+            "SELECT seq FROM pet_types WHERE id = ?", (pet_type_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def find_pet_types(
+        self,
+        id: Optional[str] = None,
+        type: Optional[str] = None,
+        family: Optional[str] = None,
+        genus: Optional[str] = None,
+        lifespan: Optional[int] = None,
+        has_attribute: Optional[str] = None
+    ) -> List[PetType]:
+        conditions = []
+        params: List[object] = []
+        if id is not None:
+            conditions.append("id = ?")
+            params.append(id)
+        if type is not None:
+            conditions.append("type_key = ?")
+            params.append(type.casefold())
+        if family is not None:
+            conditions.append("family_key = ?")
+            params.append(family.casefold())
+        if genus is not None:
+            conditions.append("genus_key = ?")
+            params.append(genus.casefold())
+        if lifespan is not None:
+            conditions.append("lifespan = ?")
+            params.append(lifespan)
+        if has_attribute is not None:
+            conditions.append(
+                "id IN (SELECT pet_type_id FROM pet_type_attributes WHERE attribute_key = ?)"
+            )
+            params.append(has_attribute.casefold())
+
+        if not conditions:
+            return self.get_all_pet_types()
+
+        rows = self.connection().execute(
+            f"SELECT {PET_TYPE_COLUMNS} FROM pet_types WHERE {' AND '.join(conditions)} ORDER BY seq",
+            params
+        ).fetchall()
+        return self._build_pet_types(rows)
+
+    def delete_pet_type(self, pet_type_id: str) -> bool:
+        with self._transaction() as conn:
+            # Pets and attributes go with it (ON DELETE CASCADE)
+            return conn.execute("DELETE FROM pet_types WHERE id = ?", (pet_type_id,)).rowcount > 0
+
+    def pet_type_exists(self, type_name: str) -> bool:
+        return self.connection().execute(
+            "SELECT 1 FROM pet_types WHERE type_key = ?", (type_name.casefold(),)
+        ).fetchone() is not None
+
+    def add_pet(self, pet_type_id: str, pet: Pet) -> bool:
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "INSERT INTO pets (pet_type_id, name, name_key, birthdate, birthdate_ordinal, picture) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (pet_type_id, pet.name, pet.name.casefold(), pet.birthdate,
+                     birthdate_ordinal(pet.birthdate), pet.picture)
+                )
+        except sqlite3.IntegrityError:
+            # Unknown pet type or a pet with the same name
+            return False
+        return True
+
+    def get_pet(self, pet_type_id: str, pet_name: str) -> Optional[Pet]:
+        row = self.connection().execute(
+            f"SELECT {PET_COLUMNS} FROM pets WHERE pet_type_id = ? AND name_key = ?",
+            (pet_type_id, pet_name.casefold())
+        ).fetchone()
+        return _build_pet(row) if row else None
+
+    def get_all_pets(self, pet_type_id: str) -> Sequence[Pet]:
+        rows = self.connection().execute(
+            f"SELECT {PET_COLUMNS} FROM pets WHERE pet_type_id = ? ORDER BY seq",
+            (pet_type_id,)
+        ).fetchall()
+        return [_build_pet(row) for row in rows]
+
+    def get_pet_seq(self, pet_type_id: str, pet_name: str) -> Optional[int]:
+        row = self.connection().execute(
+            "SELECT seq FROM pets WHERE pet_type_id = ? AND name_key = ?",
+            (pet_type_id, pet_name.casefold())
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_pets_by_birthdate(
+        self,
+        pet_type_id: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None
+    ) -> List[Pet]:
+        rows = self.connection().execute(
+            f"SELECT {PET_COLUMNS} FROM pets "
+            "WHERE pet_type_id = ? AND birthdate_ordinal IS NOT NULL "
+            "AND (? IS NULL OR birthdate_ordinal > ?) AND (? IS NULL OR birthdate_ordinal < ?) "
+            "ORDER BY seq",
+            (pet_type_id, after, after, before, before)
+        ).fetchall()
+        return [_build_pet(row) for row in rows]
+
+    def update_pet(self, pet_type_id: str, pet_name: str, pet: Pet) -> bool:
+        new_key = pet.name.casefold()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT seq FROM pets WHERE pet_type_id = ? AND name_key = ?",
+                (pet_type_id, pet_name.casefold())
+            ).fetchone()
+            if row is None:
+                return False
+            # The new name may collide with a different pet; it gets replaced
+            conn.execute(
+                "DELETE FROM pets WHERE pet_type_id = ? AND name_key = ? AND seq != ?",
+                (pet_type_id, new_key, row[0])
+            )
+            conn.execute(
+                "UPDATE pets SET name = ?, name_key = ?, birthdate = ?, birthdate_ordinal = ?, picture = ? "
+                "WHERE seq = ?",
+                (pet.name, new_key, pet.birthdate, birthdate_ordinal(pet.birthdate), pet.picture, row[0])
+            )
+        return True
+
+    def delete_pet(self, pet_type_id: str, pet_name: str) -> bool:
+        with self._transaction() as conn:
+            return conn.execute(
+                "DELETE FROM pets WHERE pet_type_id = ? AND name_key = ?",
+                (pet_type_id, pet_name.casefold())
+            ).rowcount > 0
+
+    def pet_exists(self, pet_type_id: str, pet_name: str) -> bool:
+        return self.connection().execute(
+            "SELECT 1 FROM pets WHERE pet_type_id = ? AND name_key = ?",
+            (pet_type_id, pet_name.casefold())
+        ).fetchone() is not None
+
+    def save_picture(self, file_name: str, image_data: bytes) -> None:
+        self.picture_store.save(file_name, image_data)
+
+    def save_picture_file(self, file_name: str, source_path: Path) -> None:
+        self.picture_store.save_file(file_name, source_path)
+
+    def get_picture(self, file_name: str) -> Optional[bytes]:
+        return self.picture_store.get(file_name)
+
+    def get_cached_picture(self, file_name: str) -> Optional[CachedPicture]:
+        return self.picture_store.get_cached(file_name)
+
+    def get_picture_path(self, file_name: str) -> Optional[Path]:
+        return self.picture_store.get_path(file_name)
+
+    def delete_picture(self, file_name: str) -> bool:
+        return self.picture_store.delete(file_name)
+
+    def picture_exists(self, file_name: str) -> bool:
+        return self.picture_store.exists(file_name)
+
+    def stage_picture_copy(self, file_name: str) -> Optional[Path]:
+        return self.picture_store.stage_copy(file_name)
+
+    def get_variants_dir(self, file_name: str) -> Path:
+        return self.picture_store.variants_dir(file_name)
+
+    def get_pet_url(self, pet_type: str, pet_name: str) -> Optional[str]:
+        row = self.connection().execute(
+            "SELECT url FROM pet_urls WHERE pet_type = ? AND pet_name = ?",
+            (pet_type, pet_name)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save_pet_url(self, pet_type: str, pet_name: str, url: str, file_name: Optional[str] = None) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pet_urls (pet_type, pet_name, url, file_name) VALUES (?, ?, ?, ?)",
+                (pet_type, pet_name, url, file_name)
+            )
+
+    def delete_pet_url(self, pet_type: str, pet_name: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM pet_urls WHERE pet_type = ? AND pet_name = ?",
+                (pet_type, pet_name)
+            )
+
+    def url_already_used(self, url: str) -> bool:
+        return self.connection().execute(
+            "SELECT 1 FROM pet_urls WHERE url = ?", (url,)
+        ).fetchone() is not None
+
+    def get_url_picture(self, url: str) -> Optional[str]:
+        rows = self.connection().execute(
+            "SELECT file_name FROM pet_urls WHERE url = ? AND file_name IS NOT NULL", (url,)
+        ).fetchall()
+        for (file_name,) in rows:
+            if self.picture_exists(file_name):
+                return file_name
+        return None
+
+    def get_stats(self) -> Dict[str, int]:
+        pet_types, pets = self.connection().execute(
+            "SELECT (SELECT COUNT(*) FROM pet_types), (SELECT COUNT(*) FROM pets)"
+        ).fetchone()
+        return {"pet_types": pet_types, "pets": pets, **self.picture_store.stats()}
+
+    def close(self) -> None:
+        """Close the connections of all threads"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def _build_pet_types(self, rows: Sequence[tuple]) -> List[PetType]:
+        """Build PetType models, loading attributes and pet names for all rows at once"""
+        attributes: Dict[str, List[str]] = {row[0]: [] for row in rows}
+        pet_names: Dict[str, List[str]] = {row[0]: [] for row in rows}
+        ids = list(attributes)
+        conn = self.connection()
+        for start in range(0, len(ids), MAX_PARAMS):
+            chunk = ids[start:start + MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            for pet_type_id, attribute in conn.execute(
+                f"SELECT pet_type_id, attribute FROM pet_type_attributes "
+                f"WHERE pet_type_id IN ({placeholders}) ORDER BY pet_type_id, position",
+                chunk
+            ):
+                attributes[pet_type_id].append(attribute)
+            for pet_type_id, name in conn.execute(
+                f"SELECT pet_type_id, name FROM pets WHERE pet_type_id IN ({placeholders}) ORDER BY seq",
+                chunk
+            ):
+                pet_names[pet_type_id].append(name)
+
+        return [
+            PetType(
+                id=pet_type_id,
+                type=type_name,
+                family=family,
+                genus=genus,
+                attributes=attributes[pet_type_id],
+                lifespan=lifespan,
+                pets=pet_names[pet_type_id]
+            )
+            for pet_type_id, type_name, family, genus, lifespan in rows
+        ]
+
+
+class SQLiteBlobRefCounts(BlobRefCounts):
+    """Blob reference counts kept in the database, shared by all worker processes"""
+
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return dict(self.database.connection().execute("SELECT digest, refs FROM blob_refs"))
+
+    def incr(self, digest: str) -> int:
+        with self.database._transaction() as conn:
+            (refs,) = conn.execute(
+                "INSERT INTO blob_refs (digest, refs) VALUES (?, 1) "
+                "ON CONFLICT (digest) DO UPDATE SET refs = refs + 1 RETURNING refs",
+                (digest,)
+            ).fetchone()
+        return refs
+
+    def decr(self, digest: str) -> int:
+        with self.database._transaction() as conn:
+            row = conn.execute(
+                "UPDATE blob_refs SET refs = refs - 1 WHERE digest = ? RETURNING refs", (digest,)
+            ).fetchone()
+            refs = row[0] if row else 0
+            if refs <= 0:
+                conn.execute("DELETE FROM blob_refs WHERE digest = ?", (digest,))
+        return refs
+
+
+def _build_pet(row: tuple) -> Pet:
+    name, birthdate, picture = row
+    return Pet(name=name, birthdate=birthdate, picture=picture)
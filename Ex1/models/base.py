@@ -1,4 +1,5 @@
-from pydantic import BaseModel, ConfigDict
+from typing import Any, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 class ModelBase(BaseModel):
     model_config = ConfigDict(
@@ -6,3 +7,51 @@ class ModelBase(BaseModel):
         str_to_lower=False,
         validate_assignment=True,
     )
+
+    # JSON of the field values, tagged with the _version it was encoded at
+    _json_cache: Optional[Tuple[int, bytes]] = PrivateAttr(default=None)
+    _version: int = PrivateAttr(default=0)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            # Bumped after the new value is in place, so JSON encoded from the old one is never used
+            self._version += 1
+
+    @classmethod
+    def from_stored(cls, **values: Any):
+        """
+        Build a model from every field's value, skipping validation like
+        model_construct() but several times faster. Only for values that
+        were validated when they were first stored.
+        """
+        model = cls.__new__(cls)
+        object.__setattr__(model, "__dict__", values)
+        object.__setattr__(model, "__pydantic_fields_set__", set(values))
+        object.__setattr__(model, "__pydantic_extra__", None)
+        # The private attributes declared above, at their defaults
+        object.__setattr__(model, "__pydantic_private__", {"_json_cache": None, "_version": 0})
+        return model
+
+    def __eq__(self, other: Any) -> bool:
+        # pydantic also compares private attributes, which would make the JSON cache part of equality
+        if not isinstance(other, BaseModel):
+            return NotImplemented
+        return type(self) is type(other) and self.__dict__ == other.__dict__
+
+    def model_copy(self, *, update: Optional[dict] = None, deep: bool = False):
+        copied = super().model_copy(update=update, deep=deep)
+        copied._json_cache = None
+        return copied
+
+    def json_bytes(self) -> bytes:
+        """Same JSON as model_dump_json(), encoded once until a field is assigned"""
+        # Private attributes through their dict: attribute access goes through pydantic's slow __getattr__
+        private = self.__pydantic_private__
+        version = private["_version"]
+        cached = private["_json_cache"]
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        data = self.__pydantic_serializer__.to_json(self)
+        private["_json_cache"] = (version, data)
+        return data
@@ -1,5 +1,5 @@
 from pydantic import Field, field_validator
-from typing import Union, Literal
+from typing import Union, Literal, Optional
 from datetime import datetime
 import re
 from .base import ModelBase
@@ -18,6 +18,17 @@ Example:
     }
 """
 
+BIRTHDATE_PATTERN = re.compile(r"^\d{2}-\d{2}-\d{4}$") # DD-MM-YYYY
+
+def birthdate_ordinal(value: str) -> Optional[int]:
+    """Convert a DD-MM-YYYY date to a day ordinal, None for "NA" or invalid dates"""
+    if not BIRTHDATE_PATTERN.match(value):
+        return None
+    try:
+        return datetime.strptime(value, "%d-%m-%Y").toordinal()
+    except ValueError:
+        return None
+
 class Pet(ModelBase):
     name: str = Field(
         ...,
@@ -0,0 +1,55 @@
+from pydantic import Field
+from typing import Any, Dict, Literal, Optional
+from .base import ModelBase
+
+"""
+PictureJob Model
+
+A picture download running in the background for a pet that is already stored.
+
+Example:
+    {
+        "id": "5f0c2a4e9b7d4c1e8a3f6b2d1c0e9f8a",
+        "status": "succeeded",
+        "pet_type_id": "2",
+        "pet_name": "Jamie",
+        "url": "https://example.com/jamie.jpg",
+        "picture": "jamie-poodle.jpg",
+        "attempts": 1,
+        "error": null
+    }
+"""
+
+class PictureJob(ModelBase):
+    id: str = Field(
+        ...,
+        description="Unique identifier for the job"
+        )
+    status: Literal["pending", "running", "succeeded", "failed"] = Field(
+        "pending",
+        description="Where the download is; pending jobs wait for a free worker"
+        )
+    pet_type_id: str = Field(
+        ...,
+        description="ID of the pet type the pet belongs to"
+        )
+    pet_name: str = Field(
+        ...,
+        description="Name of the pet the picture is for"
+        )
+    url: str = Field(
+        ...,
+        description="URL the picture is downloaded from"
+        )
+    picture: Optional[str] = Field(
+        None,
+        description="Name of the stored picture file once the job succeeded"
+        )
+    attempts: int = Field(
+        0,
+        description="Number of download attempts made so far"
+        )
+    error: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Error detail of the last attempt when the job failed"
+        )
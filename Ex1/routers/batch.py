@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Type, TypeVar
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from config import BATCH_CONCURRENCY, BATCH_MAX_ITEMS
+
+T = TypeVar("T", bound=BaseModel)
+
+def check_batch_size(items: List[Any]) -> None:
+    if not items or len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "Malformed data"}
+        )
+
+async def run_batch(
+    items: List[Any],
+    model: Type[T],
+    create: Callable[[T], Awaitable[BaseModel]],
+    key: Optional[Callable[[T], str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Validate and create every item, at most BATCH_CONCURRENCY at a time.
+    Returns one {"status", "body"} result per item, in request order; body
+    is the created resource or the error detail a single request would get.
+    Items sharing a key with an earlier item of the batch are not created:
+    they get the 400 a second request for the same name would get.
+    """
+    check_batch_size(items)
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    requests: List[Optional[T]] = []
+    for item in items:
+        try:
+            requests.append(model.model_validate(item))
+        except (ValidationError, HTTPException):
+            requests.append(None)
+
+    # Decided up front, so the first of the duplicates wins however the creates interleave
+    repeated: Set[int] = set()
+    if key is not None:
+        seen: Set[str] = set()
+        for index, request in enumerate(requests):
+            if request is None:
+                continue
+            request_key = key(request)
+            if request_key in seen:
+                repeated.add(index)
+            seen.add(request_key)
+
+    async def run_one(index: int, request: Optional[T]) -> Dict[str, Any]:
+        if request is None or index in repeated:
+            return {"status": 400, "body": {"error": "Malformed data"}}
+
+        async with slots:
+            try:
+                created = await create(request)
+            except HTTPException as e:
+                return {"status": e.status_code, "body": e.detail}
+            except Exception as e:
+                return {"status": 500, "body": {"server_error": str(e)}}
+        return {"status": 201, "body": created.model_dump()}
+
+    return await asyncio.gather(*(run_one(index, request) for index, request in enumerate(requests)))
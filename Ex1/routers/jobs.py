@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException
+from models.picture_job import PictureJob
+from services.jobs import picture_jobs
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.get("/{job_id}", response_model=PictureJob)
+def get_job(job_id: str):
+    """Get the status of a background picture download"""
+    job = picture_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"error": "Not found"}
+        )
+    return job
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from starlette.concurrency import run_in_threadpool
+from database import db
+from services.metrics import StoreCollector, update_threadpool_gauges
+
+router = APIRouter(tags=["metrics"])
+
+# Looked up on every scrape, so registering opens no store
+REGISTRY.register(StoreCollector(lambda: db.get_stats()))
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics"""
+    update_threadpool_gauges()
+    # Store sizes are read from the database and the disk, off the event loop
+    body = await run_in_threadpool(generate_latest, REGISTRY)
+    return Response(content=body, headers={"Content-Type": CONTENT_TYPE_LATEST})
@@ -0,0 +1,110 @@
+import base64
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple, TypeVar
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from models.base import ModelBase
+
+T = TypeVar("T", bound=ModelBase)
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def encode_cursor(seq: int) -> str:
+    """Encode the sequence of the last returned item as an opaque cursor"""
+    return base64.urlsafe_b64encode(f"seq:{seq}".encode()).decode()
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        prefix, seq = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        if prefix != "seq":
+            raise ValueError(prefix)
+        return int(seq)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "Malformed data"}
+        )
+
+def paginate(
+    items: Sequence[T],
+    seq_of: Callable[[T], Optional[int]],
+    limit: Optional[int],
+    cursor: Optional[str]
+) -> Tuple[Sequence[T], Optional[str]]:
+    """
+    Slice a page out of items, which must be ordered by seq_of.
+    Cursors hold the sequence of the last item returned, so they stay
+    valid when items are added or deleted between requests. seq_of
+    returns None for items deleted since they were listed; they are
+    still served, but never used to place a cursor.
+    Returns tuple of (page, next_cursor)
+    """
+    start = 0
+    after = -1
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        # Binary search for the first item past the cursor
+        low, high = 0, len(items)
+        while low < high:
+            mid = (low + high) // 2
+            index, seq = _next_known_seq(items, seq_of, mid, high)
+            if seq is not None and seq <= after:
+                low = index + 1
+            else:
+                high = mid
+        start = low
+
+    if limit is None:
+        return items[start:], None
+
+    page = items[start:start + limit]
+    next_cursor = None
+    if start + limit < len(items):
+        last = next((seq for seq in map(seq_of, reversed(page)) if seq is not None), after)
+        next_cursor = encode_cursor(last)
+    return page, next_cursor
+
+def _next_known_seq(
+    items: Sequence[T],
+    seq_of: Callable[[T], Optional[int]],
+    index: int,
+    end: int
+) -> Tuple[int, Optional[int]]:
+    """
+    First item from index up to end that still has a sequence
+    Returns tuple of (its index, its sequence), or (end, None) if there is none
+    """
+    while index < end:
+        seq = seq_of(items[index])
+        if seq is not None:
+            return index, seq
+        index += 1
+    return end, None
+
+def _json_array_chunks(items: Iterable[ModelBase]) -> Iterator[bytes]:
+    yield b"["
+    first = True
+    for item in items:
+        if not first:
+            yield b","
+        first = False
+        yield item.json_bytes()
+    yield b"]"
+
+def _ndjson_chunks(items: Iterable[ModelBase]) -> Iterator[bytes]:
+    for item in items:
+        yield item.json_bytes() + b"\n"
+
+def stream_collection(
+    items: Sequence[ModelBase],
+    ndjson: bool,
+    next_cursor: Optional[str] = None
+) -> StreamingResponse:
+    """Serialize items one at a time as a JSON array or as NDJSON"""
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    if ndjson:
+        return StreamingResponse(_ndjson_chunks(items), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+    return StreamingResponse(_json_array_chunks(items), media_type="application/json", headers=headers)
+
+def wants_ndjson(accept: Optional[str]) -> bool:
+    return accept is not None and NDJSON_MEDIA_TYPE in accept.lower()
@@ -1,23 +1,27 @@
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException, status
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Body, Header, HTTPException, Query, status
+from starlette.concurrency import run_in_threadpool
 from models.pet_type import PetType
 from models.pet_type_create import PetTypeCreate
-from database.memory_db import db
+from database import db
 from services.ninja_api import NinjaAPIService
+from routers.batch import run_batch
+from routers.pagination import NEXT_CURSOR_HEADER, paginate, stream_collection, wants_ndjson
+from routers.responses import collection_response, model_response
 
 router = APIRouter(prefix="/pet-types", tags=["pet-types"])
 
 @router.post("", response_model=PetType, status_code=status.HTTP_201_CREATED)
-def create_pet_type(pet_type_create: PetTypeCreate):
+async def create_pet_type(pet_type_create: PetTypeCreate):
     """Create a new pet type"""
-    if db.pet_type_exists(pet_type_create.type):
+    if await run_in_threadpool(db.pet_type_exists, pet_type_create.type):
         raise HTTPException(
             status_code=400,
             detail={"error": "Malformed data"}
         )
     
     try:
-        animal_info = NinjaAPIService.get_animal_info(pet_type_create.type)
+        animal_info = await NinjaAPIService.get_animal_info_async(pet_type_create.type)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -25,6 +29,16 @@ def create_pet_type(pet_type_create: PetTypeCreate):
             status_code=500,
             detail={"server_error": str(e)}
         )
+
+    return await run_in_threadpool(_insert_pet_type, pet_type_create, animal_info)
+
+def _insert_pet_type(pet_type_create: PetTypeCreate, animal_info: dict) -> PetType:
+    # The same type may have been created while we waited on the API
+    if db.pet_type_exists(pet_type_create.type):
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "Malformed data"}
+        )
     
     pet_type_id = db.generate_id()
     print("Generated pet type ID:", pet_type_id)
@@ -39,9 +53,20 @@ def create_pet_type(pet_type_create: PetTypeCreate):
         pets=[]
     )
     
-    db.add_pet_type(pet_type)
+    # Loses to a pet type of the same name added since the check above
+    if not db.add_pet_type(pet_type):
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "Malformed data"}
+        )
     return pet_type
 
+@router.post("/batch")
+async def create_pet_types_batch(items: List[Any] = Body(...)) -> List[Dict[str, Any]]:
+    """Create many pet types, looking them up in the Ninja API concurrently"""
+    # Type names are unique regardless of case
+    return await run_batch(items, PetTypeCreate, create_pet_type, key=lambda request: request.type.casefold())
+
 @router.get("", response_model=List[PetType])
 def get_pet_types(
     id: Optional[str] = None,
@@ -49,34 +74,33 @@ def get_pet_types(
     family: Optional[str] = None,
     genus: Optional[str] = None,
     lifespan: Optional[int] = None,
-    hasAttribute: Optional[str] = None
+    hasAttribute: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    accept: Optional[str] = Header(None)
 ):
     """Get all pet types"""
-    pet_types = db.get_all_pet_types()
-
-    # filters
-    if id is not None:
-        pet_types = [pt for pt in pet_types if pt.id == id]
+    pet_types = db.find_pet_types(
+        id=id,
+        type=type,
+        family=family,
+        genus=genus,
+        lifespan=lifespan,
+        has_attribute=hasAttribute
+    )
 
-    if type is not None:
-        pet_types = [pt for pt in pet_types if pt.type.lower() == type.lower()]
-    
-    if family is not None:
-        pet_types = [pt for pt in pet_types if pt.family.lower() == family.lower()]
-    
-    if genus is not None:
-        pet_types = [pt for pt in pet_types if pt.genus.lower() == genus.lower()]
-    
-    if lifespan is not None:
-        pet_types = [pt for pt in pet_types if pt.lifespan == lifespan]
+    pet_types, next_cursor = paginate(
+        pet_types,
+        lambda pt: db.get_pet_type_seq(pt.id),
+        limit,
+        cursor
+    )
 
-    if hasAttribute is not None:
-        pet_types = [
-            pt for pt in pet_types
-            if any(attr.lower() == hasAttribute.lower() for attr in pt.attributes)
-        ]
+    if stream or wants_ndjson(accept):
+        return stream_collection(pet_types, wants_ndjson(accept), next_cursor)
 
-    return pet_types
+    return collection_response(pet_types, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
 
 @router.get("/{id}", response_model=PetType)
 def get_pet_type(id: str):
@@ -90,7 +114,7 @@ def get_pet_type(id: str):
             detail={"error": "Not found"}
         )
     
-    return pet_type
+    return model_response(pet_type)
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_pet_type(id: str):
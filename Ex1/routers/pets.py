@@ -1,32 +1,72 @@
-import re
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Body, Header, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from models.pet_create import PetCreate
-from models.pet import Pet
-from database.memory_db import db
-from services.picture import ImageService
-from typing import List, Optional
-from datetime import datetime
+from models.pet import Pet, birthdate_ordinal
+from models.picture_job import PictureJob
+from database import db
+from services.jobs import picture_jobs
+from services.picture_fetch import attach_picture, fetch_picture
+from routers.batch import run_batch
+from routers.pagination import NEXT_CURSOR_HEADER, paginate, stream_collection, wants_ndjson
+from routers.responses import collection_response, model_response
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
 
 router = APIRouter(prefix="/pet-types/{id}/pets", tags=["pets"])
 
-def parse_date(date_str: str) -> Optional[datetime]:
-    """Parse date string in DD-MM-YYYY format"""
-    pattern = r"^\d{2}-\d{2}-\d{4}$" # DD-MM-YYYY
-    if re.match(pattern, date_str):
-        try:
-            return datetime.strptime(date_str, "%d-%m-%Y")
-        except ValueError:
-            return None
-    return None
-
-@router.post("", response_model=Pet, status_code=status.HTTP_201_CREATED)
-def create_pet(id: str, pet_create: PetCreate):
-    """Create a new pet for a pet type"""
-    
+def _discard_created_pet(pet_type_id: str, pet: Pet) -> None:
+    """Roll back a pet created by this request, unless it was replaced meanwhile"""
+    if db.get_pet(pet_type_id, pet.name) == pet:
+        db.delete_pet(pet_type_id, pet.name)
+
+@router.post(
+    "",
+    response_model=Pet,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": PictureJob}}
+)
+async def create_pet(
+    id: str,
+    pet_create: PetCreate,
+    respond_async: bool = Query(False, alias="async"),
+    prefer: Optional[str] = Header(None)
+):
+    """
+    Create a new pet for a pet type
+    With ?async=true or "Prefer: respond-async", the pet is stored right away
+    and its picture is downloaded in the background: the response is 202
+    with the job, whose status is at the Location URL
+    """
+    if not (respond_async or wants_respond_async(prefer)) or not _has_picture_url(pet_create):
+        return await add_pet(id, pet_create)
+
+    type_name, pet = await run_in_threadpool(_store_pet, id, pet_create)
+    job = picture_jobs.submit(db, id, type_name, pet, pet_create.picture)
+    headers = {"Location": f"/jobs/{job.id}"}
+    if wants_respond_async(prefer):
+        headers["Preference-Applied"] = "respond-async"
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=job.model_dump(),
+        headers=headers
+    )
+
+def wants_respond_async(prefer: Optional[str]) -> bool:
+    return prefer is not None and "respond-async" in prefer.lower()
+
+def _has_picture_url(pet_create: PetCreate) -> bool:
+    return bool(pet_create.picture) and pet_create.picture != "NA"
+
+def _store_pet(id: str, pet_create: PetCreate) -> Tuple[str, Pet]:
+    """
+    Store a new pet with the default picture
+    Returns tuple of (type name, pet)
+    """
     # Check if pet type exists
-    pet_type = db.get_pet_type(id)
-    if not pet_type:
+    type_name = db.get_pet_type_name(id)
+    if type_name is None:
         raise HTTPException(
             status_code=404,
             detail={"error": "Not found"}
@@ -64,87 +104,118 @@ def create_pet(id: str, pet_create: PetCreate):
             status_code=400,
             detail={"error": "Malformed data"}
         )
+    return type_name, pet
+
+async def add_pet(id: str, pet_create: PetCreate) -> Pet:
+    """Create a pet and download its picture before returning it"""
+    type_name, pet = await run_in_threadpool(_store_pet, id, pet_create)
 
     # Now handle picture download after pet is safely stored
-    if pet_create.picture and pet_create.picture != "NA":
+    if _has_picture_url(pet_create):
         try:
-            filename, image_data = ImageService.download_image(
+            filename, temp_path = await fetch_picture(
+                db,
                 pet_create.picture,
                 pet_create.name,
-                pet_type.type
+                type_name
             )
-            db.save_picture(filename, image_data)
-            db.save_pet_url(pet_type.type, pet_create.name, pet_create.picture)
-            
-            # Update the pet with the new picture filename
-            updated_pet = Pet(
-                name=pet_create.name,
-                birthdate=birthdate,
-                picture=filename
-            )
-            db.update_pet(id, pet_create.name, updated_pet)
-            pet = updated_pet  # Return the updated pet
-            
         except HTTPException:
             print("HTTPException during picture download")
-            db.delete_pet(id, pet_create.name)
-            db.delete_picture(picture)
-            db.delete_pet_url(pet_type.type, pet_create.name)
+            await run_in_threadpool(_discard_created_pet, id, pet)
             raise
         except Exception:
-            db.delete_pet(id, pet_create.name)
-            db.delete_picture(picture)
-            db.delete_pet_url(pet_type.type, pet_create.name)
+            await run_in_threadpool(_discard_created_pet, id, pet)
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "Malformed data"}
+            )
+
+        try:
+            updated_pet = await run_in_threadpool(
+                attach_picture, db, id, type_name, pet, pet_create.picture, filename, temp_path
+            )
+        except Exception:
+            await run_in_threadpool(_discard_attached_picture, id, type_name, pet, filename, temp_path)
             raise HTTPException(
                 status_code=400,
                 detail={"error": "Malformed data"}
             )
 
+        # The pet may have been deleted or replaced while we were downloading
+        if updated_pet is None:
+            raise HTTPException(
+                status_code=404,
+                detail={"error": "Not found"}
+            )
+        pet = updated_pet  # Return the updated pet
+
     # Return the created pet
     return pet
 
+def _discard_attached_picture(pet_type_id: str, type_name: str, pet: Pet, filename: str, temp_path: Path) -> None:
+    """Remove a pet whose picture could not be stored, with whatever was stored of it"""
+    temp_path.unlink(missing_ok=True)
+    db.delete_pet(pet_type_id, pet.name)
+    db.delete_picture(filename)
+    db.delete_pet_url(type_name, pet.name)
+
+@router.post("/batch")
+async def create_pets_batch(id: str, items: List[Any] = Body(...)) -> List[Dict[str, Any]]:
+    """Create many pets for a pet type, downloading their pictures concurrently"""
+    if await run_in_threadpool(db.get_pet_type_name, id) is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"error": "Not found"}
+        )
+
+    return await run_batch(
+        items,
+        PetCreate,
+        lambda pet_create: add_pet(id, pet_create),
+        # Pet names are unique within a pet type regardless of case
+        key=lambda pet_create: pet_create.name.casefold()
+    )
+
 @router.get("", response_model=List[Pet])
 def list_pets_for_type(
     id: str,
     birthdateGT: Optional[str] = None,
     birthdateLT: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    accept: Optional[str] = Header(None)
 ):
     """Get all pets of a pet type with optional filtering"""
     # Check if pet type exists
-    pet_type = db.get_pet_type(id)
-    if not pet_type:
+    type_name = db.get_pet_type_name(id)
+    if type_name is None:
         raise HTTPException(
             status_code=404,
             detail={"error": "Not found"}
         )
     
-    pets = db.get_all_pets(id)
-
     if birthdateGT or birthdateLT:
-        filtered_pets = []
+        # Pets with "NA" birthdates are never part of a date-filtered result
+        pets = db.get_pets_by_birthdate(
+            id,
+            after=birthdate_ordinal(birthdateGT) if birthdateGT else None,
+            before=birthdate_ordinal(birthdateLT) if birthdateLT else None
+        )
+    else:
+        pets = db.get_all_pets(id)
 
-        gt_date = parse_date(birthdateGT) if birthdateGT else None
-        lt_date = parse_date(birthdateLT) if birthdateLT else None
+    pets, next_cursor = paginate(
+        pets,
+        lambda pet: db.get_pet_seq(id, pet.name),
+        limit,
+        cursor
+    )
 
-        for pet in pets:
-            if pet.birthdate == "NA":
-                continue
-            
-            pet_date = parse_date(pet.birthdate)
-            if not pet_date:
-                continue
-            
-            if gt_date and pet_date <= gt_date:
-                continue
-            
-            if lt_date and pet_date >= lt_date:
-                continue
-            
-            filtered_pets.append(pet)
-        
-        pets = filtered_pets
-    
-    return pets
+    if stream or wants_ndjson(accept):
+        return stream_collection(pets, wants_ndjson(accept), next_cursor)
+
+    return collection_response(pets, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
         
 
 
@@ -152,8 +223,8 @@ def list_pets_for_type(
 def get_pet(id: str, name: str):
     """Get a specific pet"""
 
-    pet_type = db.get_pet_type(id)
-    if not pet_type:
+    type_name = db.get_pet_type_name(id)
+    if type_name is None:
         raise HTTPException(
             status_code=404,
             detail={"error": "Not found"}
@@ -165,15 +236,15 @@ def get_pet(id: str, name: str):
             status_code=404,
             detail={"error": "Not found"}
         )
-    return pet
+    return model_response(pet)
 
 
 @router.delete("/{name}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_pet(id: str, name: str):
     """Delete a pet"""
     # Check if pet type exists
-    pet_type = db.get_pet_type(id)
-    if not pet_type:
+    type_name = db.get_pet_type_name(id)
+    if type_name is None:
         raise HTTPException(
             status_code=404,
             detail={"error": "Not found"}
@@ -191,18 +262,45 @@ def delete_pet(id: str, name: str):
     # Delete picture if exists
     if pet.picture != "NA":
         db.delete_picture(pet.picture)
+    db.delete_pet_url(type_name, pet.name)
 
     db.delete_pet(id, name)
 
     return
 
 @router.put("/{name}", response_model=Pet)
-def update_pet(id: str, name: str, pet_update: PetCreate):
+async def update_pet(id: str, name: str, pet_update: PetCreate):
     """Update a pet"""
-    
+    type_name, existing_pet, existing_url = await run_in_threadpool(_find_pet_to_update, id, name)
+
+    downloaded = None
+    if pet_update.picture and pet_update.picture != "NA":
+        if existing_url != pet_update.picture:
+            try:
+                downloaded = await fetch_picture(
+                    db,
+                    pet_update.picture,
+                    pet_update.name,
+                    type_name
+                )
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(
+                    status_code=400,
+                    detail={"error": "Malformed data"}
+                )
+
+    return await run_in_threadpool(_apply_update, id, name, type_name, existing_pet, pet_update, downloaded)
+
+def _find_pet_to_update(id: str, name: str) -> Tuple[str, Pet, Optional[str]]:
+    """
+    The pet type name and pet a PUT applies to
+    Returns tuple of (type name, pet, URL of its current picture)
+    """
     #Check if pet type exists
-    pet_type = db.get_pet_type(id)
-    if not pet_type:
+    type_name = db.get_pet_type_name(id)
+    if type_name is None:
         raise HTTPException(
             status_code=404,
             detail={"error": "Not found"}
@@ -215,45 +313,55 @@ def update_pet(id: str, name: str, pet_update: PetCreate):
             status_code=404,
             detail={"error": "Not found"}
         )
-    
+    return type_name, existing_pet, db.get_pet_url(type_name, existing_pet.name)
+
+def _apply_update(
+    id: str,
+    name: str,
+    type_name: str,
+    existing_pet: Pet,
+    pet_update: PetCreate,
+    downloaded: Optional[Tuple[str, Path]]
+) -> Pet:
     birthdate = pet_update.birthdate if pet_update.birthdate else "NA"
 
+    if downloaded is not None:
+        # The pet may have changed while we were downloading
+        existing_pet = db.get_pet(id, name)
+        if not existing_pet:
+            downloaded[1].unlink(missing_ok=True)
+            raise HTTPException(
+                status_code=404,
+                detail={"error": "Not found"}
+            )
+
     picture = existing_pet.picture
     
     if not pet_update.picture or pet_update.picture == "NA":
         picture = "NA"
 
         db.delete_picture(existing_pet.picture)
-        db.delete_pet_url(pet_type.type, existing_pet.name)
+        db.delete_pet_url(type_name, existing_pet.name)
 
-    elif pet_update.picture != "NA":
-        existing_url = db.get_pet_url(pet_type.type, existing_pet.name)
-        
-        if existing_url != pet_update.picture:
-            try:
-                filename, image_data = ImageService.download_image(
-                    pet_update.picture,
-                    pet_update.name,
-                    pet_type.type
-                )
-
-                # Delete old picture if different
-                if existing_pet.picture != "NA" and existing_pet.picture != filename:
-                    db.delete_picture(existing_pet.picture)
-                
-                # Delete old URL mapping
-                db.delete_pet_url(pet_type.type, existing_pet.name)
-                
-                db.save_picture(filename, image_data)
-                db.save_pet_url(pet_type.type, pet_update.name, pet_update.picture)
-                picture = filename
-            except HTTPException:
-                raise
-            except Exception as e:
-                raise HTTPException(
-                    status_code=400,
-                    detail={"error": "Malformed data"}
-                )
+    elif downloaded is not None:
+        filename, temp_path = downloaded
+        try:
+            # Delete old picture if different
+            if existing_pet.picture != "NA" and existing_pet.picture != filename:
+                db.delete_picture(existing_pet.picture)
+            
+            # Delete old URL mapping
+            db.delete_pet_url(type_name, existing_pet.name)
+            
+            db.save_picture_file(filename, temp_path)
+            db.save_pet_url(type_name, pet_update.name, pet_update.picture, filename)
+            picture = filename
+        except Exception as e:
+            temp_path.unlink(missing_ok=True)
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "Malformed data"}
+            )
 
     updated_pet = Pet(
             name=pet_update.name,
@@ -262,4 +370,4 @@ def update_pet(id: str, name: str, pet_update: PetCreate):
         )
     
     db.update_pet(id, name, updated_pet)
-    return updated_pet
\ No newline at end of file
+    return updated_pet
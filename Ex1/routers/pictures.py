@@ -1,23 +1,170 @@
-from fastapi import APIRouter, HTTPException, Response
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 
-from database.memory_db import db
+from config import PICTURE_CACHE_CONTROL, PICTURE_CHUNK_SIZE, PICTURE_MAX_DIMENSION
+from database import db
 from services.picture import ImageService
+from services.picture_variants import TRANSCODE_FORMATS, get_variant, negotiate_format, requested_size
 
 router = APIRouter(prefix="/pictures", tags=["pictures"])
 
 @router.get("/{file_name}")
-def get_picture(file_name: str):
-    """Get a picture by its file name"""
+def get_picture(
+    file_name: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=PICTURE_MAX_DIMENSION),
+    h: Optional[int] = Query(None, ge=1, le=PICTURE_MAX_DIMENSION),
+    size: Optional[str] = None
+):
+    """
+    Get a picture by its file name
+    With w and/or h, or a named size preset, the picture is scaled down to fit
+    Clients whose Accept header lists WebP or AVIF get the picture in that format
+    """
+    box = requested_size(w, h, size)
+    accept = request.headers.get("Accept")
+
+    # Hot pictures are served from memory without touching disk
+    cached = db.get_cached_picture(file_name) if box is None else None
+    if cached is not None:
+        content_type = ImageService.get_content_type(file_name)
+        if negotiate_format(accept, content_type) is None:
+            return picture_response(
+                request,
+                content_type,
+                cached.size,
+                cached.mtime_ns,
+                full=lambda headers: Response(content=cached.data, media_type=content_type, headers=headers),
+                partial=lambda start, end: iter((cached.data[start:end + 1],))
+            )
 
     # Check if picture exists
-    image_data = db.get_picture(file_name)
+    file_path = db.get_picture_path(file_name)
 
-    if not image_data:
+    if not file_path:
         raise HTTPException(
             status_code=404,
             detail={"error": "Not found"},
         )
 
     content_type = ImageService.get_content_type(file_name)
+    target = negotiate_format(accept, content_type)
+
+    if box is not None or target is not None:
+        file_path = get_variant(db, file_name, file_path, box, target)
+        if target is not None:
+            content_type = target.media_type
+
+    stat = file_path.stat()
+    return picture_response(
+        request,
+        content_type,
+        stat.st_size,
+        stat.st_mtime_ns,
+        # FileResponse streams from disk (zero-copy where the server supports it)
+        full=lambda headers: FileResponse(file_path, media_type=content_type, headers=headers, stat_result=stat),
+        partial=lambda start, end: read_file_range(file_path, start, end)
+    )
+
+def picture_response(
+    request: Request,
+    content_type: str,
+    size: int,
+    mtime_ns: int,
+    full: Callable[[Dict[str, str]], Response],
+    partial: Callable[[int, int], Iterator[bytes]]
+) -> Response:
+    """Apply conditional GET and Range handling, then build the body with full or partial"""
+    etag = make_etag(size, mtime_ns)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": PICTURE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if TRANSCODE_FORMATS:
+        # The format served depends on the Accept header
+        headers["Vary"] = "Accept"
+
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = requested_range(request, etag, size)
+    if byte_range is not None:
+        start, end = byte_range
+        if start >= size:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{size}"}
+            )
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            partial(start, end),
+            status_code=206,
+            media_type=content_type,
+            headers=headers
+        )
+
+    return full(headers)
+
+def make_etag(size: int, mtime_ns: int) -> str:
+    """Strong validator; pictures are replaced by atomic rename, so size + mtime change together"""
+    return f'"{size:x}-{mtime_ns:x}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    # If-None-Match uses weak comparison
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def requested_range(request: Request, etag: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" Range header
+    Returns inclusive (start, end), or None to send the whole picture
+    """
+    range_header = request.headers.get("Range")
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+
+    # A Range with a stale If-Range validator gets the full, current picture
+    if_range = request.headers.get("If-Range")
+    if if_range is not None and if_range.strip() != etag:
+        return None
+
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        # Multiple ranges are not supported; serving the whole picture is allowed
+        return None
+
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            if suffix <= 0:
+                return (size, size)
+            return (max(size - suffix, 0), size - 1)
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if start < 0 or (end is not None and end < start):
+        # Not a valid byte range, so the header is ignored
+        return None
+    return (start, size - 1 if end is None else min(end, size - 1))
 
-    return Response(content=image_data, media_type=content_type)
\ No newline at end of file
+def read_file_range(file_path: Path, start: int, end: int) -> Iterator[bytes]:
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(PICTURE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
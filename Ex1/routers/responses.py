@@ -0,0 +1,15 @@
+from typing import Dict, Optional, Sequence
+from fastapi import Response
+from models.base import ModelBase
+
+# Stored models are valid already, so GET endpoints return their cached
+# JSON directly instead of having FastAPI validate and encode them again
+# through response_model.
+
+def model_response(item: ModelBase) -> Response:
+    return Response(content=item.json_bytes(), media_type="application/json")
+
+def collection_response(items: Sequence[ModelBase], headers: Optional[Dict[str, str]] = None) -> Response:
+    """JSON array assembled from the items' cached encodings"""
+    body = b"[" + b",".join([item.json_bytes() for item in items]) + b"]"
+    return Response(content=body, media_type="application/json", headers=headers)
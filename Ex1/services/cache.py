@@ -0,0 +1,170 @@
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a per-entry TTL.
+    Values must be JSON serializable when a persistence file is given.
+
+    Changes are written to the file by a background thread at most every
+    flush_interval seconds, and once more on close() or interpreter exit,
+    so set() never waits on disk.
+    """
+
+    def __init__(self, max_entries: int, path: Optional[str] = None, flush_interval: float = 5.0):
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self.flush_interval = flush_interval
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._save_lock = threading.Lock()  # one writer of the file at a time
+        self._closed = threading.Event()
+        if self.path is not None:
+            self._load()
+            threading.Thread(target=self._flush_periodically, daemon=True).start()
+            atexit.register(self.close)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Returns tuple of (found, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    def flush(self) -> None:
+        """Write the entries to the file if they changed since the last write"""
+        if self.path is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                entries = dict(self._entries)
+                self._dirty = False
+            try:
+                self._save(entries)
+            except OSError:
+                with self._lock:
+                    self._dirty = True
+                raise
+
+    def close(self) -> None:
+        self._closed.set()
+        self.flush()
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Could not write cache file '{self.path}': {e}")
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, (expires_at, value) in stored.items():
+            if expires_at > now:
+                self._entries[key] = (expires_at, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self, entries: Dict[str, Tuple[float, Any]]) -> None:
+        # Write to a temp file first so a crash never leaves a truncated cache
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one call of the function"""
+
+    def __init__(self):
+        self._calls: Dict[str, "_Call"] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is not None:
+            # shield() so a cancelled waiter does not cancel the shared call
+            return await asyncio.shield(call)
+
+        call = asyncio.ensure_future(fn())
+        self._calls[key] = call
+        try:
+            return await asyncio.shield(call)
+        finally:
+            if call.done():
+                del self._calls[key]
+            else:
+                call.add_done_callback(lambda _: self._calls.pop(key, None))
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import httpx
+import requests
+from contextlib import asynccontextmanager
+from requests.adapters import HTTPAdapter
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from config import (
+    HTTP_ASYNC_MAX_CONNECTIONS,
+    HTTP_ASYNC_MAX_PER_HOST,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_MAX_REDIRECTS,
+    HTTP_POOL_BLOCK,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_READ_TIMEOUT,
+)
+
+# (connect, read) timeout applied to every outbound request
+TIMEOUT: Tuple[float, float] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+_async_client: Optional[httpx.AsyncClient] = None
+# Hosts with requests in flight; a host is dropped once its last request ends
+_host_slots: Dict[str, "_HostSlot"] = {}
+
+class _HostSlot:
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(HTTP_ASYNC_MAX_PER_HOST)
+        self.users = 0
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=HTTP_POOL_BLOCK
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_session() -> requests.Session:
+    """
+    Shared session whose connections are kept alive and reused per host;
+    for synchronous tools like the taxonomy CLI, the app uses the async client
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session()
+    return _session
+
+def get(url: str, **kwargs) -> requests.Response:
+    """requests.get through the shared session, with the configured timeouts by default"""
+    kwargs.setdefault("timeout", TIMEOUT)
+    return get_session().get(url, **kwargs)
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Shared async client; must only be used from the app's event loop.
+    Like requests, it follows redirects, up to HTTP_MAX_REDIRECTS of them
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            follow_redirects=True,
+            max_redirects=HTTP_MAX_REDIRECTS,
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_POOL_CONNECTIONS * HTTP_POOL_MAXSIZE
+            )
+        )
+    return _async_client
+
+@asynccontextmanager
+async def _host_slot(url: str) -> AsyncIterator[None]:
+    """Hold one of the HTTP_ASYNC_MAX_PER_HOST request slots of url's host"""
+    host = urlsplit(url).netloc.lower()
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = _host_slots[host] = _HostSlot()
+    slot.users += 1
+    try:
+        async with slot.semaphore:
+            yield
+    finally:
+        slot.users -= 1
+        if slot.users == 0:
+            del _host_slots[host]
+
+async def aget(url: str, **kwargs) -> httpx.Response:
+    """GET through the shared async client, limited per host"""
+    async with _host_slot(url):
+        return await get_async_client().get(url, **kwargs)
+
+@asynccontextmanager
+async def astream(url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+    """Streamed GET through the shared async client; the body is read inside the block"""
+    async with _host_slot(url):
+        async with get_async_client().stream("GET", url, **kwargs) as response:
+            yield response
+
+def close() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+async def aclose() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    _host_slots.clear()
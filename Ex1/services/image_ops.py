@@ -0,0 +1,65 @@
+from typing import Optional
+from PIL import Image, ImageOps
+
+# Functions run inside the image pool processes; this module imports only
+# Pillow so workers start quickly.
+
+try:
+    # Registers AVIF with Pillow versions that do not support it natively
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+def can_encode(image_format: str) -> bool:
+    """Whether this Pillow build can write image_format (e.g. "WEBP", "AVIF")"""
+    Image.init()
+    return image_format in Image.SAVE
+
+def verify_image(path: str, image_format: str) -> None:
+    """
+    Raise unless path holds an image_format picture (e.g. "JPEG", "PNG")
+    that Pillow can parse through to the end
+    """
+    with Image.open(path) as image:
+        if _base_format(image.format) != image_format:
+            raise ValueError(f"expected {image_format}, found {image.format}")
+        image.verify()
+
+def render_variant(
+    source: str,
+    dest: str,
+    width: Optional[int],
+    height: Optional[int],
+    image_format: Optional[str] = None
+) -> None:
+    """
+    Write source to dest scaled down to fit within width x height (either
+    may be None for no limit), in image_format or else the source format
+    """
+    with Image.open(source) as image:
+        image_format = image_format or _base_format(image.format)
+        # Apply the EXIF orientation so the result is upright without it
+        image = ImageOps.exif_transpose(image)
+        if width or height:
+            # thumbnail() keeps the aspect ratio and never enlarges
+            image.thumbnail((width or image.width, height or image.height))
+
+        if image_format == "JPEG":
+            image.save(dest, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+            return
+        if image_format in ("WEBP", "AVIF"):
+            if image.mode not in ("RGB", "RGBA"):
+                has_alpha = "A" in image.mode or "transparency" in image.info
+                image = image.convert("RGBA" if has_alpha else "RGB")
+            quality = WEBP_QUALITY if image_format == "WEBP" else AVIF_QUALITY
+            image.save(dest, format=image_format, quality=quality)
+            return
+        image.save(dest, format=image_format)
+
+def _base_format(pillow_format: Optional[str]) -> Optional[str]:
+    # Pillow reads multi-picture JPEGs (e.g. from phone cameras) as MPO
+    return "JPEG" if pillow_format == "MPO" else pillow_format
@@ -0,0 +1,32 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from config import IMAGE_WORKERS
+
+# Pillow work (decoding, resizing, encoding) runs in these processes so it
+# never holds the GIL of the API workers. They are forked from a
+# forkserver, not from the API process, so they never inherit its threads,
+# held locks or open store. The forkserver preloads services.image_ops;
+# as with "spawn", each worker still imports the main module as
+# __mp_main__ (app.py under `python app.py`), which is why the global
+# database is only created when the API process starts serving.
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["services.image_ops"])
+                _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=context)
+    return _pool
+
+def shutdown_image_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
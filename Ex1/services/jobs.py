@@ -0,0 +1,115 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from config import PICTURE_JOB_HISTORY, PICTURE_JOB_RETRIES, PICTURE_JOB_RETRY_DELAY, PICTURE_JOB_WORKERS
+from database.interface import DatabaseInterface
+from models.pet import Pet
+from models.picture_job import PictureJob
+from services.picture import TransientDownloadError
+from services.picture_fetch import attach_picture, fetch_picture
+
+class PictureJobQueue:
+    """
+    Downloads pictures in the background for pets that are already stored.
+    A fixed pool of worker tasks takes jobs in submission order; network
+    errors and 5xx/429 responses are retried with exponential backoff.
+    Jobs live in this process only, the most recent PICTURE_JOB_HISTORY kept.
+    """
+
+    def __init__(self, workers: int, retries: int, retry_delay: float, history: int):
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.history = history
+        self.jobs: "OrderedDict[str, PictureJob]" = OrderedDict()
+        self._queue: Optional["asyncio.Queue[Tuple[PictureJob, DatabaseInterface, str, Pet]]"] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def submit(self, db: DatabaseInterface, pet_type_id: str, pet_type: str, pet: Pet, url: str) -> PictureJob:
+        """Queue the picture at url for a stored pet; call from the event loop"""
+        self._start()
+        job = PictureJob(
+            id=uuid.uuid4().hex,
+            pet_type_id=pet_type_id,
+            pet_name=pet.name,
+            url=url
+        )
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.history:
+            self.jobs.popitem(last=False)
+        self._queue.put_nowait((job, db, pet_type, pet))
+        return job
+
+    def get(self, job_id: str) -> Optional[PictureJob]:
+        return self.jobs.get(job_id)
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def _start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._work(self._queue)) for _ in range(self.workers)]
+
+    async def _work(self, queue: "asyncio.Queue[Tuple[PictureJob, DatabaseInterface, str, Pet]]") -> None:
+        while True:
+            job, db, pet_type, pet = await queue.get()
+            try:
+                await self._run(job, db, pet_type, pet)
+            except Exception as e:
+                self._fail(job, {"server_error": str(e)})
+            finally:
+                queue.task_done()
+
+    async def _run(self, job: PictureJob, db: DatabaseInterface, pet_type: str, pet: Pet) -> None:
+        job.status = "running"
+        while True:
+            job.attempts += 1
+            try:
+                filename, temp_path = await fetch_picture(db, job.url, pet.name, pet_type)
+                break
+            except TransientDownloadError as e:
+                if job.attempts > self.retries:
+                    self._fail(job, e.detail)
+                    return
+                print(f"Retrying picture download for job {job.id} (attempt {job.attempts} failed)")
+                await asyncio.sleep(self.retry_delay * 2 ** (job.attempts - 1))
+            except HTTPException as e:
+                self._fail(job, e.detail)
+                return
+
+        try:
+            updated_pet = await run_in_threadpool(
+                attach_picture, db, job.pet_type_id, pet_type, pet, job.url, filename, temp_path
+            )
+        except Exception:
+            temp_path.unlink(missing_ok=True)
+            raise
+        if updated_pet is None:
+            self._fail(job, {"error": "Not found"})
+            return
+        job.picture = updated_pet.picture
+        job.status = "succeeded"
+
+    @staticmethod
+    def _fail(job: PictureJob, detail: dict) -> None:
+        print(f"Picture job {job.id} failed: {detail}")
+        job.error = detail
+        job.status = "failed"
+
+
+# Global job queue, workers start with the first job
+picture_jobs = PictureJobQueue(
+    workers=PICTURE_JOB_WORKERS,
+    retries=PICTURE_JOB_RETRIES,
+    retry_delay=PICTURE_JOB_RETRY_DELAY,
+    history=PICTURE_JOB_HISTORY
+)
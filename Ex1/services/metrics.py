@@ -0,0 +1,113 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+import anyio.to_thread
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_SECONDS = Histogram(
+    "petstore_http_request_duration_seconds",
+    "Time to answer a request, by route template",
+    ["method", "route", "status"]
+)
+
+OUTBOUND_SECONDS = Histogram(
+    "petstore_outbound_request_duration_seconds",
+    "Time spent on requests to other services (ninja: animal taxonomy, image: picture downloads)",
+    ["service"]
+)
+
+OUTBOUND_ERRORS = Counter(
+    "petstore_outbound_errors",
+    "Failed requests to other services; reason is network, status or content",
+    ["service", "reason"]
+)
+
+THREADPOOL_IN_USE = Gauge(
+    "petstore_threadpool_threads_in_use",
+    "Worker threads running sync endpoints and dependencies"
+)
+THREADPOOL_LIMIT = Gauge(
+    "petstore_threadpool_threads_limit",
+    "Most worker threads that may run at once"
+)
+THREADPOOL_WAITING = Gauge(
+    "petstore_threadpool_tasks_waiting",
+    "Calls waiting for a free worker thread"
+)
+
+@contextmanager
+def time_outbound(service: str) -> Iterator[None]:
+    """Observe how long the block takes, failed or not"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        OUTBOUND_SECONDS.labels(service).observe(time.perf_counter() - start)
+
+def count_outbound_error(service: str, reason: str) -> None:
+    OUTBOUND_ERRORS.labels(service, reason).inc()
+
+def update_threadpool_gauges() -> None:
+    """Read the threadpool limiter; must be called from the event loop"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    THREADPOOL_IN_USE.set(limiter.borrowed_tokens)
+    THREADPOOL_LIMIT.set(limiter.total_tokens)
+    THREADPOOL_WAITING.set(limiter.statistics().tasks_waiting)
+
+
+class StoreCollector(Collector):
+    """Reports the store's sizes, read at scrape time from get_stats()"""
+
+    # get_stats() keys that only ever grow
+    COUNTERS = ("picture_cache_hits", "picture_cache_misses", "picture_cache_evictions")
+
+    def __init__(self, get_stats: Callable[[], Dict[str, int]]):
+        self.get_stats = get_stats
+
+    def describe(self):
+        # Without it the registry would collect() on register, and open the store at import
+        return []
+
+    def collect(self):
+        for name, value in self.get_stats().items():
+            if name in self.COUNTERS:
+                yield CounterMetricFamily(f"petstore_{name}", f"Store statistic {name}", value=value)
+            else:
+                yield GaugeMetricFamily(f"petstore_{name}", f"Store statistic {name}", value=value)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request under the template of the route it matched
+    (e.g. /pet-types/{id}/pets/{name}), so the label set stays bounded
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            template = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], template, str(status_code)).observe(
+                time.perf_counter() - start
+            )
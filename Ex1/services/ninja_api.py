@@ -1,91 +1,191 @@
 import os
 import re
-import requests
-from typing import Optional, List
+import httpx
+from typing import Any, Callable, Optional, List, Tuple
 from fastapi import HTTPException
 from dotenv import load_dotenv
+from config import (
+    NINJA_API_URL,
+    NINJA_CACHE_FILE,
+    NINJA_CACHE_FLUSH_INTERVAL,
+    NINJA_CACHE_NEGATIVE_TTL,
+    NINJA_CACHE_SIZE,
+    NINJA_CACHE_TTL,
+    NINJA_TAXONOMY_FALLBACK,
+    NINJA_TAXONOMY_FILE,
+)
+from services import http_client
+from services.cache import AsyncSingleFlight, TTLCache
+from services.metrics import count_outbound_error, time_outbound
+from services.taxonomy import TaxonomyIndex
 
 # Load environment variables from .env file
 load_dotenv()
 
 NINJA_API_KEY = os.getenv("NINJA_API_KEY")
 
-if not NINJA_API_KEY:
+# Without the fallback every lookup is answered from the taxonomy file
+if not NINJA_API_KEY and not (NINJA_TAXONOMY_FILE and not NINJA_TAXONOMY_FALLBACK):
     raise ValueError("NINJA_API_KEY environment variable is required but not set")
 
 class NinjaAPIService:
-    BASE_URL = "https://api.api-ninjas.com/v1/animals"
+    BASE_URL = NINJA_API_URL
 
+    # Offline taxonomy, consulted before the cache; loaded below
+    _taxonomy = TaxonomyIndex()
+    # casefolded name -> {"info": {...}} or {"error": {"status_code": ..., "detail": ...}}
+    _cache = TTLCache(NINJA_CACHE_SIZE, NINJA_CACHE_FILE, NINJA_CACHE_FLUSH_INTERVAL)
+    _inflight_async = AsyncSingleFlight()
 
     @staticmethod
-    def get_animal_info(animal_type: str) -> dict:
-        headers = {"X-Api-Key": NINJA_API_KEY}
-        params = {"name": animal_type}
+    async def get_animal_info_async(animal_type: str) -> dict:
+        """
+        Get taxonomy info for an animal, served from the taxonomy file or
+        the cache when possible. Unknown animals are cached too (for a
+        shorter time); concurrent lookups of the same name share a single
+        upstream request.
+        """
+        key = animal_type.casefold()
+        found, entry = NinjaAPIService._offline_entry(key)
+        if not found:
+            found, entry = NinjaAPIService._cache.get(key)
+        if not found:
+            entry = await NinjaAPIService._inflight_async.do(
+                key,
+                lambda: NinjaAPIService._fetch_and_cache_async(key, animal_type)
+            )
+        return NinjaAPIService._unpack_cache_entry(entry)
+
+    @staticmethod
+    def _offline_entry(key: str) -> Tuple[bool, Optional[dict]]:
+        """Cache-style entry from the taxonomy file; misses are final without the fallback"""
+        info = NinjaAPIService._taxonomy.get(key)
+        if info is not None:
+            return True, {"info": info}
+        if NINJA_TAXONOMY_FILE and not NINJA_TAXONOMY_FALLBACK:
+            return True, {"error": {"status_code": 400, "detail": {"error": "Malformed data"}}}
+        return False, None
+
+    @staticmethod
+    async def _fetch_and_cache_async(key: str, animal_type: str) -> dict:
+        found, entry = NinjaAPIService._cache.get(key)
+        if found:
+            return entry
+
         try:
-            response = requests.get(
-                NinjaAPIService.BASE_URL,
-                headers=headers,
-                params=params
+            info = await NinjaAPIService._fetch_animal_info_async(animal_type)
+        except HTTPException as e:
+            return NinjaAPIService._cache_error(key, e)
+        return NinjaAPIService._cache_info(key, info)
+
+    @staticmethod
+    def _cache_info(key: str, info: dict) -> dict:
+        entry = {"info": info}
+        NinjaAPIService._cache.set(key, entry, NINJA_CACHE_TTL)
+        return entry
+
+    @staticmethod
+    def _cache_error(key: str, error: HTTPException) -> dict:
+        """Cache an unknown-animal answer; anything else is re-raised uncached"""
+        if error.status_code != 400:
+            raise error
+        entry = {"error": {"status_code": error.status_code, "detail": error.detail}}
+        NinjaAPIService._cache.set(key, entry, NINJA_CACHE_NEGATIVE_TTL)
+        return entry
+
+    @staticmethod
+    def _unpack_cache_entry(entry: dict) -> dict:
+        if "error" in entry:
+            raise HTTPException(
+                status_code=entry["error"]["status_code"],
+                detail=entry["error"]["detail"]
             )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail={"server_error": f"API response code {response.status_code}"}
-                )
-            
-            data = response.json()
+        # Callers get their own copy so they cannot mutate the cached one
+        info = entry["info"]
+        return {**info, "attributes": list(info["attributes"])}
 
-            if not data or len(data) == 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail={"error": "Malformed data"}
-                )
-            
-            animal_type_lower = animal_type.lower()
-            matched_animal = None
-
-            for animal in data:
-                if animal.get("name", "").lower() == animal_type_lower:
-                    matched_animal = animal
-                    break
-            
-            if not matched_animal:
-                raise HTTPException(
-                    status_code=400,
-                    detail={"error": "Malformed data"}
+    @staticmethod
+    async def _fetch_animal_info_async(animal_type: str) -> dict:
+        try:
+            with time_outbound("ninja"):
+                response = await http_client.aget(
+                    NinjaAPIService.BASE_URL,
+                    headers={"X-Api-Key": NINJA_API_KEY},
+                    params={"name": animal_type}
                 )
-            
-            family = matched_animal.get("taxonomy", {}).get("family", "")
-            genus = matched_animal.get("taxonomy", {}).get("genus", "")
-
-            attributes = []
-            if "characteristics" in matched_animal:
-                chars = matched_animal["characteristics"]
-                if "temperament" in chars and chars["temperament"]:
-                    attributes = NinjaAPIService._extract_attributes(chars["temperament"])
-                elif "group_behavior" in chars and chars["group_behavior"]:
-                    attributes = NinjaAPIService._extract_attributes(chars["group_behavior"])
-            
-            lifespan = None
-            if "characteristics" in matched_animal and "lifespan" in matched_animal["characteristics"]:
-                lifespan_str = matched_animal["characteristics"]["lifespan"]
-                lifespan = NinjaAPIService._parse_lifespan(lifespan_str)
-            
-            return {
-                "family": family,
-                "genus": genus,
-                "attributes": attributes,
-                "lifespan": lifespan
-            }
+        except httpx.HTTPError as e:
+            count_outbound_error("ninja", "network")
+            raise HTTPException(
+                status_code=500,
+                detail={"server_error": f"Request failed: {str(e)}"}
+            )
+        return NinjaAPIService._parse_animal_info(animal_type, response.status_code, response.json)
+
+    @staticmethod
+    def _parse_animal_info(animal_type: str, status_code: int, read_json: Callable[[], Any]) -> dict:
+        if status_code != 200:
+            count_outbound_error("ninja", "status")
+            raise HTTPException(
+                status_code=500,
+                detail={"server_error": f"API response code {status_code}"}
+            )
         
-        except requests.RequestException as e:
+        try:
+            data = read_json()
+        except ValueError as e:
+            count_outbound_error("ninja", "content")
             raise HTTPException(
                 status_code=500,
                 detail={"server_error": f"Request failed: {str(e)}"}
             )
 
+        if not data or len(data) == 0:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "Malformed data"}
+            )
+        
+        animal_type_lower = animal_type.lower()
+        matched_animal = None
+
+        for animal in data:
+            if animal.get("name", "").lower() == animal_type_lower:
+                matched_animal = animal
+                break
+        
+        if not matched_animal:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "Malformed data"}
+            )
+        
+        return NinjaAPIService.parse_record(matched_animal)
+
+    @staticmethod
+    def parse_record(animal: dict) -> dict:
+        """Turn one animal record of the API into the info get_animal_info_async returns"""
+        family = animal.get("taxonomy", {}).get("family", "")
+        genus = animal.get("taxonomy", {}).get("genus", "")
+
+        attributes = []
+        if "characteristics" in animal:
+            chars = animal["characteristics"]
+            if "temperament" in chars and chars["temperament"]:
+                attributes = NinjaAPIService._extract_attributes(chars["temperament"])
+            elif "group_behavior" in chars and chars["group_behavior"]:
+                attributes = NinjaAPIService._extract_attributes(chars["group_behavior"])
+        
+        lifespan = None
+        if "characteristics" in animal and "lifespan" in animal["characteristics"]:
+            lifespan_str = animal["characteristics"]["lifespan"]
+            lifespan = NinjaAPIService._parse_lifespan(lifespan_str)
         
+        return {
+            "family": family,
+            "genus": genus,
+            "attributes": attributes,
+            "lifespan": lifespan
+        }
 
     @staticmethod
     def _extract_attributes(entry: str) -> List[str]:
@@ -105,4 +205,8 @@ class NinjaAPIService:
         if numbers:
             return int(min( numbers, key=int))
         
-        return None
\ No newline at end of file
+        return None
+
+
+if NINJA_TAXONOMY_FILE:
+    NinjaAPIService._taxonomy.load(NINJA_TAXONOMY_FILE, NinjaAPIService.parse_record)
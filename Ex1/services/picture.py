@@ -1,60 +1,135 @@
-import requests
-from typing import Tuple
+import asyncio
+import os
+import tempfile
+import httpx
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Mapping, NamedTuple, Tuple
 from fastapi import HTTPException
+from config import MAX_PICTURE_BYTES, PICTURE_CHUNK_SIZE, PICTURE_VERIFY
+from services import http_client
+from services.image_ops import verify_image
+from services.image_pool import get_image_pool
+from services.metrics import count_outbound_error, time_outbound
+
+class _Signature(NamedTuple):
+    pillow_format: str
+    header: bytes
+    trailer: bytes
+
+# Bytes every stored picture starts and ends with, by file extension
+_SIGNATURES = {
+    "jpg": _Signature("JPEG", b"\xff\xd8\xff", b"\xff\xd9"),
+    "png": _Signature("PNG", b"\x89PNG\r\n\x1a\n", b"IEND\xaeB`\x82"),
+}
+
+# How far from the end a JPEG's end marker may be: multi-picture JPEGs and
+# motion photos carry further images or a short clip after the main image
+_JPEG_TRAILER_WINDOW = 64 * 1024
+
+class TransientDownloadError(HTTPException):
+    """A picture download that failed in a way worth retrying: network errors, 5xx and 429 responses"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=400,
+            detail={"error": "Malformed data"}
+        )
 
 class ImageService:
     """Service for handling image downloads and storage"""
     
     @staticmethod
-    def download_image(url: str, pet_name: str, pet_type: str) -> Tuple[str, bytes]:
+    async def download_image_async(url: str, pet_name: str, pet_type: str, dest_dir: Path) -> Tuple[str, Path]:
         """
-        Download an image from URL
-        Returns tuple of (filename, image_data)
+        Download an image from URL into a temp file inside dest_dir,
+        one chunk at a time, aborting once it exceeds MAX_PICTURE_BYTES or
+        its first bytes do not match the Content-Type; with PICTURE_VERIFY
+        the complete file is also decoded by Pillow before it is accepted
+        Returns tuple of (filename, temp_path)
         """
         try:
-            response = requests.get(url, timeout=10)
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=400,
-                    detail={"error": "Malformed data"}
-                )
-            
-            content_type = response.headers.get("Content-Type", "")
-            print(f"Content-Type received from URL: '{content_type}'")
-            
-            if not content_type:
-                print("No Content-Type header found in response")
-                raise HTTPException(
-                    status_code=415,
-                    detail={"error": "Unsupported Media Type"}
-                )
-            
-            content_type = content_type.lower()
-            
-            if "jpeg" in content_type or "jpg" in content_type:
-                extension = "jpg"
-            elif "png" in content_type:
-                extension = "png"
-            else:
-                # Debug: Print the actual content type received
-                print(f"Unsupported Content-Type received: '{content_type}'")
-                raise HTTPException(
-                    status_code=415,
-                    detail={"error": "Unsupported Media Type"}
-                )
-            
-            safe_pet_name = pet_name.replace(" ", "-").lower()
-            safe_pet_type = pet_type.replace(" ", "-").lower()
-            filename = f"{safe_pet_name}-{safe_pet_type}.{extension}"
-            
-            return filename, response.content
-            
-        except requests.RequestException as e:
+            with time_outbound("image"):
+                async with http_client.astream(url) as response:
+                    filename = ImageService._check_response(response.status_code, response.headers, pet_name, pet_type)
+                    with _TempDownload(dest_dir, filename) as download:
+                        async for chunk in response.aiter_bytes(chunk_size=PICTURE_CHUNK_SIZE):
+                            download.write(chunk)
+                        download.finish()
+                        if PICTURE_VERIFY:
+                            with download.verifying():
+                                # Decoding is CPU bound, it runs in the image process pool
+                                await asyncio.get_running_loop().run_in_executor(
+                                    get_image_pool(), verify_image, str(download.path), download.signature.pillow_format
+                                )
+                        return filename, download.path
+        except httpx.TooManyRedirects:
+            count_outbound_error("image", "status")
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "Malformed data"}
+            )
+        except httpx.HTTPError as e:
+            count_outbound_error("image", "network")
+            raise TransientDownloadError()
+        except HTTPException:
+            # Raised once the response arrived: a bad status, or content we do not accept
+            count_outbound_error("image", "status" if response.status_code != 200 else "content")
+            raise
+
+    @staticmethod
+    def _check_response(status_code: int, headers: Mapping[str, str], pet_name: str, pet_type: str) -> str:
+        """
+        Validate an image response
+        Returns the filename to store the image under
+        """
+        if status_code >= 500 or status_code == 429:
+            raise TransientDownloadError()
+        if status_code != 200:
             raise HTTPException(
                 status_code=400,
                 detail={"error": "Malformed data"}
             )
+        
+        content_type = headers.get("Content-Type", "")
+        print(f"Content-Type received from URL: '{content_type}'")
+        
+        if not content_type:
+            print("No Content-Type header found in response")
+            raise HTTPException(
+                status_code=415,
+                detail={"error": "Unsupported Media Type"}
+            )
+        
+        content_length = headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_PICTURE_BYTES:
+            print(f"Image too large: {content_length} bytes")
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "Malformed data"}
+            )
+        
+        content_type = content_type.lower()
+        
+        if "jpeg" in content_type or "jpg" in content_type:
+            extension = "jpg"
+        elif "png" in content_type:
+            extension = "png"
+        else:
+            # Debug: Print the actual content type received
+            print(f"Unsupported Content-Type received: '{content_type}'")
+            raise HTTPException(
+                status_code=415,
+                detail={"error": "Unsupported Media Type"}
+            )
+        
+        return ImageService.picture_filename(pet_name, pet_type, extension)
+
+    @staticmethod
+    def picture_filename(pet_name: str, pet_type: str, extension: str) -> str:
+        safe_pet_name = pet_name.replace(" ", "-").lower()
+        safe_pet_type = pet_type.replace(" ", "-").lower()
+        return f"{safe_pet_name}-{safe_pet_type}.{extension}"
     
     @staticmethod
     def get_content_type(filename: str) -> str:
@@ -64,9 +139,94 @@ class ImageService:
             return "image/png"
         elif filename_lower.endswith(".jpg") or filename_lower.endswith(".jpeg"):
             return "image/jpeg"
+        elif filename_lower.endswith(".webp"):
+            return "image/webp"
+        elif filename_lower.endswith(".avif"):
+            return "image/avif"
         else:
             print(f"Unsupported filename extension: '{filename}'")
             raise HTTPException(
                 status_code=415,
                 detail={"error": "Unsupported Media Type"}
-            )
\ No newline at end of file
+            )
+
+
+class _TempDownload:
+    """
+    Temp file that receives a download; it is removed again unless the
+    block finishes without error, in which case the caller owns it.
+    The content must carry the magic bytes of the filename's format, so
+    a mislabeled download is rejected with its first chunk
+    """
+
+    def __init__(self, dest_dir: Path, filename: str):
+        self.signature = _SIGNATURES[Path(filename).suffix.lstrip(".")]
+        fd, name = tempfile.mkstemp(dir=dest_dir, prefix=".download-", suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+        self.path = Path(name)
+        self.size = 0
+        self.head = b""
+        self.tail = b""
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > MAX_PICTURE_BYTES:
+            print(f"Image larger than {MAX_PICTURE_BYTES} bytes, aborting download")
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "Malformed data"}
+            )
+        header = self.signature.header
+        if len(self.head) < len(header):
+            self.head += chunk[:len(header) - len(self.head)]
+            if not header.startswith(self.head):
+                print(f"Image content does not start like a {self.signature.pillow_format} file, aborting download")
+                raise HTTPException(
+                    status_code=415,
+                    detail={"error": "Unsupported Media Type"}
+                )
+        self.tail = (self.tail + chunk)[-self._tail_size():]
+        self.file.write(chunk)
+
+    def _tail_size(self) -> int:
+        if self.signature.pillow_format == "JPEG":
+            return _JPEG_TRAILER_WINDOW
+        return len(self.signature.trailer)
+
+    def finish(self) -> None:
+        """
+        Check that the whole image arrived. A JPEG only needs its end marker
+        somewhere in the last _JPEG_TRAILER_WINDOW bytes, for the data some
+        cameras append after the image
+        """
+        if self.signature.pillow_format == "JPEG":
+            complete = self.signature.trailer in self.tail
+        else:
+            complete = self.tail.endswith(self.signature.trailer)
+        if self.head != self.signature.header or not complete:
+            print(f"Image is not a complete {self.signature.pillow_format} file ({self.size} bytes)")
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "Malformed data"}
+            )
+        self.file.close()
+
+    @contextmanager
+    def verifying(self) -> Iterator[None]:
+        """Reject the download if the decode check in the block fails"""
+        try:
+            yield
+        except Exception as e:
+            print(f"Image failed verification: {e}")
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "Malformed data"}
+            )
+
+    def __enter__(self) -> "_TempDownload":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.file.close()
+        if exc_type is not None:
+            self.path.unlink(missing_ok=True)
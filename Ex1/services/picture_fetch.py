@@ -0,0 +1,100 @@
+import asyncio
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from database.interface import DatabaseInterface
+from models.pet import Pet
+from services.picture import ImageService
+
+class _Download:
+    """A download shared by every request for the same URL while it runs"""
+
+    def __init__(self, task: "asyncio.Task[Tuple[str, Path]]"):
+        self.task = task
+        self.waiters = 0
+
+_downloads: Dict[str, _Download] = {}
+
+async def fetch_picture(db: DatabaseInterface, url: str, pet_name: str, pet_type: str) -> Tuple[str, Path]:
+    """
+    Get the image at url as a temp file ready for db.save_picture_file
+    Reuses a picture already downloaded from the same URL, and joins a
+    download of the same URL that is already in progress
+    Returns tuple of (filename, temp_path)
+    """
+    existing = await run_in_threadpool(db.get_url_picture, url)
+    if existing is not None:
+        temp_path = await run_in_threadpool(db.stage_picture_copy, existing)
+        if temp_path is not None:
+            print(f"Reusing picture '{existing}' already downloaded from URL")
+            return _picture_filename(pet_name, pet_type, existing), temp_path
+
+    download = _downloads.get(url)
+    if download is None:
+        task = asyncio.ensure_future(
+            ImageService.download_image_async(url, pet_name, pet_type, db.pictures_dir)
+        )
+        download = _downloads[url] = _Download(task)
+        task.add_done_callback(lambda _: _downloads.pop(url, None))
+
+    download.waiters += 1
+    try:
+        # shield() so one cancelled request does not cancel the shared download
+        shared_name, shared_path = await asyncio.shield(download.task)
+        temp_path = _link_temp(shared_path)
+        return _picture_filename(pet_name, pet_type, shared_name), temp_path
+    finally:
+        download.waiters -= 1
+        if download.waiters == 0:
+            download.task.add_done_callback(lambda _: _discard_shared_file(download))
+
+def attach_picture(
+    db: DatabaseInterface,
+    pet_type_id: str,
+    pet_type: str,
+    pet: Pet,
+    url: str,
+    filename: str,
+    temp_path: Path
+) -> Optional[Pet]:
+    """
+    Store a fetched picture and point the pet at it
+    Returns the updated pet, or None if the pet was deleted or replaced while downloading
+    """
+    if db.get_pet(pet_type_id, pet.name) != pet:
+        temp_path.unlink(missing_ok=True)
+        return None
+
+    db.save_picture_file(filename, temp_path)
+    db.save_pet_url(pet_type, pet.name, url, filename)
+    updated_pet = Pet(
+        name=pet.name,
+        birthdate=pet.birthdate,
+        picture=filename
+    )
+    db.update_pet(pet_type_id, pet.name, updated_pet)
+    return updated_pet
+
+def _link_temp(shared_path: Path) -> Path:
+    """Give each waiter its own hard link to the shared download"""
+    temp_path = shared_path.with_name(f"{shared_path.stem}-{uuid.uuid4().hex}.part")
+    try:
+        temp_path.hardlink_to(shared_path)
+    except OSError:
+        temp_path.write_bytes(shared_path.read_bytes())
+    return temp_path
+
+def _discard_shared_file(download: _Download) -> None:
+    # A request may have joined after the last one left; it still needs the file
+    if download.waiters > 0:
+        return
+    task = download.task
+    if task.cancelled() or task.exception() is not None:
+        return
+    _, shared_path = task.result()
+    shared_path.unlink(missing_ok=True)
+
+def _picture_filename(pet_name: str, pet_type: str, source_name: str) -> str:
+    extension = Path(source_name).suffix.lstrip(".")
+    return ImageService.picture_filename(pet_name, pet_type, extension)
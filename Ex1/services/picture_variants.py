@@ -0,0 +1,150 @@
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from fastapi import HTTPException
+from PIL import UnidentifiedImageError
+from config import PICTURE_SIZE_PRESETS, PICTURE_TRANSCODE
+from database.interface import DatabaseInterface
+from services.cache import SingleFlight
+from services.image_ops import can_encode, render_variant
+from services.image_pool import get_image_pool
+
+class TranscodeFormat(NamedTuple):
+    media_type: str
+    pillow_format: str
+    extension: str
+
+def parse_size_presets(spec: str) -> Dict[str, Tuple[int, int]]:
+    """Parse "name=WIDTHxHEIGHT,..." into {name: (width, height)}"""
+    presets = {}
+    for entry in spec.split(","):
+        name, _, dimensions = entry.strip().partition("=")
+        if name and dimensions:
+            width, height = dimensions.lower().split("x")
+            presets[name] = (int(width), int(height))
+    return presets
+
+SIZE_PRESETS = parse_size_presets(PICTURE_SIZE_PRESETS)
+
+# Formats pictures may be transcoded to, most preferred first
+TRANSCODE_FORMATS: List[TranscodeFormat] = [
+    candidate
+    for candidate in (
+        TranscodeFormat("image/avif", "AVIF", ".avif"),
+        TranscodeFormat("image/webp", "WEBP", ".webp"),
+    )
+    if PICTURE_TRANSCODE and can_encode(candidate.pillow_format)
+]
+
+# Concurrent requests for the same missing variant render it once
+_renders = SingleFlight()
+
+def requested_size(
+    width: Optional[int],
+    height: Optional[int],
+    size: Optional[str]
+) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """
+    Resolve ?w=&h= or a ?size= preset to a bounding box
+    Returns (width, height), either of which may be None, or None for the original picture
+    """
+    if size is not None:
+        if size not in SIZE_PRESETS or width is not None or height is not None:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "Malformed data"}
+            )
+        return SIZE_PRESETS[size]
+    if width is None and height is None:
+        return None
+    return width, height
+
+def negotiate_format(accept: Optional[str], content_type: str) -> Optional[TranscodeFormat]:
+    """
+    Pick the transcode format the client prefers over the stored content_type
+    Only formats the Accept header names explicitly count; "image/*" alone
+    keeps the original. Returns None to serve the stored format
+    """
+    if not accept or not TRANSCODE_FORMATS:
+        return None
+
+    weights: Dict[str, float] = {}
+    for entry in accept.lower().split(","):
+        media_type, *params = (part.strip() for part in entry.split(";"))
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[media_type] = weight
+
+    original_weight = weights.get(content_type, weights.get("image/*", weights.get("*/*", 0.0)))
+    best = None
+    best_weight = 0.0
+    for candidate in TRANSCODE_FORMATS:
+        weight = weights.get(candidate.media_type, 0.0)
+        # Ties go to the transcoded format, it is the smaller one
+        if weight > best_weight and weight >= original_weight:
+            best, best_weight = candidate, weight
+    return best
+
+def get_variant(
+    db: DatabaseInterface,
+    file_name: str,
+    source_path: Path,
+    box: Optional[Tuple[Optional[int], Optional[int]]],
+    target: Optional[TranscodeFormat] = None
+) -> Path:
+    """
+    Path of the picture scaled down to fit within box and/or transcoded to
+    target, rendered on first request
+    """
+    width, height = box or (None, None)
+    stat = source_path.stat()
+    extension = target.extension if target else Path(file_name).suffix
+    # Named after the source version too, so a replaced picture never serves an old variant
+    variant_name = f"{width or 0}x{height or 0}-{stat.st_size:x}-{stat.st_mtime_ns:x}{extension}"
+    variant_path = db.get_variants_dir(file_name) / variant_name
+    if variant_path.is_file():
+        return variant_path
+    image_format = target.pillow_format if target else None
+    return _renders.do(
+        str(variant_path),
+        lambda: _render(source_path, variant_path, width, height, image_format)
+    )
+
+def _render(
+    source_path: Path,
+    variant_path: Path,
+    width: Optional[int],
+    height: Optional[int],
+    image_format: Optional[str]
+) -> Path:
+    if variant_path.is_file():
+        return variant_path
+    variant_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = variant_path.with_name(f".{uuid.uuid4().hex}.part")
+    try:
+        get_image_pool().submit(
+            render_variant, str(source_path), str(temp_path), width, height, image_format
+        ).result()
+        os.replace(temp_path, variant_path)
+    except FileNotFoundError:
+        # The picture was deleted while rendering
+        raise HTTPException(
+            status_code=404,
+            detail={"error": "Not found"}
+        )
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        print(f"Could not render picture variant '{variant_path.name}' of '{source_path.name}': {e}")
+        raise HTTPException(
+            status_code=415,
+            detail={"error": "Unsupported Media Type"}
+        )
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return variant_path
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+import requests
+from config import NINJA_API_URL
+from services import http_client
+
+class TaxonomyIndex:
+    """
+    Animal info from a local taxonomy file, keyed by casefolded name.
+
+    The file holds animal records as the Ninja animals API returns them,
+    either as one JSON array or as NDJSON (one record per line). Every
+    record is parsed once when the file is loaded.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, dict] = {}  # casefolded name -> info
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.entries.get(key)
+
+    def load(self, path: str, parse: Callable[[dict], dict]) -> None:
+        """Index the records in path; the first record of a name wins"""
+        try:
+            records = read_records(Path(path))
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Could not read taxonomy file '{path}': {e}")
+
+        entries: Dict[str, dict] = {}
+        for record in records:
+            name = record.get("name") if isinstance(record, dict) else None
+            if name and name.casefold() not in entries:
+                entries[name.casefold()] = parse(record)
+        self.entries = entries
+        print(f"Loaded {len(entries)} animals from taxonomy file '{path}'")
+
+
+def read_records(path: Path) -> List[dict]:
+    """Records of a taxonomy file, JSON array or NDJSON"""
+    text = path.read_text(encoding="utf-8")
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def write_records(path: Path, records: Iterable[dict]) -> None:
+    """Write records as NDJSON, or as a JSON array when path ends in .json"""
+    records = list(records)
+    # Write to a temp file first so a running refresh never leaves a truncated file
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if path.suffix == ".json":
+            json.dump(records, f, indent=1)
+        else:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, path)
+
+def fetch_records(name: str, api_key: str) -> List[dict]:
+    """Every record the Ninja API returns for name (it matches names by substring)"""
+    response = http_client.get(
+        NINJA_API_URL,
+        headers={"X-Api-Key": api_key},
+        params={"name": name}
+    )
+    response.raise_for_status()
+    return response.json()
+
+def refresh(
+    path: Path,
+    names: Iterable[str],
+    api_key: str,
+    concurrency: int = 8
+) -> None:
+    """
+    Query the Ninja API for names plus every name already in the file, and
+    rewrite the file with what comes back. Records that fail to refresh are
+    kept as they were.
+    """
+    records: Dict[str, dict] = {}
+    if path.exists():
+        for record in read_records(path):
+            records.setdefault(record["name"].casefold(), record)
+
+    queries = {name.casefold(): name for name in names if name.strip()}
+    for key, record in records.items():
+        queries.setdefault(key, record["name"])
+
+    def fetch(name: str) -> List[dict]:
+        try:
+            return fetch_records(name, api_key)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Could not refresh '{name}': {e}", file=sys.stderr)
+            return []
+
+    refreshed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for found in pool.map(fetch, queries.values()):
+            for record in found:
+                if isinstance(record, dict) and record.get("name"):
+                    records[record["name"].casefold()] = record
+                    refreshed += 1
+
+    write_records(path, sorted(records.values(), key=lambda record: record["name"].casefold()))
+    print(f"Wrote {len(records)} animals to '{path}' ({refreshed} records fetched for {len(queries)} names)")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m services.taxonomy",
+        description="Maintain the offline taxonomy file read through NINJA_TAXONOMY_FILE"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    update = commands.add_parser("refresh", help="fetch animals from the Ninja API into the file")
+    update.add_argument("file", help="taxonomy file; NDJSON, or a JSON array if it ends in .json")
+    update.add_argument("names", nargs="*", help="animal names to add")
+    update.add_argument("--names-file", help="file with one animal name per line to add")
+    update.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("NINJA_API_KEY")
+    if not api_key:
+        print("NINJA_API_KEY environment variable is required but not set", file=sys.stderr)
+        return 1
+
+    names = list(args.names)
+    if args.names_file:
+        names += Path(args.names_file).read_text(encoding="utf-8").splitlines()
+    refresh(Path(args.file), names, api_key, args.concurrency)
+    http_client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Tuple
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+# Importing services.ninja_api requires a key; tests never reach the real API
+os.environ.setdefault("NINJA_API_KEY", "test")
+os.environ.setdefault("DATABASE_BACKEND", "memory")
+
+# The global store puts pictures/ in the working directory it is first used from
+os.chdir(tempfile.mkdtemp(prefix="petstore-tests-"))
+
+# routers.metrics registers the global store with prometheus on import
+from routers import metrics, pet_types, pets, pictures  # noqa: E402,F401
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run the test inside its own empty directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def db(workdir, monkeypatch):
+    """Fresh InMemoryDatabase behind every router"""
+    from database.memory_db import InMemoryDatabase
+
+    db = InMemoryDatabase(journal_dir=None)
+    for router in (metrics, pet_types, pets, pictures):
+        monkeypatch.setattr(router, "db", db)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from app import app
+
+    return TestClient(app)
+
+
+class ImageHost:
+    """
+    Loopback HTTP server for picture URLs. routes maps a path to a list of
+    (status, headers, body) answers given in turn; the last one repeats
+    """
+
+    def __init__(self):
+        self.routes: Dict[str, List[Tuple[int, Dict[str, str], bytes]]] = {}
+        self.hits: List[str] = []
+        host = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                host.hits.append(self.path)
+                answers = host.routes.get(self.path) or [(404, {}, b"")]
+                status, headers, body = answers.pop(0) if len(answers) > 1 else answers[0]
+                self.send_response(status)
+                for name, value in {"Content-Length": str(len(body)), **headers}.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+    def serve(self, path: str, *answers: Tuple[int, Dict[str, str], bytes]) -> str:
+        self.routes[path] = list(answers)
+        return self.url(path)
+
+
+@pytest.fixture
+def image_host():
+    host = ImageHost()
+    yield host
+    host.server.shutdown()
+    host.server.server_close()
+
+
+@pytest.fixture
+def async_http():
+    """Drop the shared async client afterwards; it belongs to the event loop that made it"""
+    from services import http_client
+
+    yield http_client
+    http_client._async_client = None
+    http_client._host_slots.clear()
@@ -0,0 +1,82 @@
+import asyncio
+import io
+from fastapi import HTTPException
+from PIL import Image
+from models.pet import Pet
+from models.pet_type import PetType
+from services.ninja_api import NinjaAPIService
+
+
+def make_pet_type(pet_type_id: str, type_name: str) -> PetType:
+    return PetType(id=pet_type_id, type=type_name, family="Canidae", genus="Canis", attributes=["Loyal"], lifespan=10)
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+async def fake_animal_info(animal_type: str) -> dict:
+    if animal_type == "Boom":
+        raise RuntimeError("Ninja is down")
+    if animal_type == "Ghost":
+        raise HTTPException(status_code=400, detail={"error": "Malformed data"})
+    # The first Dog answers last, so a race between the two would go to the second
+    await asyncio.sleep(0.05 if animal_type == "Dog" else 0)
+    return {"family": "Canidae", "genus": "Canis", "attributes": ["Loyal"], "lifespan": 10}
+
+def statuses(response) -> list:
+    return [result["status"] for result in response.json()]
+
+
+def test_pet_types_batch_reports_every_item(client, db, monkeypatch):
+    monkeypatch.setattr(NinjaAPIService, "get_animal_info_async", fake_animal_info)
+    db.add_pet_type(make_pet_type(db.generate_id(), "Bird"))
+
+    response = client.post("/pet-types/batch", json=[
+        {"type": "Dog"},
+        {"type": "dog"},  # same name as an earlier item
+        {"kind": "Cat"},
+        "Cat",
+        {"type": "Boom"},
+        {"type": "Cat"},
+        {"type": "Ghost"},
+        {"type": "bird"},  # already stored
+    ])
+    assert response.status_code == 200
+    assert statuses(response) == [201, 400, 400, 400, 500, 201, 400, 400]
+
+    results = response.json()
+    assert results[0]["body"]["type"] == "Dog"
+    assert results[1]["body"] == {"error": "Malformed data"}
+    assert results[4]["body"] == {"server_error": "Ninja is down"}
+    assert sorted(pet_type.type for pet_type in db.get_all_pet_types()) == ["Bird", "Cat", "Dog"]
+
+def test_batches_must_hold_items(client, db):
+    assert client.post("/pet-types/batch", json=[]).status_code == 400
+
+def test_pets_batch_reports_every_item(client, db, image_host, async_http):
+    pet_type_id = db.generate_id()
+    db.add_pet_type(make_pet_type(pet_type_id, "Dog"))
+    db.add_pet(pet_type_id, Pet(name="Old", birthdate="NA", picture="NA"))
+    picture = image_host.serve("/rex.png", (200, {"Content-Type": "image/png"}, png_bytes()))
+    missing = image_host.serve("/gone.png", (404, {}, b""))
+
+    response = client.post(f"/pet-types/{pet_type_id}/pets/batch", json=[
+        {"name": "Rex", "picture": picture},
+        {"name": "rex"},  # same name as an earlier item, and quicker to create
+        {"birthdate": "01-02-2020"},
+        {"name": "Max", "picture": missing},
+        {"name": "old"},  # already stored
+        {"name": "Bo", "birthdate": "01-02-2020"},
+    ])
+    assert response.status_code == 200
+    assert statuses(response) == [201, 400, 400, 400, 400, 201]
+
+    results = response.json()
+    assert results[0]["body"]["name"] == "Rex"
+    assert results[0]["body"]["picture"] != "NA"
+    assert results[5]["body"] == {"name": "Bo", "birthdate": "01-02-2020", "picture": "NA"}
+    assert [pet.name for pet in db.get_all_pets(pet_type_id)] == ["Old", "Rex", "Bo"]
+
+def test_pets_batch_needs_the_pet_type(client, db):
+    assert client.post("/pet-types/7/pets/batch", json=[{"name": "Rex"}]).status_code == 404
@@ -0,0 +1,41 @@
+import json
+import time
+from services.cache import TTLCache
+
+
+def test_set_leaves_the_file_to_the_flush(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = TTLCache(10, str(path), flush_interval=3600)
+    cache.set("dog", {"info": 1}, ttl=60)
+    assert not path.exists()
+
+    cache.flush()
+    assert list(json.loads(path.read_text())) == ["dog"]
+    modified = path.stat().st_mtime_ns
+    cache.flush()  # nothing changed since
+    assert path.stat().st_mtime_ns == modified
+    cache.close()
+
+def test_close_writes_pending_entries(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = TTLCache(2, str(path), flush_interval=3600)
+    for key in ("cat", "dog", "fox"):
+        cache.set(key, key.upper(), ttl=60)
+    cache.set("gone", "x", ttl=-1)
+    cache.close()
+
+    reloaded = TTLCache(2, str(path), flush_interval=3600)
+    assert reloaded.get("fox") == (True, "FOX")
+    assert reloaded.get("gone") == (False, None)
+    assert reloaded.get("cat") == (False, None)
+    reloaded.close()
+
+def test_background_flush(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = TTLCache(10, str(path), flush_interval=0.05)
+    cache.set("owl", [1, 2], ttl=60)
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert json.loads(path.read_text())["owl"][1] == [1, 2]
+    cache.close()
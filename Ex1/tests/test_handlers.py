@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from services.ninja_api import NinjaAPIService
+
+
+@pytest.fixture
+def loop_calls(db, monkeypatch):
+    """Names of the store methods called from a thread running an event loop"""
+    calls = []
+
+    def watch(method_name):
+        method = getattr(db, method_name)
+
+        def watched(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                calls.append(method_name)
+            except RuntimeError:
+                pass
+            return method(*args, **kwargs)
+        monkeypatch.setattr(db, method_name, watched)
+
+    for method_name in (
+        "pet_type_exists", "generate_id", "add_pet_type", "get_pet_type", "pet_exists",
+        "add_pet", "get_pet", "get_pet_url", "update_pet", "delete_picture", "delete_pet_url",
+    ):
+        watch(method_name)
+    return calls
+
+async def fake_animal_info(animal_type: str) -> dict:
+    return {"family": "Canidae", "genus": "Canis", "attributes": ["Loyal"], "lifespan": 10}
+
+def test_store_calls_stay_off_the_event_loop(client, loop_calls, monkeypatch):
+    monkeypatch.setattr(NinjaAPIService, "get_animal_info_async", fake_animal_info)
+
+    response = client.post("/pet-types", json={"type": "Dog"})
+    assert response.status_code == 201
+    assert client.post("/pet-types", json={"type": "dog"}).status_code == 400
+    pet_type_id = response.json()["id"]
+
+    assert client.post(f"/pet-types/{pet_type_id}/pets", json={"name": "Rex"}).status_code == 201
+    assert client.post(f"/pet-types/{pet_type_id}/pets", json={"name": "Rex"}).status_code == 400
+    response = client.put(f"/pet-types/{pet_type_id}/pets/Rex", json={"name": "Rex", "birthdate": "01-02-2020"})
+    assert response.json() == {"name": "Rex", "birthdate": "01-02-2020", "picture": "NA"}
+    assert client.put(f"/pet-types/{pet_type_id}/pets/Max", json={"name": "Max"}).status_code == 404
+
+    assert loop_calls == []
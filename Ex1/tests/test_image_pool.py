@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from PIL import Image
+from services.image_ops import verify_image
+from services.image_pool import get_image_pool, shutdown_image_pool
+
+
+def loaded_modules() -> list:
+    """Runs in a pool worker"""
+    return sorted(sys.modules)
+
+def test_workers_come_from_a_clean_forkserver(tmp_path):
+    import database  # noqa: F401 - the API process has the store open
+
+    path = tmp_path / "dot.png"
+    Image.new("RGB", (2, 2)).save(path)
+    pool = get_image_pool()
+    try:
+        assert pool._mp_context.get_start_method() == "forkserver"
+        verify_image(str(path), "PNG")
+        assert pool.submit(verify_image, str(path), "PNG").result(timeout=60) is None
+        modules = pool.submit(loaded_modules).result(timeout=60)
+        assert "services.image_ops" in modules
+        assert "database" not in modules and "app" not in modules
+    finally:
+        shutdown_image_pool()
+
+def test_importing_the_app_opens_no_store(tmp_path):
+    # Pool workers import the main module, which is app.py under `python app.py`
+    script = "import app, database; assert database.db._database is None"
+    subprocess.run([sys.executable, "-c", script], cwd=tmp_path, check=True, env={
+        **os.environ, "PYTHONPATH": str(Path(__file__).resolve().parent.parent), "MEMORY_DB_JOURNAL_DIR": str(tmp_path / "journal")
+    })
+    assert list(tmp_path.iterdir()) == []
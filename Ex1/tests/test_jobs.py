@@ -0,0 +1,109 @@
+import io
+import time
+import pytest
+from PIL import Image
+from models.pet_type import PetType
+from services import jobs as jobs_service
+from services.jobs import PictureJobQueue
+
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+@pytest.fixture
+def picture_jobs(monkeypatch):
+    """Job queue with quick retries behind the routers and the app's shutdown"""
+    import app
+    from routers import jobs, pets
+
+    queue = PictureJobQueue(workers=2, retries=2, retry_delay=0.01, history=100)
+    for module in (app, jobs, pets):
+        monkeypatch.setattr(module, "picture_jobs", queue)
+    return queue
+
+@pytest.fixture
+def jobs_client(client, db, picture_jobs, async_http):
+    """Client whose requests share one event loop, so jobs keep running between them"""
+    db.add_pet_type(PetType(id="1", type="Dog", family="Canidae", genus="Canis", attributes=["Loyal"], lifespan=10))
+    with client:
+        yield client
+
+def submit(client, picture: str, name: str = "Rex"):
+    response = client.post("/pet-types/1/pets", headers={"Prefer": "respond-async"}, json={"name": name, "picture": picture})
+    assert response.status_code == 202
+    return response
+
+def finished(client, location: str) -> dict:
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        job = client.get(location).json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job at {location} did not finish")
+
+
+def test_job_succeeds(jobs_client, image_host):
+    url = image_host.serve("/rex.png", (200, {"Content-Type": "image/png"}, png_bytes()))
+    response = submit(jobs_client, url)
+    assert response.headers["Location"] == f"/jobs/{response.json()['id']}"
+    assert response.headers["Preference-Applied"] == "respond-async"
+    assert response.json()["status"] == "pending"
+
+    job = finished(jobs_client, response.headers["Location"])
+    assert (job["status"], job["attempts"], job["error"]) == ("succeeded", 1, None)
+    pet = jobs_client.get("/pet-types/1/pets/Rex").json()
+    assert pet["picture"] == job["picture"] != "NA"
+    assert jobs_client.get(f"/pictures/{job['picture']}").content == png_bytes()
+
+def test_async_query_parameter_needs_no_preference_header(jobs_client, image_host):
+    url = image_host.serve("/rex.png", (200, {"Content-Type": "image/png"}, png_bytes()))
+    response = jobs_client.post("/pet-types/1/pets?async=true", json={"name": "Rex", "picture": url})
+    assert response.status_code == 202
+    assert "Preference-Applied" not in response.headers
+
+def test_permanent_failure_keeps_the_default_picture(jobs_client, image_host):
+    url = image_host.serve("/gone.png", (404, {}, b""))
+    job = finished(jobs_client, submit(jobs_client, url).headers["Location"])
+    assert (job["status"], job["attempts"]) == ("failed", 1)
+    assert job["error"] == {"error": "Malformed data"}
+    assert jobs_client.get("/pet-types/1/pets/Rex").json()["picture"] == "NA"
+    assert image_host.hits == ["/gone.png"]
+
+def test_transient_failures_are_retried(jobs_client, image_host):
+    url = image_host.serve(
+        "/flaky.png",
+        (503, {}, b""),
+        (429, {}, b""),
+        (200, {"Content-Type": "image/png"}, png_bytes())
+    )
+    job = finished(jobs_client, submit(jobs_client, url).headers["Location"])
+    assert (job["status"], job["attempts"]) == ("succeeded", 3)
+    assert image_host.hits == ["/flaky.png"] * 3
+
+def test_retries_run_out(jobs_client, image_host):
+    url = image_host.serve("/down.png", (503, {}, b""))
+    job = finished(jobs_client, submit(jobs_client, url).headers["Location"])
+    assert (job["status"], job["attempts"]) == ("failed", 3)
+    assert jobs_client.get("/pet-types/1/pets/Rex").json()["picture"] == "NA"
+
+def test_pet_deleted_while_the_job_runs(jobs_client, db, image_host, monkeypatch):
+    url = image_host.serve("/rex.png", (200, {"Content-Type": "image/png"}, png_bytes()))
+    fetch_picture = jobs_service.fetch_picture
+
+    async def fetch_then_delete(*args):
+        downloaded = await fetch_picture(*args)
+        db.delete_pet("1", "Rex")
+        return downloaded
+    monkeypatch.setattr(jobs_service, "fetch_picture", fetch_then_delete)
+
+    job = finished(jobs_client, submit(jobs_client, url).headers["Location"])
+    assert (job["status"], job["error"]) == ("failed", {"error": "Not found"})
+    assert jobs_client.get("/pet-types/1/pets/Rex").status_code == 404
+    # Neither the picture nor its temp file is left behind
+    assert list(db.pictures_dir.iterdir()) == []
+
+def test_unknown_jobs_are_not_found(jobs_client):
+    assert jobs_client.get("/jobs/nope").status_code == 404
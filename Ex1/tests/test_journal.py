@@ -0,0 +1,108 @@
+import os
+import signal
+import subprocess
+import sys
+from pathlib import Path
+from database.journal import MutationLog
+from database.memory_db import InMemoryDatabase
+from models.pet import Pet, birthdate_ordinal
+from models.pet_type import PetType
+
+APP_DIR = Path(__file__).resolve().parent.parent
+TESTS_DIR = Path(__file__).resolve().parent
+
+# Runs apply_mutations() against a journaled store, then dies without closing it
+CRASHING_WRITER = """
+import os, signal, sys
+sys.path[:0] = [{app_dir!r}, {tests_dir!r}]
+from database.memory_db import InMemoryDatabase
+from test_journal import apply_mutations
+db = InMemoryDatabase(journal_dir="journal")
+apply_mutations(db)
+os.kill(os.getpid(), signal.SIGKILL)
+"""
+
+
+def apply_mutations(db: InMemoryDatabase) -> None:
+    """Every kind of logged write, enough of them to cross a snapshot at JOURNAL_SNAPSHOT_EVERY=40"""
+    for n in range(4):
+        db.add_pet_type(PetType(
+            id=db.generate_id(), type=f"Type{n}", family="Canidae", genus="Canis", attributes=["Loyal"], lifespan=10
+        ))
+    for i in range(60):
+        db.add_pet(str(1 + i % 4), Pet(name=f"Pet{i}", birthdate=f"{1 + i % 28:02d}-01-2020", picture="NA"))
+
+    # After the last snapshot
+    db.add_pet_type(PetType(
+        id=db.generate_id(), type="Late", family="Felidae", genus="Felis", attributes=["Calm"], lifespan=None
+    ))
+    db.add_pet("5", Pet(name="Kitty", birthdate="NA", picture="NA"))
+    db.update_pet("1", "pet0", Pet(name="Renamed", birthdate="02-02-2019", picture="renamed-type0.jpg"))
+    db.save_pet_url("Type0", "Renamed", "http://pictures/renamed.jpg", "renamed-type0.jpg")
+    db.save_pet_url("Type1", "Pet1", "http://pictures/shared.jpg", "pet1-type1.jpg")
+    db.save_pet_url("Type2", "Pet2", "http://pictures/shared.jpg", "pet2-type2.jpg")
+    db.delete_pet_url("Type1", "Pet1")
+    db.delete_pet("2", "PET5")
+    db.update_pet("3", "pet2", Pet(name="Pet6", birthdate="NA", picture="NA"))  # replaces Pet6 of type 3
+    db.delete_pet_type("4")
+    db.generate_id()  # handed out, never stored
+
+
+def store_state(db: InMemoryDatabase) -> dict:
+    pet_types = db.get_all_pet_types()
+    return {
+        "pet_types": [pet_type.model_dump() for pet_type in pet_types],
+        "pets": {
+            pet_type.id: [pet.model_dump() for pet in db.get_all_pets(pet_type.id)]
+            for pet_type in pet_types
+        },
+        "born_2020": {
+            pet_type.id: [pet.name for pet in db.get_pets_by_birthdate(pet_type.id, after=birthdate_ordinal("31-12-2019"))]
+            for pet_type in pet_types
+        },
+        "pet_urls": dict(db.pet_urls),
+        "url_index": dict(db.url_index),
+    }
+
+
+def crash_writer(directory: Path) -> None:
+    env = {
+        **os.environ,
+        "JOURNAL_SNAPSHOT_EVERY": "40",
+        "MEMORY_DB_JOURNAL_DIR": "",
+    }
+    script = CRASHING_WRITER.format(app_dir=str(APP_DIR), tests_dir=str(TESTS_DIR))
+    result = subprocess.run([sys.executable, "-c", script], cwd=directory, env=env, timeout=60)
+    assert result.returncode == -signal.SIGKILL
+
+
+def test_replay_after_crash(workdir):
+    crash_writer(workdir)
+    journal_dir = workdir / "journal"
+    assert (journal_dir / MutationLog.SNAPSHOT_FILE).exists()
+    assert (journal_dir / MutationLog.LOG_FILE).stat().st_size > 0
+
+    # A record torn in half by the crash
+    with open(journal_dir / MutationLog.LOG_FILE, "a") as f:
+        f.write('["add_pet","1","Tor')
+
+    expected = InMemoryDatabase(journal_dir=None)
+    apply_mutations(expected)
+
+    restored = InMemoryDatabase(journal_dir=str(journal_dir))
+    assert store_state(restored) == store_state(expected)
+    assert restored.get_pet_type("1").pets[0] == "Renamed"
+    assert restored.get_pet("3", "pet6").birthdate == "NA"
+    assert not restored.pet_exists("3", "Pet2")
+    assert restored.get_pet_type("4") is None
+
+    # The unstored id is handed out again, the deleted one never is
+    assert restored.generate_id() == "6"
+    restored.close()
+
+    # The replayed tail was compacted into a new snapshot
+    assert (journal_dir / MutationLog.LOG_FILE).stat().st_size == 0
+    reopened = InMemoryDatabase(journal_dir=str(journal_dir))
+    assert store_state(reopened) == store_state(expected)
+    assert reopened.generate_id() == "6"
+    reopened.close()
@@ -0,0 +1,163 @@
+import threading
+import time
+import pytest
+from database.memory_db import InMemoryDatabase
+from models.pet import Pet, birthdate_ordinal
+from models.pet_type import PetType
+
+
+def make_pet_type(pet_type_id: str, type_name: str = "Dog") -> PetType:
+    return PetType(id=pet_type_id, type=type_name, family="Canidae", genus="Canis", attributes=["Loyal"], lifespan=10)
+
+def make_pet(name: str, birthdate: str = "NA") -> Pet:
+    return Pet(name=name, birthdate=birthdate, picture="NA")
+
+def names(pets) -> list:
+    return [pet.name for pet in pets]
+
+
+@pytest.fixture
+def db(workdir):
+    db = InMemoryDatabase(journal_dir=None)
+    db.add_pet_type(make_pet_type("1"))
+    yield db
+    db.close()
+
+
+def test_delete_keeps_insertion_order(db):
+    for name in ["A", "B", "C", "D", "Pic", "Pic2"]:
+        db.add_pet("1", make_pet(name))
+
+    assert db.delete_pet("1", "a")
+
+    assert db.get_pet_type("1").pets == ["B", "C", "D", "Pic", "Pic2"]
+    assert names(db.get_all_pets("1")) == ["B", "C", "D", "Pic", "Pic2"]
+
+def test_rename_keeps_position_and_replaces_clashing_pet(db):
+    for name in ["A", "B", "C"]:
+        db.add_pet("1", make_pet(name))
+    seq = db.get_pet_seq("1", "A")
+
+    assert db.update_pet("1", "a", make_pet("Alpha"))
+    assert names(db.get_all_pets("1")) == ["Alpha", "B", "C"]
+    assert db.get_pet_seq("1", "Alpha") == seq
+
+    assert db.update_pet("1", "alpha", make_pet("C"))
+    assert db.get_pet_type("1").pets == ["C", "B"]
+    assert db.get_pet("1", "c").name == "C"
+
+def test_readers_keep_their_snapshot(db):
+    db.add_pet("1", make_pet("A", "01-01-2020"))
+    pet_type = db.get_pet_type("1")
+    pets = db.get_all_pets("1")
+
+    db.add_pet("1", make_pet("B", "01-01-2021"))
+    db.update_pet("1", "A", make_pet("A", "NA"))
+
+    assert pet_type.pets == ["A"]
+    assert names(pets) == ["A"]
+    assert db.get_pet_type("1").pets == ["A", "B"]
+    assert db.get_all_pet_types()[0].pets == ["A", "B"]
+    assert names(db.get_pets_by_birthdate("1", after=birthdate_ordinal("01-01-2000"))) == ["B"]
+
+def test_birthdate_range_excludes_bounds(db):
+    for day in range(1, 6):
+        db.add_pet("1", make_pet(f"Pet{day}", f"0{day}-01-2020"))
+    db.add_pet("1", make_pet("Unknown"))
+
+    pets = db.get_pets_by_birthdate("1", after=birthdate_ordinal("01-01-2020"), before=birthdate_ordinal("05-01-2020"))
+    assert names(pets) == ["Pet2", "Pet3", "Pet4"]
+
+def test_type_name_is_added_once(db):
+    barrier = threading.Barrier(8)
+    results = []
+
+    def add(n):
+        barrier.wait()
+        results.append(db.add_pet_type(make_pet_type(str(10 + n), "Cat" if n % 2 else "CAT")))
+
+    threads = [threading.Thread(target=add, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 7 + [True]
+    assert len(db.find_pet_types(type="cat")) == 1
+    assert not db.add_pet_type(make_pet_type("2", "dog"))
+
+def test_concurrent_writers_and_readers(db):
+    errors = []
+
+    def write(worker: int) -> None:
+        for i in range(500):
+            name = f"W{worker}-{i}"
+            db.add_pet("1", make_pet(name, "01-01-2020"))
+            if i % 3 == 0:
+                db.delete_pet("1", name)
+
+    def read() -> None:
+        for _ in range(500):
+            pet_type = db.get_pet_type("1")
+            if len(pet_type.pets) != len(set(pet_type.pets)):
+                errors.append(pet_type.pets)
+            db.get_pets_by_birthdate("1", after=0)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    threads += [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    expected = [f"W{worker}-{i}" for i in range(500) if i % 3 for worker in range(4)]
+    assert sorted(db.get_pet_type("1").pets) == sorted(expected)
+    assert sorted(names(db.get_all_pets("1"))) == sorted(expected)
+    assert len(db.get_pets_by_birthdate("1", after=0)) == len(expected)
+
+
+def _time_adds(db: InMemoryDatabase, pet_type_id: str, prefix: str, count: int, lookup=None) -> float:
+    pets = [make_pet(f"{prefix}-{i}", "01-01-2020") for i in range(count)]
+    started = time.perf_counter()
+    for pet in pets:
+        if lookup is not None:
+            lookup(pet_type_id)
+        db.add_pet(pet_type_id, pet)
+    return time.perf_counter() - started
+
+def test_writes_do_not_slow_down_with_type_size(db):
+    # Copying a type's pets on every write makes adds to a large type tens of times slower
+    db.add_pet_type(make_pet_type("2", "Cat"))
+    _time_adds(db, "1", "small", 1000)
+    _time_adds(db, "2", "large", 40000)
+
+    small = min(_time_adds(db, "1", f"small{round}", 1000) for round in range(3))
+    large = min(_time_adds(db, "2", f"large{round}", 1000) for round in range(3))
+
+    assert large < small * 4
+
+def test_lookups_between_writes_do_not_slow_down_with_type_size(db):
+    # What the pet routers read around a write: the type name, and a birthdate search with no matches
+    def lookup(pet_type_id):
+        assert db.get_pet_type_name(pet_type_id) is not None
+        assert db.get_pets_by_birthdate(pet_type_id, after=0, before=1) == []
+
+    db.add_pet_type(make_pet_type("2", "Cat"))
+    _time_adds(db, "1", "small", 1000)
+    _time_adds(db, "2", "large", 40000)
+
+    small = min(_time_adds(db, "1", f"small{round}", 1000, lookup) for round in range(3))
+    large = min(_time_adds(db, "2", f"large{round}", 1000, lookup) for round in range(3))
+
+    assert large < small * 4
+
+
+def test_get_pet_type_name_skips_the_pets(db):
+    assert db.get_pet_type_name("1") == "Dog"
+    assert db.get_pet_type_name("2") is None
+
+    db.add_pet("1", make_pet("A"))
+    assert db.get_pet_type_name("1") == "Dog"
+    assert "1" in db.stale_pet_types
+    assert db.get_pet_type("1").pets == ["A"]
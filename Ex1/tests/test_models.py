@@ -0,0 +1,17 @@
+from models.pet import Pet
+
+
+def test_equality_ignores_the_json_cache():
+    encoded = Pet(name="Rex", birthdate="NA", picture="NA")
+    encoded.json_bytes()
+    reassigned = Pet(name="Rex", birthdate="01-01-2020", picture="NA")
+    reassigned.birthdate = "NA"
+
+    assert encoded == Pet(name="Rex", birthdate="NA", picture="NA") == reassigned
+    assert encoded != Pet(name="Rex", birthdate="NA", picture="rex-dog.png")
+
+def test_json_bytes_follows_assignments():
+    pet = Pet(name="Rex", birthdate="NA", picture="NA")
+    assert pet.json_bytes() == pet.model_dump_json().encode()
+    pet.picture = "rex-dog.png"
+    assert pet.json_bytes() == b'{"name":"Rex","birthdate":"NA","picture":"rex-dog.png"}'
@@ -0,0 +1,97 @@
+import json
+import pytest
+from fastapi import HTTPException
+from models.pet import Pet
+from models.pet_type import PetType
+from routers.pagination import NDJSON_MEDIA_TYPE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate
+
+
+@pytest.fixture
+def store(db):
+    for n in range(5):
+        db.add_pet_type(PetType(
+            id=db.generate_id(), type=f"Type{n}", family="Canidae" if n % 2 else "Felidae",
+            genus="Genus", attributes=["Calm"], lifespan=10
+        ))
+    for i in range(7):
+        db.add_pet("1", Pet(name=f"Pet{i}", birthdate=f"0{1 + i}-01-2020", picture="NA"))
+    return db
+
+def collect_pages(client, url: str, limit: int) -> list:
+    """Follow X-Next-Cursor from the first page to the last"""
+    items, cursor = [], None
+    separator = "&" if "?" in url else "?"
+    while True:
+        page_url = f"{url}{separator}limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(page_url)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= limit
+        items += page
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return items
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(1)[:-2] + "xx", "cGFnZTox"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+def test_paginate_continues_after_cursor_item_is_gone():
+    items = [10, 20, 30, 40]
+    page, cursor = paginate(items, lambda seq: seq, 2, None)
+    assert page == [10, 20]
+    # 20 was deleted and 25 added after the first page was served
+    page, cursor = paginate([10, 25, 30, 40], lambda seq: seq, 2, cursor)
+    assert (page, cursor) == ([25, 30], encode_cursor(30))
+    assert paginate([10, 25, 30, 40], lambda seq: seq, 2, cursor) == ([40], None)
+
+
+def test_pet_type_pages_cover_the_listing(client, store):
+    full = client.get("/pet-types").json()
+    assert len(full) == 5
+    assert NEXT_CURSOR_HEADER not in client.get("/pet-types").headers
+    assert collect_pages(client, "/pet-types", 2) == full
+    assert collect_pages(client, "/pet-types?family=canidae", 1) == client.get("/pet-types?family=canidae").json()
+
+def test_pet_pages_survive_deletes(client, store):
+    first = client.get("/pet-types/1/pets?limit=3")
+    assert [pet["name"] for pet in first.json()] == ["Pet0", "Pet1", "Pet2"]
+
+    # Delete the pet the cursor points at
+    assert client.delete("/pet-types/1/pets/Pet2").status_code == 204
+    second = client.get(f"/pet-types/1/pets?limit=3&cursor={first.headers[NEXT_CURSOR_HEADER]}")
+    assert [pet["name"] for pet in second.json()] == ["Pet3", "Pet4", "Pet5"]
+
+def test_filtered_pets_are_paged(client, store):
+    url = "/pet-types/1/pets?birthdateGT=01-01-2020&birthdateLT=07-01-2020"
+    assert [pet["name"] for pet in collect_pages(client, url, 2)] == ["Pet1", "Pet2", "Pet3", "Pet4", "Pet5"]
+
+def test_limit_must_be_positive(client, store):
+    assert client.get("/pet-types?limit=0").status_code == 422
+
+
+def test_streamed_array_matches_plain_response(client, store):
+    plain = client.get("/pet-types/1/pets")
+    streamed = client.get("/pet-types/1/pets?stream=true")
+    assert streamed.headers["content-type"] == "application/json"
+    assert streamed.json() == plain.json()
+
+    assert client.get("/pet-types?stream=true&limit=2").json() == client.get("/pet-types?limit=2").json()
+
+def test_ndjson_sends_one_item_per_line(client, store):
+    response = client.get("/pet-types/1/pets?limit=4", headers={"Accept": NDJSON_MEDIA_TYPE})
+    assert response.headers["content-type"] == NDJSON_MEDIA_TYPE
+    assert NEXT_CURSOR_HEADER in response.headers
+    lines = response.text.splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["Pet0", "Pet1", "Pet2", "Pet3"]
+    assert response.text.endswith("\n")
+
+def test_empty_collections_stream(client, store):
+    assert client.get("/pet-types/2/pets?stream=true").json() == []
+    assert client.get("/pet-types/2/pets", headers={"Accept": NDJSON_MEDIA_TYPE}).text == ""
@@ -0,0 +1,113 @@
+import asyncio
+import io
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from services.image_ops import render_variant, verify_image
+from services.picture import TransientDownloadError, _TempDownload
+
+
+def jpeg_bytes(image_format: str = "JPEG") -> bytes:
+    buffer = io.BytesIO()
+    extra = {"save_all": True, "append_images": [Image.new("RGB", (8, 8), "blue")]} if image_format == "MPO" else {}
+    Image.new("RGB", (8, 8), "red").save(buffer, image_format, **extra)
+    return buffer.getvalue()
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+def download(tmp_path, filename: str, *chunks: bytes):
+    with _TempDownload(tmp_path, filename) as temp:
+        for chunk in chunks:
+            temp.write(chunk)
+        temp.finish()
+        return temp.path
+
+
+def test_data_after_the_image_is_kept(tmp_path):
+    # Motion photos append a clip after the JPEG end marker
+    data = jpeg_bytes() + b"ftypmp42" + bytes(1000)
+    path = download(tmp_path, "rex-dog.jpg", data[:2], data[2:100], data[100:])
+    assert path.read_bytes() == data
+    verify_image(str(path), "JPEG")
+
+@pytest.mark.parametrize("filename, data", [
+    ("rex-dog.jpg", jpeg_bytes()[:-2]),
+    ("rex-dog.jpg", jpeg_bytes()[:len(jpeg_bytes()) // 2]),
+    ("rex-dog.jpg", jpeg_bytes() + bytes(100 * 1024)),  # the end marker is too far back
+    ("rex-dog.png", png_bytes()[:-1]),
+])
+def test_truncated_downloads_are_rejected(tmp_path, filename, data):
+    with pytest.raises(HTTPException) as error:
+        download(tmp_path, filename, data[:100], data[100:])
+    assert error.value.status_code == 400
+    assert list(tmp_path.iterdir()) == []
+
+def test_multi_picture_jpegs_are_complete(tmp_path):
+    data = jpeg_bytes("MPO")
+    path = download(tmp_path, "rex-dog.jpg", data)
+    assert path.read_bytes() == data
+
+def test_downloads_shorter_than_the_header_are_rejected(tmp_path):
+    with pytest.raises(HTTPException) as error:
+        download(tmp_path, "rex-dog.png", b"\x89PN")
+    assert error.value.status_code == 400
+    assert list(tmp_path.iterdir()) == []
+
+def test_mislabeled_content_is_rejected_with_its_first_chunk(tmp_path):
+    with pytest.raises(HTTPException) as error:
+        download(tmp_path, "rex-dog.png", jpeg_bytes())
+    assert error.value.status_code == 415
+
+def test_multi_picture_jpegs_are_jpegs(tmp_path):
+    path = tmp_path / "rex-dog.jpg"
+    path.write_bytes(jpeg_bytes("MPO"))
+    verify_image(str(path), "JPEG")
+    with pytest.raises(ValueError):
+        verify_image(str(path), "PNG")
+
+    thumb = tmp_path / "thumb"
+    render_variant(str(path), str(thumb), 4, 4)
+    with Image.open(thumb) as image:
+        assert (image.format, image.size) == ("JPEG", (4, 4))
+
+
+def fetch(url: str, dest_dir):
+    from services import http_client
+    from services.picture import ImageService
+
+    async def run():
+        try:
+            return await ImageService.download_image_async(url, "Rex", "Dog", dest_dir)
+        finally:
+            await http_client.aclose()
+    return asyncio.run(run())
+
+def test_downloads_follow_redirects(tmp_path, image_host, async_http):
+    data = jpeg_bytes()
+    image_host.serve("/final.jpg", (200, {"Content-Type": "image/jpeg"}, data))
+    url = image_host.serve("/moved", (302, {"Location": image_host.url("/final.jpg")}, b""))
+
+    filename, path = fetch(url, tmp_path)
+    assert filename == "rex-dog.jpg"
+    assert path.read_bytes() == data
+    assert image_host.hits == ["/moved", "/final.jpg"]
+    assert async_http._host_slots == {}
+
+def test_checks_apply_to_the_redirect_target(tmp_path, image_host, async_http):
+    image_host.serve("/gone.jpg", (404, {}, b""))
+    image_host.serve("/label.png", (200, {"Content-Type": "image/png"}, jpeg_bytes()))
+    for target, status in [("/gone.jpg", 400), ("/label.png", 415)]:
+        url = image_host.serve(f"/to{target}", (301, {"Location": image_host.url(target)}, b""))
+        with pytest.raises(HTTPException) as error:
+            fetch(url, tmp_path)
+        assert error.value.status_code == status
+
+def test_redirect_loops_are_malformed(tmp_path, image_host, async_http):
+    url = image_host.serve("/loop", (302, {"Location": "/loop"}, b""))
+    with pytest.raises(HTTPException) as error:
+        fetch(url, tmp_path)
+    assert error.value.status_code == 400
+    assert not isinstance(error.value, TransientDownloadError)
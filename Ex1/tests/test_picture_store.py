@@ -0,0 +1,97 @@
+import os
+import time
+from pathlib import Path
+import pytest
+from database import picture_store
+from database.picture_store import PictureStore
+
+
+def counts(store: PictureStore) -> tuple:
+    stats = store.stats()
+    return stats["picture_files"], stats["picture_bytes"]
+
+def recount(store: PictureStore) -> tuple:
+    return counts(PictureStore(store.pictures_dir, content_addressed=store.content_addressed))
+
+
+def test_counters_follow_saves_and_deletes(tmp_path, monkeypatch):
+    store = PictureStore(tmp_path / "pictures")
+    store.save("a.png", b"x" * 100)
+    store.save("b.png", b"x" * 10)
+    assert counts(store) == recount(store) == (2, 110)
+
+    monkeypatch.setattr(picture_store.os, "scandir", lambda path: pytest.fail("stats() scanned the directory"))
+    store.save("a.png", b"x" * 40)
+    assert counts(store) == (2, 50)
+
+    # A hard-linked copy takes no extra space
+    store.save_file("c.png", store.stage_copy("a.png"))
+    assert counts(store) == (3, 50)
+    assert store.delete("a.png")
+    assert counts(store) == (2, 50)
+    assert not store.delete("a.png")
+    assert store.delete("c.png")
+    assert counts(store) == (1, 10)
+
+    monkeypatch.undo()
+    assert recount(store) == (1, 10)
+
+def test_shared_blobs_are_counted_once(tmp_path):
+    store = PictureStore(tmp_path / "pictures", content_addressed=True)
+    store.save("a.png", b"same")
+    store.save("b.png", b"same")
+    store.save("c.png", b"other!")
+    assert counts(store) == recount(store) == (3, 10)
+
+    store.save("b.png", b"other!")
+    assert counts(store) == (3, 10)
+    store.delete("c.png")
+    store.delete("b.png")
+    assert counts(store) == recount(store) == (1, 4)
+
+def test_shared_stores_recount_writes_of_other_processes(tmp_path, monkeypatch):
+    store = PictureStore(tmp_path / "pictures", shared=True)
+    store.save("a.png", b"x" * 5)
+    (store.pictures_dir / "b.png").write_bytes(b"x" * 7)  # written by another process
+    assert counts(store) == (1, 5)
+
+    monkeypatch.setattr(picture_store, "PICTURE_STATS_RESCAN_INTERVAL", 0)
+    assert counts(store) == (2, 12)
+
+def blobs(store: PictureStore) -> list:
+    return sorted(path.name for path in store.blobs_dir.glob("*/*"))
+
+def test_identical_pictures_share_a_blob(tmp_path):
+    store = PictureStore(tmp_path / "pictures", content_addressed=True)
+    for name in ("rex-dog.png", "max-dog.png"):
+        upload = store.pictures_dir / f".upload-{name}"
+        upload.write_bytes(b"same picture")
+        store.save_file(name, upload)
+    assert len(blobs(store)) == 1
+    assert os.path.realpath(store.get_path("rex-dog.png")) == os.path.realpath(store.get_path("max-dog.png"))
+
+    # The blob stays until its last name is gone
+    assert store.delete("rex-dog.png")
+    assert store.get("max-dog.png") == b"same picture"
+    assert len(blobs(store)) == 1
+    assert store.delete("max-dog.png")
+    assert blobs(store) == []
+
+def test_startup_sweeps_only_old_unreferenced_blobs(tmp_path):
+    store = PictureStore(tmp_path / "pictures", content_addressed=True)
+    store.save("rex-dog.png", b"kept")
+    store.save("max-dog.png", b"orphaned")
+    store.save("bo-dog.png", b"mid-save")
+    kept, orphaned, mid_save = (
+        Path(os.readlink(store.pictures_dir / name)).name for name in ("rex-dog.png", "max-dog.png", "bo-dog.png")
+    )
+    # Names removed behind the store's back: an old orphan, and a blob another process has not linked yet
+    (store.pictures_dir / "max-dog.png").unlink()
+    (store.pictures_dir / "bo-dog.png").unlink()
+    old = time.time() - picture_store.BLOB_SWEEP_MIN_AGE - 60
+    os.utime(store._blob_path(orphaned), (old, old))
+
+    restarted = PictureStore(store.pictures_dir, content_addressed=True)
+    assert blobs(restarted) == sorted([kept, mid_save])
+    assert restarted.blob_refs.counts == {kept: 1}
+    assert restarted.get("rex-dog.png") == b"kept"
@@ -0,0 +1,184 @@
+import io
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from services import picture_variants
+from services.image_pool import shutdown_image_pool
+from services.picture_variants import TRANSCODE_FORMATS, TranscodeFormat, negotiate_format, requested_size
+
+AVIF = TranscodeFormat("image/avif", "AVIF", ".avif")
+WEBP = TranscodeFormat("image/webp", "WEBP", ".webp")
+
+
+def png_bytes(width: int = 32, height: int = 32) -> bytes:
+    buffer = io.BytesIO()
+    Image.effect_noise((width, height), 64).convert("RGB").save(buffer, "PNG")
+    return buffer.getvalue()
+
+@pytest.fixture(params=["cache", "disk"])
+def picture(request, db, monkeypatch):
+    """A stored picture, served from the picture cache or read from disk"""
+    data = png_bytes()
+    db.save_picture("rex-dog.png", data)
+    if request.param == "disk":
+        monkeypatch.setattr(db, "get_cached_picture", lambda file_name: None)
+    return data
+
+def get(client, **headers):
+    return client.get("/pictures/rex-dog.png", headers=headers)
+
+
+def test_whole_picture(client, picture):
+    response = get(client)
+    assert response.status_code == 200
+    assert response.content == picture
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["ETag"]
+
+@pytest.mark.parametrize("spec, start, end", [
+    ("bytes=0-9", 0, 9),
+    ("bytes=10-", 10, None),  # open-ended
+    ("bytes=-10", -10, None),  # suffix
+    ("bytes=-100000", 0, None),  # suffix longer than the picture
+    ("bytes=5-100000", 5, None),  # end past the picture
+])
+def test_ranges(client, picture, spec, start, end):
+    response = get(client, Range=spec)
+    expected = picture[start:end + 1 if end is not None else None]
+    first = start % len(picture)
+    assert response.status_code == 206
+    assert response.content == expected
+    assert response.headers["Content-Range"] == f"bytes {first}-{first + len(expected) - 1}/{len(picture)}"
+    assert response.headers["Content-Length"] == str(len(expected))
+
+@pytest.mark.parametrize("spec", ["bytes={size}-", "bytes={size}-{end}", "bytes=-0"])
+def test_unsatisfiable_ranges(client, picture, spec):
+    size = len(picture)
+    response = get(client, Range=spec.format(size=size, end=size + 10))
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{size}"
+
+@pytest.mark.parametrize("spec", [
+    "bytes=500-100",  # last before first
+    "bytes=abc-",
+    "bytes=5--1",
+    "items=0-9",
+    "bytes=0-1,5-6",  # several ranges are answered with the whole picture
+])
+def test_ranges_that_are_ignored(client, picture, spec):
+    response = get(client, Range=spec)
+    assert response.status_code == 200
+    assert response.content == picture
+
+def test_if_range(client, picture):
+    etag = get(client).headers["ETag"]
+    assert get(client, Range="bytes=0-9", **{"If-Range": etag}).status_code == 206
+
+    # A stale validator gets the current picture in full
+    response = get(client, Range="bytes=0-9", **{"If-Range": '"0-0"'})
+    assert response.status_code == 200
+    assert response.content == picture
+
+def test_if_none_match(client, picture):
+    etag = get(client).headers["ETag"]
+    for if_none_match in (etag, f"W/{etag}", f'"0-0", {etag}', "*"):
+        response = get(client, **{"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    assert get(client, **{"If-None-Match": '"0-0"'}).status_code == 200
+    # Without a matching validator a Range is served as usual
+    assert get(client, Range="bytes=0-9", **{"If-None-Match": '"0-0"'}).status_code == 206
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, None),
+    ("image/webp", WEBP),
+    ("image/avif,image/webp", AVIF),  # the first of equally wanted formats
+    ("image/avif;q=0.5,image/webp", WEBP),
+    ("image/avif;q=0, image/webp", WEBP),  # q=0 rules a format out
+    ("image/avif;q=0,image/webp;q=0,image/*", None),
+    ("image/*", None),  # wildcards keep the stored format
+    ("*/*", None),
+    ("image/webp;q=0.5,image/png", None),  # the stored format is wanted more
+    ("image/webp;q=0.8,image/*;q=0.5", WEBP),
+    ("image/webp,image/png;q=1", WEBP),  # ties go to the smaller transcoded format
+    ("image/webp;q=abc", None),
+    ("IMAGE/WEBP", WEBP),
+])
+def test_negotiate_format(monkeypatch, accept, expected):
+    monkeypatch.setattr(picture_variants, "TRANSCODE_FORMATS", [AVIF, WEBP])
+    assert negotiate_format(accept, "image/png") == expected
+
+def test_negotiate_format_without_transcoding(monkeypatch):
+    monkeypatch.setattr(picture_variants, "TRANSCODE_FORMATS", [])
+    assert negotiate_format("image/webp", "image/png") is None
+
+def test_requested_size():
+    assert requested_size(None, None, None) is None
+    assert requested_size(100, None, None) == (100, None)
+    assert requested_size(None, 50, None) == (None, 50)
+    assert requested_size(None, None, "thumb") == (200, 200)
+    for width, size in [(None, "huge"), (100, "thumb")]:
+        with pytest.raises(HTTPException) as error:
+            requested_size(width, None, size)
+        assert error.value.status_code == 400
+
+
+@pytest.fixture
+def image_pool():
+    yield
+    shutdown_image_pool()
+
+def decoded(response) -> tuple:
+    with Image.open(io.BytesIO(response.content)) as image:
+        return image.format, image.size
+
+needs_transcoding = pytest.mark.skipif(
+    WEBP not in TRANSCODE_FORMATS, reason="this Pillow cannot write WebP"
+)
+
+@needs_transcoding
+def test_accepted_formats_are_served(client, picture, image_pool):
+    original = get(client)
+    assert original.headers["Vary"] == "Accept"
+
+    response = get(client, Accept="image/webp,image/*;q=0.8")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/webp"
+    assert response.headers["Vary"] == "Accept"
+    assert response.headers["ETag"] != original.headers["ETag"]
+    assert decoded(response) == ("WEBP", (32, 32))
+
+    # Validators and ranges apply to the transcoded picture
+    etag = response.headers["ETag"]
+    response = get(client, Accept="image/webp", **{"If-None-Match": etag})
+    assert (response.status_code, response.headers["Vary"]) == (304, "Accept")
+    assert get(client, Accept="image/webp", Range="bytes=0-3").content == b"RIFF"
+
+@needs_transcoding
+@pytest.mark.parametrize("accept", ["image/webp;q=0", "image/*", "image/png,image/webp;q=0.5"])
+def test_stored_format_is_kept(client, picture, accept):
+    response = get(client, Accept=accept)
+    assert response.headers["Content-Type"] == "image/png"
+    assert response.content == picture
+
+@pytest.mark.parametrize("query, size", [
+    ("w=8", (8, 8)),
+    ("h=16", (16, 16)),
+    ("w=8&h=4", (4, 4)),
+    ("w=1000", (32, 32)),  # never enlarged
+    ("size=thumb", (32, 32)),
+])
+def test_resized_pictures(client, picture, image_pool, query, size):
+    response = client.get(f"/pictures/rex-dog.png?{query}")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/png"
+    assert decoded(response) == ("PNG", size)
+
+@pytest.mark.parametrize("query", ["size=huge", "size=thumb&w=8"])
+def test_bad_sizes(client, picture, query):
+    response = client.get(f"/pictures/rex-dog.png?{query}")
+    assert response.status_code == 400
+    assert response.json() == {"detail": {"error": "Malformed data"}}
@@ -0,0 +1,81 @@
+import threading
+import fakeredis
+import pytest
+from database import redis_db
+from database.redis_db import RedisDatabase
+from models.pet import Pet
+from models.pet_type import PetType
+
+
+def make_pet_type(pet_type_id: str, type_name: str = "Dog", family: str = "Canidae") -> PetType:
+    return PetType(id=pet_type_id, type=type_name, family=family, genus="Canis", attributes=["Loyal"], lifespan=10)
+
+def make_pet(name: str, birthdate: str = "NA") -> Pet:
+    return Pet(name=name, birthdate=birthdate, picture="NA")
+
+
+@pytest.fixture
+def db(workdir, monkeypatch):
+    """RedisDatabase talking to an in-process fakeredis server"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis_db.redis.Redis, "from_url",
+        lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs)
+    )
+    db = RedisDatabase("redis://fake", prefix="test:")
+    yield db
+    db.close()
+
+
+def test_pet_types_and_pets(db):
+    assert db.add_pet_type(make_pet_type("1"))
+    assert db.add_pet_type(make_pet_type("2", "Cat", "Felidae"))
+    assert [pet_type.id for pet_type in db.find_pet_types(family="felidae")] == ["2"]
+
+    for name, birthdate in [("Rex", "01-01-2020"), ("Max", "NA"), ("Bo", "01-01-2021")]:
+        assert db.add_pet("1", make_pet(name, birthdate))
+    assert not db.add_pet("1", make_pet("rex"))
+    assert db.get_pet_type("1").pets == ["Rex", "Max", "Bo"]
+    assert [pet.name for pet in db.get_pets_by_birthdate("1", after=0)] == ["Rex", "Bo"]
+
+    assert db.delete_pet("1", "Rex")
+    assert db.get_pet_seq("1", "Rex") is None
+    assert db.delete_pet_type("2")
+    assert db.get_pet_type_seq("2") is None
+    assert db.get_stats()["pets"] == 2
+
+def test_type_names_are_unique(db):
+    assert db.add_pet_type(make_pet_type("1", "Dog"))
+    assert not db.add_pet_type(make_pet_type("2", "DOG"))
+    assert db.get_pet_type("2") is None
+    assert db.get_pet_type_seq("2") is None
+
+    # Storing a pet type again is fine, moving it onto another pet type's name is not
+    assert db.add_pet_type(make_pet_type("1", "dog"))
+    assert db.add_pet_type(make_pet_type("2", "Cat"))
+    assert not db.add_pet_type(make_pet_type("2", "Dog"))
+    assert db.get_pet_type("2").type == "Cat"
+    assert db.get_pet_type_name("2") == "Cat"
+    assert db.get_pet_type_name("3") is None
+
+    # The name is free again once its pet type is gone
+    assert db.delete_pet_type("1")
+    assert db.add_pet_type(make_pet_type("3", "Dog"))
+
+def test_concurrent_adds_of_one_name(db):
+    barrier = threading.Barrier(8)
+    results = []
+
+    def add(n):
+        barrier.wait()
+        results.append(db.add_pet_type(make_pet_type(str(n), "Cat" if n % 2 else "cAT")))
+
+    threads = [threading.Thread(target=add, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 7 + [True]
+    assert len(db.find_pet_types(type="Cat")) == 1
+    assert len(db.get_all_pet_types()) == 1
@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+import pytest
+from database.sqlite_db import SQLiteDatabase
+from models.pet import Pet
+from models.pet_type import PetType
+from routers import pet_types, pets
+from routers.pagination import NEXT_CURSOR_HEADER
+
+
+def make_pet_type(pet_type_id: str, type_name: str) -> PetType:
+    return PetType(id=pet_type_id, type=type_name, family="Canidae", genus="Canis", attributes=["Loyal"], lifespan=10)
+
+@pytest.fixture
+def db(workdir):
+    db = SQLiteDatabase(str(workdir / "petstore.db"))
+    yield db
+    db.close()
+
+def test_type_names_are_unique(db):
+    assert db.add_pet_type(make_pet_type("1", "Dog"))
+    assert not db.add_pet_type(make_pet_type("2", "DOG"))
+    assert db.get_pet_type("2") is None
+    assert [pet_type.type for pet_type in db.get_all_pet_types()] == ["Dog"]
+
+    # Storing a pet type again keeps working, renaming it onto another name does not
+    assert db.add_pet_type(make_pet_type("2", "Cat"))
+    assert db.add_pet_type(make_pet_type("1", "dog"))
+    assert not db.add_pet_type(make_pet_type("1", "cat"))
+    assert db.get_pet_type("1").type == "dog"
+    assert db.get_pet_type_name("1") == "dog"
+    assert db.get_pet_type_name("3") is None
+
+def test_old_files_get_the_unique_index(workdir):
+    path = workdir / "old.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE pet_types (seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, "
+                     "type TEXT NOT NULL, type_key TEXT NOT NULL, family TEXT NOT NULL, family_key TEXT NOT NULL, "
+                     "genus TEXT NOT NULL, genus_key TEXT NOT NULL, lifespan INTEGER)")
+        conn.execute("CREATE INDEX pet_types_type_key ON pet_types (type_key)")
+    conn.close()
+
+    db = SQLiteDatabase(str(path))
+    assert db.add_pet_type(make_pet_type("1", "Dog"))
+    assert not db.add_pet_type(make_pet_type("2", "Dog"))
+    db.close()
+
+def test_seq_of_a_deleted_pet_is_none(db):
+    db.add_pet_type(make_pet_type("1", "Dog"))
+    db.add_pet("1", Pet(name="Rex", birthdate="NA", picture="NA"))
+    assert db.get_pet_seq("1", "rex") is not None
+    db.delete_pet("1", "Rex")
+    assert db.get_pet_seq("1", "Rex") is None
+    db.delete_pet_type("1")
+    assert db.get_pet_type_seq("1") is None
+
+def test_pets_deleted_while_paging_are_skipped(db, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import app
+
+    monkeypatch.setattr(pets, "db", db)
+    monkeypatch.setattr(pet_types, "db", db)
+    db.add_pet_type(make_pet_type("1", "Dog"))
+    for name in ("Pet0", "Pet1", "Pet2", "Pet3", "Pet4"):
+        db.add_pet("1", Pet(name=name, birthdate="NA", picture="NA"))
+
+    list_pets = db.get_all_pets
+
+    def list_then_delete(pet_type_id):
+        # Another request deletes pets after this one listed them
+        listed = list_pets(pet_type_id)
+        db.delete_pet(pet_type_id, "Pet1")
+        db.delete_pet(pet_type_id, "Pet3")
+        return listed
+    monkeypatch.setattr(db, "get_all_pets", list_then_delete)
+
+    client = TestClient(app)
+    first = client.get("/pet-types/1/pets?limit=2")
+    assert first.status_code == 200
+    assert [pet["name"] for pet in first.json()] == ["Pet0", "Pet1"]
+
+    second = client.get(f"/pet-types/1/pets?limit=2&cursor={first.headers[NEXT_CURSOR_HEADER]}")
+    assert second.status_code == 200
+    assert [pet["name"] for pet in second.json()] == ["Pet2", "Pet4"]
+    assert NEXT_CURSOR_HEADER not in second.headers
+
+
+def test_close_closes_every_threads_connection(workdir):
+    db = SQLiteDatabase(str(workdir / "petstore.db"))
+    db.add_pet_type(make_pet_type("1", "Dog"))
+    connections = []
+
+    def use_store():
+        assert db.get_pet_type_name("1") == "Dog"
+        connections.append(db.connection())
+
+    threads = [threading.Thread(target=use_store) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    connections.append(db.connection())
+    assert len(set(map(id, connections))) == 4
+
+    db.close()
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")